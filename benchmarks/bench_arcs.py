@@ -0,0 +1,82 @@
+"""
+Copyright (c) 2026, The Inkcut Team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Compare adding the arcs of SVG paths one at a time with QPainterPath.arcTo
+with converting them to cubic curves in one batch on a generated CAD like
+drawing made mostly of arcs.
+
+Usage: python benchmarks/bench_arcs.py [arcs] [tolerance] [arcs per path]
+
+Created on Oct 18, 2026
+
+"""
+import os
+import sys
+import random
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from inkcut.core.svg import QtSvgDoc
+
+
+def generate_document(arcs, per_path=200):
+    """ Generate a document of paths made of rotated and plain arcs like
+    outlines exported from DXF files.
+
+    """
+    rand = random.Random(0)
+    paths = []
+    for i in range(arcs // per_path):
+        parts = ['M %.3f,%.3f' % (rand.uniform(0, 1000),
+                                  rand.uniform(0, 1000))]
+        for j in range(per_path):
+            r = rand.uniform(1, 50)
+            parts.append('a %.3f,%.3f %i %i %i %.3f,%.3f' % (
+                r, r * rand.choice((1, 1, 0.5)), rand.choice((0, 0, 30)),
+                rand.randint(0, 1), rand.randint(0, 1),
+                rand.uniform(-20, 20), rand.uniform(-20, 20)))
+            if j % 5 == 0:
+                parts.append('l %.3f,%.3f' % (rand.uniform(-10, 10),
+                                              rand.uniform(-10, 10)))
+        parts.append('z')
+        paths.append('<path d="%s"/>' % ' '.join(parts))
+    return ('<?xml version="1.0"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" width="1000" '
+            'height="1000">\n%s\n</svg>' % '\n'.join(paths))
+
+
+def measure(fn, repeat=3):
+    best = float('inf')
+    for i in range(repeat):
+        t0 = default_timer()
+        fn()
+        best = min(best, default_timer() - t0)
+    return best
+
+
+def main():
+    arcs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tolerance = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    per_path = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    svg = generate_document(arcs, per_path)
+
+    print("Document: %i arcs, %i per path, %i bytes" % (
+        arcs, per_path, len(svg)))
+    original = measure(lambda: QtSvgDoc(svg, fast_parser=False))
+    fast = measure(lambda: QtSvgDoc(svg))
+    batch = measure(lambda: QtSvgDoc(svg, arc_tolerance=tolerance))
+    print("Original parser:           %0.3fs" % original)
+    print("Fast parser with arcTo:    %0.3fs (%0.1fx)" % (
+        fast, original / fast))
+    print("Batch arcs (tolerance %g): %0.3fs (%0.1fx)" % (
+        tolerance, batch, original / batch))
+
+
+if __name__ == '__main__':
+    main()
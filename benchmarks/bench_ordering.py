@@ -0,0 +1,62 @@
+"""
+Copyright (c) 2026, The Inkcut Team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Measure how the shortest path ordering scales by building the PointIndex
+for random endpoints, creating the greedy tour over them with the
+greedy_tour used by the order handlers, which builds its own index, then
+refining the tour with the LocalSearch for up to 10 seconds.
+
+Usage: python benchmarks/bench_ordering.py [endpoints...]
+
+Created on Oct 18, 2026
+
+"""
+import os
+import sys
+from time import time
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from inkcut.job.ordering import PointIndex, LocalSearch, greedy_tour
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [
+        1000, 10000, 100000, 1000000]
+    rand = np.random.RandomState(0)
+    print("%10s %10s %10s %12s %10s %8s" % (
+        "endpoints", "build", "walk", "per query", "search", "saved"))
+    for n in sizes:
+        starts = rand.uniform(0, 1000, (n // 2, 2))
+        ends = starts + rand.uniform(-5, 5, (n // 2, 2))
+        points = np.empty((n // 2 * 2, 2))
+        points[0::2], points[1::2] = starts, ends
+        endpoints = points.tolist()
+
+        t0 = default_timer()
+        PointIndex(points)
+        build = default_timer() - t0
+
+        t0 = default_timer()
+        tour = greedy_tour(endpoints)[0]
+        walk = default_timer() - t0
+
+        t0 = default_timer()
+        search = LocalSearch(endpoints, tour)
+        before = search.length()
+        search.run(time() + 10)
+        refine = default_timer() - t0
+        print("%10i %9.3fs %9.3fs %10.1fus %9.3fs %7.1f%%" % (
+            n, build, walk, 1e6 * walk / max(1, n // 2), refine,
+            100 * (1 - search.length() / before)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Copyright (c) 2026, The Inkcut Team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Compare the original token by token path data parser with the vectorized
+parser in inkcut.core.pathdata on a large generated path.
+
+Usage: python benchmarks/bench_pathdata.py [subpaths]
+
+Created on Oct 18, 2026
+
+"""
+import os
+import sys
+import random
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from lxml import etree
+from inkcut.core.svg import QtSvgDoc, QtSvgPath
+
+
+def generate_path_data(subpaths, segments=12):
+    """ Generate path data similar to what inkscape produces for text """
+    rand = random.Random(0)
+    num = lambda: '%.3f' % rand.uniform(-10, 10)
+    parts = []
+    for i in range(subpaths):
+        parts.append('m %.3f,%.3f' % (rand.uniform(0, 1000),
+                                      rand.uniform(0, 1000)))
+        for j in range(segments):
+            parts.append('c %s' % ' '.join(num() for k in range(6)))
+            parts.append('l %s,%s' % (num(), num()))
+            if j % 4 == 0:
+                parts.append('a 5,3 0 0 1 %s,%s' % (num(), num()))
+        parts.append('z')
+    return ' '.join(parts)
+
+
+def measure(fn, repeat=5):
+    best = float('inf')
+    for i in range(repeat):
+        t0 = default_timer()
+        fn()
+        best = min(best, default_timer() - t0)
+    return best
+
+
+def main():
+    subpaths = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    d = generate_path_data(subpaths)
+    e = etree.Element(QtSvgPath.tag, d=d)
+    legacy = QtSvgDoc.__new__(QtSvgDoc)
+    legacy.fast_parser = False
+
+    print("Path data: %i subpaths, %i bytes" % (subpaths, len(d)))
+    original = measure(lambda: QtSvgPath(e, doc=legacy))
+    fast = measure(lambda: QtSvgPath(e))
+    print("Original parser: %0.3fs" % original)
+    print("Fast parser:     %0.3fs (%0.1fx)" % (fast, original / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Copyright (c) 2026, The Inkcut Team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Compare opening an edited document from scratch with reusing the geometry
+of the elements that did not change from a GeometryCache on a generated
+sign with many small letters.
+
+Usage: python benchmarks/bench_reload.py [elements]
+
+Created on Oct 18, 2026
+
+"""
+import os
+import sys
+import random
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from inkcut.core.svg import QtSvgDoc
+from inkcut.core.cache import GeometryCache
+
+
+def generate_document(elements, edited=None):
+    """ Generate a document of small curved paths in groups of 100. If
+    edited is given that element is moved.
+
+    """
+    rand = random.Random(0)
+    groups = []
+    for i in range(0, elements, 100):
+        paths = []
+        for j in range(i, min(elements, i + 100)):
+            x, y = rand.uniform(0, 1000), rand.uniform(0, 1000)
+            if j == edited:
+                x += 1
+            parts = ['M %.3f,%.3f' % (x, y)]
+            for k in range(8):
+                parts.append('c %.3f,%.3f %.3f,%.3f %.3f,%.3f' % tuple(
+                    rand.uniform(-5, 5) for n in range(6)))
+            parts.append('z')
+            paths.append('<path d="%s"/>' % ' '.join(parts))
+        groups.append('<g transform="translate(%i, 0)">%s</g>' % (
+            i // 100, '\n'.join(paths)))
+    return ('<?xml version="1.0"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" width="1000" '
+            'height="1000">\n%s\n</svg>' % '\n'.join(groups))
+
+
+def measure(fn, repeat=3):
+    best = float('inf')
+    for i in range(repeat):
+        t0 = default_timer()
+        fn()
+        best = min(best, default_timer() - t0)
+    return best
+
+
+def main():
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    svg = generate_document(elements)
+    edited = generate_document(elements, edited=elements // 2)
+
+    print("Document: %i elements, %i bytes" % (elements, len(svg)))
+    for flatten in (False, True):
+        cache = GeometryCache()
+        QtSvgDoc(svg, flatten=flatten, geometry=cache)
+        full = measure(lambda: QtSvgDoc(edited, flatten=flatten))
+        cached = measure(lambda: QtSvgDoc(edited, flatten=flatten,
+                                          geometry=cache))
+        print("Flatten %-5s full parse: %0.3fs, reload: %0.3fs (%0.1fx)" % (
+            flatten, full, cached, full / cached))
+
+
+if __name__ == '__main__':
+    main()
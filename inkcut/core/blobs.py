@@ -0,0 +1,130 @@
+"""
+Copyright (c) 2026, the Inkcut team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Content addressed store of documents that do not have a file such as pasted
+or piped documents. Each is saved once under the hash of its contents so the
+saved state of jobs only needs to keep a short reference.
+
+Created on Oct 18, 2026
+
+"""
+import os
+import hashlib
+import logging
+from time import time
+
+
+log = logging.getLogger("inkcut")
+
+
+class BlobStore(object):
+    """ A directory of blobs named by the sha256 of their contents.
+
+    """
+
+    #: Prefix of references to a blob
+    prefix = "blob:"
+
+    def __init__(self, path=None):
+        """ Create a store
+
+        Parameters
+        ----------
+            path: String
+                Directory to store the blobs in. Defaults to
+                `~/.config/inkcut/blobs`.
+        """
+        if path is None:
+            path = os.path.expanduser("~/.config/inkcut/blobs")
+        self.path = path
+
+    def put(self, data):
+        """ Save the data if it is not already stored.
+
+        Parameters
+        ----------
+            data: Bytes or String
+                The data to store. Strings are saved as UTF-8.
+
+        Returns
+        -------
+            ref: String
+                A reference to the blob
+        """
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        key = hashlib.sha256(data).hexdigest()
+        path = self.entry(key)
+        if os.path.exists(path):
+            # Mark it as recently used so it's not collected
+            os.utime(path, None)
+        else:
+            tmp = "{}.{}.tmp".format(path, os.getpid())
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return self.prefix + key
+
+    def get(self, ref):
+        """ Read a blob
+
+        Returns
+        -------
+            data: Bytes or None
+                The data or None if it is not in the store
+        """
+        path = self.resolve(ref)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def entry(self, key):
+        return os.path.join(self.path, "{}.svg".format(key))
+
+    def resolve(self, ref):
+        """ Return the path of the file of the referenced blob """
+        if not self.is_ref(ref):
+            raise ValueError("Invalid blob reference: {}".format(ref[:200]))
+        return self.entry(ref[len(self.prefix):])
+
+    @classmethod
+    def is_ref(cls, source):
+        """ Check if the source is a reference to a blob """
+        return source.startswith(cls.prefix) and len(source) == \
+            len(cls.prefix) + 64
+
+    def collect(self, refs, min_age=3600):
+        """ Remove all blobs except the referenced ones.
+
+        Parameters
+        ----------
+            refs: Iterable[String]
+                References of the blobs to keep
+            min_age: Float
+                Blobs saved within this many seconds are kept as another
+                instance may not have saved its reference yet.
+        """
+        keep = set("{}.svg".format(ref[len(self.prefix):])
+                   for ref in refs if self.is_ref(ref))
+        try:
+            names = os.listdir(self.path)
+        except (IOError, OSError):
+            return
+        now = time()
+        for name in names:
+            if not name.endswith(".svg") or name in keep:
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                if now - os.path.getmtime(path) >= min_age:
+                    os.remove(path)
+            except (IOError, OSError) as e:
+                log.warning("Failed to remove blob {}: {}".format(name, e))
@@ -0,0 +1,268 @@
+"""
+Copyright (c) 2026, the Inkcut team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+On disk cache of parsed documents. Entries are stored as one file per key
+and evicted least recently used first once the cache grows over its size
+limit.
+
+In memory cache of the geometry of each element so a document that is
+opened again after an edit only parses the elements that changed.
+
+Created on Oct 18, 2026
+
+"""
+import os
+import hashlib
+import logging
+from time import time
+from collections import OrderedDict
+
+
+log = logging.getLogger("inkcut")
+
+
+class ParseCache(object):
+    """ A size bounded least recently used cache of parsed data on disk.
+
+    """
+
+    #: Bump when the format of the cached data changes
+    version = 3
+
+    def __init__(self, path=None, max_size=100*1024*1024):
+        """ Create a cache
+
+        Parameters
+        ----------
+            path: String
+                Directory to store the cache entries in. Defaults to
+                `~/.config/inkcut/cache`.
+            max_size: Int
+                Maximum size of all entries in bytes.
+        """
+        if path is None:
+            path = os.path.expanduser("~/.config/inkcut/cache")
+        self.path = path
+        self.max_size = max_size
+
+        #: Counters
+        self.hits = 0
+        self.misses = 0
+        self.hit_time = 0.0
+        self.miss_time = 0.0
+
+    def key(self, data, **options):
+        """ Create a key from the document data and the options used to
+        parse it.
+
+        Parameters
+        ----------
+            data: Bytes
+                The source document
+            options: Dict
+                Parse options that change the result
+
+        Returns
+        -------
+            key: String
+                A hex digest identifying the entry
+        """
+        h = hashlib.sha256()
+        h.update(data)
+        h.update(repr((self.version, sorted(options.items()))).encode())
+        return h.hexdigest()
+
+    def entry(self, key):
+        return os.path.join(self.path, "{}.bin".format(key))
+
+    def get(self, key):
+        """ Get an entry and mark it as recently used.
+
+        Returns
+        -------
+            data: Bytes or None
+                The cached data or None if it is not in the cache
+        """
+        path = self.entry(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+        return data
+
+    def set(self, key, data):
+        """ Store an entry then evict old entries if the cache is too big.
+
+        """
+        if len(data) > self.max_size:
+            return
+        path = self.entry(key)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except (IOError, OSError) as e:
+            log.warning("Failed to write cache entry {}: {}".format(path, e))
+            return
+        self.evict()
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits
+        within the size limit.
+
+        """
+        entries = []
+        total = 0
+        try:
+            for name in os.listdir(self.path):
+                if not name.endswith(".bin"):
+                    continue
+                st = os.stat(os.path.join(self.path, name))
+                entries.append((st.st_mtime, st.st_size, name))
+                total += st.st_size
+        except (IOError, OSError):
+            return
+        entries.sort()
+        for mtime, size, name in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+                total -= size
+            except (IOError, OSError):
+                pass
+
+    def clear(self):
+        """ Remove all entries """
+        max_size, self.max_size = self.max_size, -1
+        try:
+            self.evict()
+        finally:
+            self.max_size = max_size
+
+    def record(self, hit, start, name=''):
+        """ Update and log the hit and miss counters
+
+        Parameters
+        ----------
+            hit: Bool
+                Whether the lookup was a hit
+            start: Float
+                Time the lookup started
+            name: String
+                Description of what was looked up for the log
+        """
+        duration = time() - start
+        if hit:
+            self.hits += 1
+            self.hit_time += duration
+        else:
+            self.misses += 1
+            self.miss_time += duration
+        log.info("Parse cache {} for {} in {:.1f} ms (hits: {}, misses: {}, "
+                 "avg hit: {:.1f} ms, avg miss: {:.1f} ms)".format(
+                     "hit" if hit else "miss", name, duration * 1000,
+                     self.hits, self.misses,
+                     1000 * self.hit_time / max(1, self.hits),
+                     1000 * self.miss_time / max(1, self.misses)))
+
+
+class GeometryCache(object):
+    """ A size bounded least recently used cache of the paths of parsed
+    elements kept in memory. Entries are keyed by the serialized element and
+    the transform it was mapped with so they're reused by any document
+    containing the same element.
+
+    """
+
+    def __init__(self, max_size=4000000):
+        """ Create a cache
+
+        Parameters
+        ----------
+            max_size: Int
+                Maximum number of path elements of all entries.
+        """
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+        #: Counters
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, data, transform=None, options=()):
+        """ Create a key from the serialized element, the transform it's
+        mapped with and the options used to parse it.
+
+        Parameters
+        ----------
+            data: Bytes
+                The serialized element
+            transform: QTransform or None
+                The transform applied to the element
+            options: Tuple
+                Parse options that change the result
+
+        Returns
+        -------
+            key: Bytes
+                A digest identifying the entry
+        """
+        h = hashlib.blake2b(data, digest_size=16)
+        if transform is not None:
+            h.update(repr((
+                transform.m11(), transform.m12(), transform.m13(),
+                transform.m21(), transform.m22(), transform.m23(),
+                transform.m31(), transform.m32(), transform.m33())).encode())
+        h.update(repr(options).encode())
+        return h.digest()
+
+    def get(self, key):
+        """ Get an entry and mark it as recently used.
+
+        Returns
+        -------
+            path: QPainterPath or None
+                The cached path or None if it is not in the cache
+        """
+        path = self.entries.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def set(self, key, path):
+        """ Store an entry then evict old entries if the cache is too big.
+
+        """
+        size = path.elementCount()
+        if size > self.max_size:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old.elementCount()
+        self.entries[key] = path
+        self.size += size
+        while self.size > self.max_size:
+            key, old = self.entries.popitem(last=False)
+            self.size -= old.elementCount()
+
+    def clear(self):
+        """ Remove all entries """
+        self.entries.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,265 @@
+"""
+Copyright (c) 2026, the Inkcut team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Copies of a path that are only described by the offset of each copy so
+jobs with many copies don't hold the geometry of every copy. The copies are
+only expanded when the job is sent to the device.
+
+Created on Oct 18, 2026
+
+"""
+from enaml.qt.QtCore import QPointF, QRectF
+from enaml.qt.QtGui import QPainterPath, QTransform
+
+
+class InstancedPath(object):
+    """ A base path drawn once at each offset then mapped by a transform,
+    followed by a tail path such as a weedline and an optional move to the
+    end point. It supports the parts of the QPainterPath api used by the
+    preview and the device. Instances are immutable, transforming one returns
+    a new instance sharing the base path.
+
+    """
+
+    def __init__(self, path, offsets, transform=None, tail=None, end=None):
+        """ Create instances of a path
+
+        Parameters
+        ----------
+            path: QPainterPath
+                The base path of each copy
+            offsets: List[Tuple[Float, Float]]
+                Translation of each copy before the transform
+            transform: QTransform or None
+                Transform applied to all copies
+            tail: QPainterPath or None
+                Path added after the copies in output coordinates
+            end: QPointF or None
+                Point moved to after everything else in output coordinates
+        """
+        self.path = path
+        self.offsets = offsets
+        self.transform = QTransform() if transform is None else transform
+        self.tail = QPainterPath() if tail is None else tail
+        self.end = end
+        self._bbox = None
+
+    def copy(self, transform=None, tail=None, end=None):
+        """ Create a copy of the instances replacing the given parts """
+        return InstancedPath(
+            self.path, self.offsets,
+            self.transform if transform is None else transform,
+            self.tail if tail is None else tail,
+            self.end if end is None else end)
+
+    def transforms(self):
+        """ Iterate over the transform of each copy
+
+        """
+        t = self.transform
+        for x, y in self.offsets:
+            yield QTransform.fromTranslate(x, y) * t
+
+    def mapped(self, transform):
+        """ Return the instances mapped by the transform
+
+        Parameters
+        ----------
+            transform: QTransform
+                Transform applied after the current one
+
+        Returns
+        -------
+            path: InstancedPath
+                The mapped instances
+        """
+        end = None if self.end is None else transform.map(self.end)
+        return InstancedPath(self.path, self.offsets,
+                             self.transform * transform,
+                             transform.map(self.tail), end)
+
+    def translated(self, dx, dy):
+        return self.mapped(QTransform.fromTranslate(dx, dy))
+
+    def toPath(self):
+        """ Expand all the copies into a single path
+
+        Returns
+        -------
+            path: QPainterPath
+                A path equal to the one created by adding each copy
+        """
+        result = QPainterPath()
+        path = self.path
+        for t in self.transforms():
+            result.addPath(t.map(path))
+        result.addPath(self.tail)
+        if self.end is not None:
+            result.moveTo(self.end)
+        return result
+
+    def toSubpathPolygons(self, transform=None):
+        """ Iterate over the polygons of each copy without expanding them.
+        The base path is only converted once since the copies only differ by
+        a translation.
+
+        Parameters
+        ----------
+            transform: QTransform or None
+                Transform applied to the polygons
+
+        Returns
+        -------
+            polygons: Generator[QPolygonF]
+                The polygons of each subpath of each copy
+        """
+        m = QTransform() if transform is None else transform
+        t = self.transform * m
+        origin = t.map(QPointF(0, 0))
+        polygons = self.path.toSubpathPolygons(t)
+        for x, y in self.offsets:
+            d = t.map(QPointF(x, y)) - origin
+            if d.isNull():
+                for poly in polygons:
+                    yield poly
+                continue
+            for poly in polygons:
+                yield poly.translated(d)
+        for poly in self.tail.toSubpathPolygons(m):
+            yield poly
+
+    def boundingRect(self):
+        """ Compute the bounding rect of all the copies from the bounding
+        rect of the mapped base path and the offsets.
+
+        """
+        if self._bbox is None:
+            rects = []
+            if self.offsets and self.path.elementCount():
+                t = self.transform
+                base = map_rect(t, self.path)
+                origin = t.map(QPointF(0, 0))
+                points = [t.map(QPointF(x, y)) - origin
+                          for x, y in self.offsets]
+                xs = [p.x() for p in points]
+                ys = [p.y() for p in points]
+                rects.append(base.adjusted(min(xs), min(ys),
+                                           max(xs), max(ys)))
+            if self.tail.elementCount():
+                rects.append(self.tail.boundingRect())
+            if self.end is not None:
+                rects.append(QRectF(self.end, self.end))
+            if not rects:
+                self._bbox = QRectF()
+            else:
+                # United ignores empty rects but paths include their points
+                left = min(r.left() for r in rects)
+                top = min(r.top() for r in rects)
+                right = max(r.right() for r in rects)
+                bottom = max(r.bottom() for r in rects)
+                self._bbox = QRectF(left, top, right - left, bottom - top)
+        return QRectF(self._bbox)
+
+    def currentPosition(self):
+        if self.end is not None:
+            return QPointF(self.end)
+        if self.tail.elementCount():
+            return self.tail.currentPosition()
+        if not self.offsets:
+            return QPointF()
+        x, y = self.offsets[-1]
+        t = QTransform.fromTranslate(x, y) * self.transform
+        return t.map(self.path.currentPosition())
+
+    def elementCount(self):
+        """ Number of elements of the expanded path """
+        return (self.path.elementCount() * len(self.offsets) +
+                self.tail.elementCount() + (self.end is not None))
+
+    def storedElementCount(self):
+        """ Number of elements actually stored by the instances """
+        return (self.path.elementCount() + self.tail.elementCount() +
+                len(self.offsets))
+
+    def isEmpty(self):
+        return (not self.offsets or self.path.isEmpty()) and \
+            self.tail.isEmpty()
+
+    def copyEnds(self):
+        """ Iterate over the first and last point of each copy """
+        path = self.path
+        if path.isEmpty():
+            return
+        e = path.elementAt(0)
+        start = QPointF(e.x, e.y)
+        end = path.currentPosition()
+        for t in self.transforms():
+            yield t.map(start), t.map(end)
+
+
+def map_path(transform, path):
+    """ Map a QPainterPath or InstancedPath by the transform
+
+    Parameters
+    ----------
+        transform: QTransform
+            The transform to apply
+        path: QPainterPath or InstancedPath
+            The path to map
+
+    Returns
+    -------
+        path: QPainterPath or InstancedPath
+            The mapped path of the same type
+    """
+    if isinstance(path, InstancedPath):
+        return path.mapped(transform)
+    return transform.map(path)
+
+
+def is_axis_aligned(transform):
+    """ Check if the transform maps axis aligned rects to axis aligned rects
+    (any scale, mirror, translation or rotation by a multiple of 90 degrees)
+
+    """
+    if transform.type() == QTransform.TransformationType.TxProject:
+        return False
+    return ((transform.m12() == 0 and transform.m21() == 0) or
+            (transform.m11() == 0 and transform.m22() == 0))
+
+
+def map_rect(transform, path, bbox=None):
+    """ Compute the bounding rect of the path mapped by the transform. When
+    the transform is axis aligned it is derived from the bounding rect of the
+    path without mapping the path.
+
+    Parameters
+    ----------
+        transform: QTransform
+            The transform to apply
+        path: QPainterPath
+            The path to map
+        bbox: QRectF or None
+            The bounding rect of the path if it is already known
+
+    Returns
+    -------
+        rect: QRectF
+            The bounding rect of the mapped path
+    """
+    if is_axis_aligned(transform):
+        if bbox is None:
+            bbox = path.boundingRect()
+        return transform.mapRect(bbox)
+    return transform.map(path).boundingRect()
+
+
+def expand_path(path):
+    """ Return the path as a QPainterPath expanding it if it's instanced """
+    if isinstance(path, InstancedPath):
+        return path.toPath()
+    return path
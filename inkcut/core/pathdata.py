@@ -0,0 +1,743 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (c) 2026, The Inkcut Team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Vectorized parser for SVG path data. The whole `d` attribute is tokenized in
+one pass into flat arrays, relative, shorthand and implicit commands are
+resolved with numpy and the result is appended to a QPainterPath in bulk by
+streaming the elements through a QDataStream.
+
+Created on Oct 18, 2026
+
+"""
+import re
+import numpy as np
+from math import (
+    isfinite, pi, sqrt, sin, cos, tan, asin, atan2, radians, ceil
+)
+from struct import Struct
+from enaml.qt.QtCore import QByteArray, QDataStream, QIODevice
+from enaml.qt.QtGui import QPainterPath
+
+
+#: Opcodes of resolved (absolute) path segments
+MOVE, LINE, CURVE, QUAD, ARC, CLOSE = range(6)
+
+#: Commands in the order used for the command codes below
+COMMANDS = 'MLHVCSQTAZ'
+M, L, H, V, C, S, Q, T, A, Z = range(len(COMMANDS))
+
+#: Number of parameters each command consumes
+ARITY = np.array([2, 2, 1, 1, 6, 4, 4, 2, 7, 0])
+
+#: Output opcode of each command once it is made absolute
+OPCODES = np.array([MOVE, LINE, LINE, LINE, CURVE, CURVE, QUAD, QUAD, ARC,
+                    CLOSE])
+
+#: Columns of the segment table each command's parameters are stored in.
+#: Columns 0-3 hold control points (or the arc radii, rotation and flags)
+#: and columns 5-6 hold the end point.
+COLUMNS = {
+    M: (5, 6),
+    L: (5, 6),
+    H: (5,),
+    V: (6,),
+    C: (0, 1, 2, 3, 5, 6),
+    S: (2, 3, 5, 6),
+    Q: (0, 1, 5, 6),
+    T: (5, 6),
+    A: (0, 1, 2, 3, 4, 5, 6),
+    Z: (),
+}
+
+COMMAND = re.compile(r'([MLHVCSQTAZmlhvcsqtaz])')
+NUMBER = re.compile(
+    r'[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][-+]?[0-9]+)?')
+TOKEN = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]|' + NUMBER.pattern)
+COMMAND_LETTERS = frozenset(COMMANDS + COMMANDS.lower())
+DELIMITERS = ' \t\r\n,'
+
+#: Shorter path data is parsed faster one token at a time as the fixed cost
+#: of the array operations outweighs the per token cost
+MIN_LENGTH = 1500
+
+#: Layout of a QPainterPath element in a QDataStream
+ELEMENT_DTYPE = np.dtype([('type', '>i4'), ('x', '>f8'), ('y', '>f8')])
+ELEMENT_STRUCT = Struct('>idd')
+
+
+def enum_value(v):
+    """ Get the integer value of a Qt enum across Qt bindings """
+    return getattr(v, 'value', v)
+
+
+MOVE_TO, LINE_TO, CURVE_TO, CURVE_TO_DATA = map(enum_value, (
+    QPainterPath.MoveToElement, QPainterPath.LineToElement,
+    QPainterPath.CurveToElement, QPainterPath.CurveToDataElement))
+
+
+def tokenize(d):
+    """ Split path data into its commands and parameters in one pass.
+
+    Parameters
+    ----------
+    d: str
+        The path data
+
+    Returns
+    -------
+    result: Tuple[List[str], List[int], numpy.ndarray]
+        The command letters, the number of parameters following each
+        command and all of the parameters as a flat float array.
+
+    """
+    m = COMMAND.search(d)
+    head = d[:m.start()] if m else d
+    if head.strip(DELIMITERS):
+        if NUMBER.match(head.lstrip(DELIMITERS)):
+            raise ValueError('Invalid path, no initial command.')
+        raise ValueError('Invalid path data at 0!')
+    if m is None:
+        return [], [], np.empty(0)
+    if m.group() not in 'Mm':
+        raise ValueError('Invalid path, must begin with moveto (M or m), '
+                         'given %s.' % m.group())
+
+    tokens = TOKEN.findall(d)
+
+    # Everything that is not a command, a number or a delimiter is invalid.
+    # Checking the lengths avoids a second regex pass over the data.
+    used = sum(map(len, tokens)) + sum(map(d.count, DELIMITERS))
+    if used != len(d):
+        raise ValueError('Invalid path data in %s!' % d[:100])
+
+    letters = COMMAND_LETTERS
+    starts = [i for i, t in enumerate(tokens) if t in letters]
+    commands = [tokens[i] for i in starts]
+    params = [t for t in tokens if t not in letters]
+    ends = starts[1:] + [len(tokens)]
+    counts = [e - s - 1 for s, e in zip(starts, ends)]
+    return commands, counts, np.array(params, dtype=float)
+
+
+def resolve_positions(dx, dy, absolute_x, absolute_y, close, last_move):
+    """ Compute the pen position after each segment.
+
+    Relative segments add to the previous position, absolute segments reset
+    it and a closepath resets it to the position of the last moveto.  This
+    is a single pass over plain lists so the additions happen in the same
+    order as `QtSvgPath.parsePath` and give bit for bit identical results.
+
+    """
+    xs, ys = [], []
+    x = y = 0.0
+    for u, v, ax, ay, c, m in zip(
+            dx.tolist(), dy.tolist(), absolute_x.tolist(),
+            absolute_y.tolist(), close.tolist(), last_move.tolist()):
+        if c:
+            x, y = xs[m], ys[m]
+        else:
+            x = u if ax else x + u
+            y = v if ay else y + v
+        xs.append(x)
+        ys.append(y)
+    return np.array(xs), np.array(ys)
+
+
+def parse(d):
+    """ Parse path data into absolute segments.
+
+    This produces the same segments as `QtSvgPath.parsePath` but resolves
+    them all at once instead of one token at a time.
+
+    Parameters
+    ----------
+    d: str
+        The path data
+
+    Returns
+    -------
+    result: Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        The opcode of each segment, a table of the (c1x, c1y, c2x, c2y, x, y)
+        points of each segment and a table of the (rx, ry, x_axis_rotation,
+        large_arc_flag, sweep_flag) parameters of each arc segment.
+
+    """
+    commands, counts, values = tokenize(d)
+    if not commands:
+        return np.empty(0, dtype=np.uint8), np.empty((0, 6)), np.empty((0, 5))
+
+    letters = ''.join(commands)
+    upper = letters.upper()
+    code = np.array([COMMANDS.index(c) for c in upper], dtype=np.intp)
+    relative = np.array([c != u for c, u in zip(letters, upper)])
+    counts = np.array(counts, dtype=np.intp)
+
+    # Split each command into segments, parameters following a closepath
+    # are implicit linetos
+    arity = ARITY[code]
+    closes = code == Z
+    segments = np.where(closes, 1 + counts // 2,
+                        counts // np.maximum(arity, 1))
+    expected = np.where(closes, counts - counts % 2, segments * arity)
+    invalid = (expected != counts) | (~closes & (counts == 0))
+    if invalid.any():
+        raise ValueError('Invalid number of parameters for %s' %
+                         commands[np.flatnonzero(invalid)[0]])
+
+    n = int(segments.sum())
+    owner = np.repeat(np.arange(len(code)), segments)
+    first = np.zeros(n, dtype=bool)
+    first[np.cumsum(segments) - segments] = True
+
+    # Parameters after the first segment of a moveto or closepath are
+    # implicit linetos
+    seg = code[owner]
+    seg[~first & ((seg == M) | (seg == Z))] = L
+    rel = relative[owner]
+    used = ARITY[seg]
+    offset = np.cumsum(used) - used
+
+    raw = np.zeros((n, 7))
+    for c, columns in COLUMNS.items():
+        rows = np.flatnonzero(seg == c)
+        if not len(rows):
+            continue
+        for i, column in enumerate(columns):
+            raw[rows, column] = values[offset[rows] + i]
+
+    # Compute the pen positions
+    index = np.arange(n)
+    close = seg == Z
+    last_move = np.maximum.accumulate(np.where(seg == M, index, 0))
+    x, y = resolve_positions(raw[:, 5], raw[:, 6], ~rel & (seg != V),
+                             ~rel & (seg != H), close, last_move)
+    px = np.concatenate(([0.0], x[:-1]))
+    py = np.concatenate(([0.0], y[:-1]))
+
+    # Make the control points absolute
+    ox = np.where(rel, px, 0.0)
+    oy = np.where(rel, py, 0.0)
+    points = np.empty((n, 6))
+    points[:, 0] = raw[:, 0] + ox
+    points[:, 1] = raw[:, 1] + oy
+    points[:, 2] = raw[:, 2] + ox
+    points[:, 3] = raw[:, 3] + oy
+    points[:, 4] = x
+    points[:, 5] = y
+
+    # The control point each segment leaves behind for shorthand curves
+    op = OPCODES[seg]
+    cubic = op == CURVE
+    quad = op == QUAD
+    lx = np.where(cubic, points[:, 2], np.where(quad, points[:, 0], x))
+    ly = np.where(cubic, points[:, 3], np.where(quad, points[:, 1], y))
+
+    # Smooth quadratics reflect the previous control point which may itself
+    # be reflected so these are resolved in order. They are rare in practice.
+    for i in np.flatnonzero(seg == T):
+        lx[i] = points[i, 0] = px[i] + (px[i] - lx[i - 1])
+        ly[i] = points[i, 1] = py[i] + (py[i] - ly[i - 1])
+
+    smooth = np.flatnonzero(seg == S)
+    if len(smooth):
+        prev = smooth - 1
+        points[smooth, 0] = px[smooth] + (px[smooth] - lx[prev])
+        points[smooth, 1] = py[smooth] + (py[smooth] - ly[prev])
+
+    return op.astype(np.uint8), points, raw[op == ARC, :5]
+
+
+def fuzzy_equal(a, b):
+    """ Vectorized version of Qt's QPointF comparison for one coordinate """
+    diff = np.abs(a - b)
+    null = (a == 0) | (b == 0)
+    return np.where(null, diff <= 1e-12,
+                    diff * 1e12 <= np.minimum(np.abs(a), np.abs(b)))
+
+
+def fuzzy_equal_point(x1, y1, x2, y2):
+    """ Qt's QPointF comparison """
+    for a, b in ((x1, x2), (y1, y2)):
+        if a == 0 or b == 0:
+            if abs(a - b) > 1e-12:
+                return False
+        elif abs(a - b) * 1e12 > min(abs(a), abs(b)):
+            return False
+    return True
+
+
+def segment_elements(ops, points):
+    """ Generate the path elements of the segments in bulk.
+
+    The elements follow the same rules QPainterPath uses in moveTo, lineTo,
+    quadTo and cubicTo so the result is identical to making the calls one at
+    a time.  Arcs are skipped and must be added separately.
+
+    Parameters
+    ----------
+    ops: numpy.ndarray
+        The segment opcodes
+    points: numpy.ndarray
+        The segment table
+
+    Returns
+    -------
+    result: Tuple[numpy.ndarray, numpy.ndarray]
+        The elements as an array of ELEMENT_DTYPE and the index of the
+        segment each element belongs to.
+
+    """
+    n = len(ops)
+    x, y = points[:, 4], points[:, 5]
+    prev_x = np.concatenate(([0.0], x[:-1]))
+    prev_y = np.concatenate(([0.0], y[:-1]))
+
+    move = ops == MOVE
+    line = (ops == LINE) | (ops == CLOSE)
+    quad = ops == QUAD
+    curve = (ops == CURVE) | quad
+
+    # Quadratic curves are converted to cubics like QPainterPath.quadTo
+    qx_all, qy_all = points[:, 0], points[:, 1]
+    c1x, c1y = qx_all.copy(), qy_all.copy()
+    c2x, c2y = points[:, 2].copy(), points[:, 3].copy()
+    qx, qy = c1x[quad], c1y[quad]
+    c1x[quad] = (prev_x[quad] + 2 * qx) / 3
+    c1y[quad] = (prev_y[quad] + 2 * qy) / 3
+    c2x[quad] = (x[quad] + 2 * qx) / 3
+    c2y[quad] = (y[quad] + 2 * qy) / 3
+
+    # Qt ignores empty lines and curves and points that are not finite
+    empty = line & fuzzy_equal(prev_x, x) & fuzzy_equal(prev_y, y)
+    empty |= (quad & fuzzy_equal(prev_x, qx_all) &
+              fuzzy_equal(prev_y, qy_all) & fuzzy_equal(qx_all, x) &
+              fuzzy_equal(qy_all, y))
+    empty |= (curve & fuzzy_equal(prev_x, c1x) & fuzzy_equal(prev_y, c1y) &
+              fuzzy_equal(c1x, c2x) & fuzzy_equal(c1y, c2y) &
+              fuzzy_equal(c2x, x) & fuzzy_equal(c2y, y))
+    finite = np.isfinite(x) & np.isfinite(y)
+    finite &= ~curve | (np.isfinite(c1x) & np.isfinite(c1y) &
+                        np.isfinite(c2x) & np.isfinite(c2y))
+    keep = (move | line | curve) & finite & ~empty
+
+    emit = np.where(keep, np.where(curve, 3, 1), 0)
+    total = int(emit.sum())
+    segment = np.repeat(np.arange(n), emit)
+    part = np.arange(total) - np.repeat(np.cumsum(emit) - emit, emit)
+
+    elements = np.empty(total, dtype=ELEMENT_DTYPE)
+    is_curve = curve[segment]
+    column = np.where(is_curve, part, 2)
+    elements['type'] = np.where(
+        move[segment], MOVE_TO, np.where(~is_curve, LINE_TO, np.where(
+            part == 0, CURVE_TO, CURVE_TO_DATA)))
+    elements['x'] = np.column_stack((c1x, c2x, x))[segment, column]
+    elements['y'] = np.column_stack((c1y, c2y, y))[segment, column]
+    return elements, segment
+
+
+def segment_elements_from(op, row, x0, y0):
+    """ Generate the path elements of a single segment starting at the given
+    position. This is used for segments following an arc as the arc may
+    not end exactly at the end point in the segment table.
+
+    """
+    c1x, c1y, c2x, c2y, x, y = row
+    finite = isfinite(x) and isfinite(y)
+    if op == MOVE:
+        return [(MOVE_TO, x, y)] if finite else []
+    elif op == LINE or op == CLOSE:
+        if not finite or fuzzy_equal_point(x0, y0, x, y):
+            return []
+        return [(LINE_TO, x, y)]
+    elif op == QUAD:
+        if (fuzzy_equal_point(x0, y0, c1x, c1y) and
+                fuzzy_equal_point(c1x, c1y, x, y)):
+            return []
+        c1x, c1y, c2x, c2y = ((x0 + 2 * c1x) / 3, (y0 + 2 * c1y) / 3,
+                              (x + 2 * c1x) / 3, (y + 2 * c1y) / 3)
+    if not (finite and isfinite(c1x) and isfinite(c1y) and isfinite(c2x) and
+            isfinite(c2y)):
+        return []
+    if (fuzzy_equal_point(x0, y0, c1x, c1y) and
+            fuzzy_equal_point(c1x, c1y, c2x, c2y) and
+            fuzzy_equal_point(c2x, c2y, x, y)):
+        return []
+    return [(CURVE_TO, c1x, c1y), (CURVE_TO_DATA, c2x, c2y),
+            (CURVE_TO_DATA, x, y)]
+
+
+def path_elements(path):
+    """ Read the elements of a QPainterPath into an array by streaming it
+    out through a QDataStream.
+
+    """
+    data = QByteArray()
+    QDataStream(data, QIODevice.WriteOnly) << path
+    data = bytes(data)
+    count = int(np.frombuffer(data, dtype='>i4', count=1)[0])
+    return np.frombuffer(data, dtype=ELEMENT_DTYPE, count=count, offset=4)
+
+
+def arc_elements(last, arc, params, x2, y2):
+    """ Generate the path elements of an arc using the given callback.
+
+    The callback draws on a scratch path which ends with an element of the
+    same kind as the last element so QPainterPath treats it the same way.
+
+    Parameters
+    ----------
+    last: Tuple[int, float, float]
+        The last element before the arc
+    arc: Callable
+        The arc callback, see `append_path_data`
+    params: List[float]
+        The arc radii, rotation and flags
+    x2, y2: float
+        The end of the arc
+
+    Returns
+    -------
+    elements: numpy.ndarray
+        The arc elements. When the last element is a moveto the elements
+        start with the moveto that replaces it.
+
+    """
+    kind, x1, y1 = last
+    rx, ry, phi, large_arc_flag, sweep_flag = params
+    scratch = QPainterPath()
+    if kind == MOVE_TO:
+        scratch.moveTo(x1, y1)
+        start = 0
+    else:
+        scratch.moveTo(x1 + 1 + abs(x1), y1)
+        scratch.lineTo(x1, y1)
+        start = 2
+    arc(scratch, x1, y1, rx, ry, phi, int(large_arc_flag), int(sweep_flag),
+        x2, y2)
+    return path_elements(scratch)[start:]
+
+
+def arc_error(radius, angle):
+    """ An upper bound of the distance between a circular arc and the cubic
+    curve approximating it.
+
+    """
+    return radius * 4 / 27 * np.sin(angle / 4) ** 6 / np.cos(angle / 4) ** 2
+
+
+def arc_curve_count(radius, sweep, tolerance):
+    """ Get the number of cubic curves needed to approximate each arc within
+    the tolerance. Curves never span more than a quarter turn.
+
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Invert the error bound ignoring the cosine term then correct it
+        angle = 4 * np.arcsin(np.minimum(
+            (27 * tolerance / (4 * radius)) ** (1 / 6), 1))
+        angle = np.clip(np.nan_to_num(angle, nan=pi / 2), 1e-3, pi / 2)
+        count = np.maximum(np.ceil(np.abs(sweep) / angle), 1)
+        count += arc_error(radius, np.abs(sweep) / count) > tolerance
+    # Degenerate arcs have no sweep or radius to count curves from
+    count = np.where(np.isfinite(count), count, 1)
+    return count.astype(np.intp)
+
+
+def arc_to_curves(x1, y1, params, x2, y2, tolerance):
+    """ Convert one arc to cubic curves. This is the same conversion as
+    `arc_curves` for paths too short to be worth converting in a batch.
+
+    Parameters
+    ----------
+    x1, y1: float
+        The start of the arc
+    params: List[float]
+        The arc radii, rotation and flags
+    x2, y2: float
+        The end of the arc
+    tolerance: float
+        The maximum distance of the curves from the arc
+
+    Returns
+    -------
+    curves: List[Tuple] or None
+        The (c1x, c1y, c2x, c2y, x, y) points of each curve. None if the
+        arc is a line as a radius is zero.
+
+    """
+    rx, ry, phi, large, sweep = params
+    rx, ry = abs(rx), abs(ry)
+    if fuzzy_equal_point(x1, y1, x2, y2):
+        return []
+    if rx == 0 or ry == 0:
+        return None
+    phi = radians(phi)
+    cos_phi, sin_phi = cos(phi), sin(phi)
+    hx, hy = (x1 - x2) / 2, (y1 - y2) / 2
+    x1p = cos_phi * hx + sin_phi * hy
+    y1p = -sin_phi * hx + cos_phi * hy
+    scale = sqrt(max(x1p ** 2 / rx ** 2 + y1p ** 2 / ry ** 2, 1))
+    rx, ry = rx * scale, ry * scale
+    rxy, ryx = (rx * y1p) ** 2, (ry * x1p) ** 2
+    radicand = max(((rx * ry) ** 2 - rxy - ryx) / (rxy + ryx), 0)
+    factor = (-1.0 if bool(large) == bool(sweep) else 1.0) * sqrt(radicand)
+    cxp = factor * rx * y1p / ry
+    cyp = -factor * ry * x1p / rx
+    cx = cos_phi * cxp - sin_phi * cyp + (x1 + x2) / 2
+    cy = sin_phi * cxp + cos_phi * cyp + (y1 + y2) / 2
+    theta = atan2((y1p - cyp) / ry, (x1p - cxp) / rx)
+    delta = atan2((-y1p - cyp) / ry, (-x1p - cxp) / rx) - theta
+    if not sweep and delta > 0:
+        delta -= 2 * pi
+    elif sweep and delta < 0:
+        delta += 2 * pi
+
+    # Same as arc_curve_count
+    radius = max(rx, ry)
+    angle = 4 * asin(min((27 * tolerance / (4 * radius)) ** (1 / 6), 1))
+    angle = min(max(angle, 1e-3), pi / 2)
+    n = max(ceil(abs(delta) / angle), 1)
+    quarter = abs(delta) / n / 4
+    if radius * 4 / 27 * sin(quarter) ** 6 / cos(quarter) ** 2 > tolerance:
+        n += 1
+    step = delta / n
+    alpha = 4 / 3 * tan(step / 4)
+    ax, ay = cos_phi * rx, sin_phi * rx
+    bx, by = -sin_phi * ry, cos_phi * ry
+    curves = []
+    cos1, sin1 = cos(theta), sin(theta)
+    for k in range(1, n + 1):
+        cos0, sin0 = cos1, sin1
+        a1 = theta + k * step
+        cos1, sin1 = cos(a1), sin(a1)
+        u1, v1 = cos0 - alpha * sin0, sin0 + alpha * cos0
+        u2, v2 = cos1 + alpha * sin1, sin1 - alpha * cos1
+        curves.append((cx + ax * u1 + bx * v1, cy + ay * u1 + by * v1,
+                       cx + ax * u2 + bx * v2, cy + ay * u2 + by * v2,
+                       cx + ax * cos1 + bx * sin1, cy + ay * cos1 + by * sin1))
+    curves[-1] = curves[-1][:4] + (x2, y2)
+    return curves
+
+
+def arc_curves(x1, y1, arcs, x2, y2, tolerance):
+    """ Convert arcs to cubic curves in one batch.
+
+    The center parameterization is computed as described in
+    https://www.w3.org/TR/SVG/implnote.html#ArcImplementationNotes and each
+    arc is split into as many curves as needed to stay within the tolerance.
+
+    Parameters
+    ----------
+    x1, y1: numpy.ndarray
+        The start of each arc
+    arcs: numpy.ndarray
+        The (rx, ry, x_axis_rotation, large_arc_flag, sweep_flag) table of
+        the arcs
+    x2, y2: numpy.ndarray
+        The end of each arc
+    tolerance: float
+        The maximum distance of the curves from the arcs
+
+    Returns
+    -------
+    result: Tuple[numpy.ndarray, numpy.ndarray]
+        The elements of all of the arcs as an array of ELEMENT_DTYPE and the
+        number of elements of each arc. Arcs with a zero radius are lines
+        and arcs ending where they start are omitted.
+
+    """
+    rx, ry = np.abs(arcs[:, 0]), np.abs(arcs[:, 1])
+    phi = np.radians(arcs[:, 2])
+    large, sweep = arcs[:, 3] != 0, arcs[:, 4] != 0
+    cos_phi, sin_phi = np.cos(phi), np.sin(phi)
+
+    same = fuzzy_equal(x1, x2) & fuzzy_equal(y1, y2)
+    line = ~same & ((rx == 0) | (ry == 0))
+    curve = ~same & ~line
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # F.6.5.1
+        hx, hy = (x1 - x2) / 2, (y1 - y2) / 2
+        x1p = cos_phi * hx + sin_phi * hy
+        y1p = -sin_phi * hx + cos_phi * hy
+
+        # F.6.6 scale up radii that are too small
+        scale = np.sqrt(np.maximum(x1p ** 2 / rx ** 2 + y1p ** 2 / ry ** 2, 1))
+        rx, ry = rx * scale, ry * scale
+
+        # F.6.5.2 - F.6.5.3 the center
+        rxy, ryx = (rx * y1p) ** 2, (ry * x1p) ** 2
+        radicand = np.maximum(((rx * ry) ** 2 - rxy - ryx) / (rxy + ryx), 0)
+        factor = np.where(large == sweep, -1.0, 1.0) * np.sqrt(radicand)
+        cxp = factor * rx * y1p / ry
+        cyp = -factor * ry * x1p / rx
+        cx = cos_phi * cxp - sin_phi * cyp + (x1 + x2) / 2
+        cy = sin_phi * cxp + cos_phi * cyp + (y1 + y2) / 2
+
+        # F.6.5.5 - F.6.5.6 the start angle and sweep
+        theta = np.arctan2((y1p - cyp) / ry, (x1p - cxp) / rx)
+        delta = np.arctan2((-y1p - cyp) / ry, (-x1p - cxp) / rx) - theta
+        delta = np.where(~sweep & (delta > 0), delta - 2 * pi, delta)
+        delta = np.where(sweep & (delta < 0), delta + 2 * pi, delta)
+
+    n = np.where(curve, arc_curve_count(np.maximum(rx, ry), delta,
+                                        tolerance), 0)
+    counts = np.where(line, 1, 3 * n)
+    offsets = np.cumsum(counts) - counts
+    elements = np.empty(int(counts.sum()), dtype=ELEMENT_DTYPE)
+
+    rows = np.flatnonzero(line)
+    elements['type'][offsets[rows]] = LINE_TO
+    elements['x'][offsets[rows]] = x2[rows]
+    elements['y'][offsets[rows]] = y2[rows]
+
+    # Each curve approximates a circular arc on the unit circle which is
+    # then scaled, rotated and moved to the ellipse
+    owner = np.repeat(np.arange(len(n)), n)
+    k = np.arange(len(owner)) - np.repeat(np.cumsum(n) - n, n)
+    step = (delta / np.maximum(n, 1))[owner]
+    a0 = theta[owner] + k * step
+    a1 = a0 + step
+    alpha = 4 / 3 * np.tan(step / 4)
+    cos0, sin0, cos1, sin1 = np.cos(a0), np.sin(a0), np.cos(a1), np.sin(a1)
+    u = np.column_stack((cos0 - alpha * sin0, cos1 + alpha * sin1, cos1))
+    v = np.column_stack((sin0 + alpha * cos0, sin1 - alpha * cos1, sin1))
+    ax, ay = rx[owner, None], ry[owner, None]
+    c, s = cos_phi[owner, None], sin_phi[owner, None]
+    x = cx[owner, None] + c * ax * u - s * ay * v
+    y = cy[owner, None] + s * ax * u + c * ay * v
+
+    # The last curve of each arc ends exactly at the end point
+    last = np.cumsum(n)[curve] - 1
+    x[last, 2] = x2[curve]
+    y[last, 2] = y2[curve]
+
+    index = (offsets[owner] + 3 * k)[:, None] + np.arange(3)
+    elements['type'][index] = (CURVE_TO, CURVE_TO_DATA, CURVE_TO_DATA)
+    elements['x'][index] = x
+    elements['y'][index] = y
+    return elements, counts
+
+
+def build_elements(ops, points, arcs, arc, tolerance=None):
+    """ Generate all of the path elements of parsed path data.
+
+    Segments are generated in bulk. Arcs are converted in one batch when a
+    tolerance is given otherwise they are delegated to the given callback
+    one at a time and spliced in.
+
+    """
+    elements, segment = segment_elements(ops, points)
+    rows = np.flatnonzero(ops == ARC).tolist()
+    if rows and tolerance:
+        # Arcs start at the end of the previous segment and end exactly at
+        # their end point so the segments after them are already correct
+        rows = np.array(rows)
+        starts = np.maximum(rows - 1, 0)
+        first = rows == 0
+        x1 = np.where(first, 0.0, points[starts, 4])
+        y1 = np.where(first, 0.0, points[starts, 5])
+        curves, counts = arc_curves(x1, y1, arcs, points[rows, 4],
+                                    points[rows, 5], tolerance)
+        index = np.repeat(np.searchsorted(segment, rows), counts)
+        elements = np.insert(elements, index, curves)
+    elif rows:
+        # Where the elements of each arc and the segment after it go
+        bounds = np.searchsorted(segment, rows).tolist()
+        after = np.searchsorted(segment, [i + 2 for i in rows]).tolist()
+
+        pack = ELEMENT_STRUCT.pack
+        chunks = []
+        start = 0
+        last = (MOVE_TO, 0.0, 0.0)
+        for i, params, lo, hi in zip(rows, arcs.tolist(), bounds, after):
+            if lo > start:
+                chunks.append(elements[start:lo].tobytes())
+                last = tuple(elements[lo - 1].tolist())
+            x2, y2 = points[i, 4:].tolist()
+            result = arc_elements(last, arc, params, x2, y2)
+            if len(result):
+                chunks.append(result.tobytes())
+                last = tuple(result[-1].tolist())
+
+            # The next segment starts where the arc really ended
+            start = lo
+            if i + 1 < len(ops) and ops[i + 1] != ARC:
+                x0, y0 = last[1:]
+                following = segment_elements_from(
+                    ops[i + 1], points[i + 1].tolist(), x0, y0)
+                if following:
+                    chunks.extend(pack(*e) for e in following)
+                    last = following[-1]
+                start = hi
+        chunks.append(elements[start:].tobytes())
+        elements = np.frombuffer(b''.join(chunks), dtype=ELEMENT_DTYPE)
+
+    # A moveto directly followed by another moveto is replaced by it
+    if len(elements) > 1:
+        move = elements['type'] == MOVE_TO
+        keep = np.ones(len(elements), dtype=bool)
+        keep[:-1] = ~(move[:-1] & move[1:])
+        elements = elements[keep]
+    return elements
+
+
+def load_elements(path, elements):
+    """ Append the elements to the path in bulk.
+
+    The elements are streamed into the path through a QDataStream which
+    replaces its contents so any existing elements are streamed back in.
+
+    Parameters
+    ----------
+    path: QPainterPath
+        The path to append to
+    elements: numpy.ndarray
+        The elements as an array of ELEMENT_DTYPE
+
+    """
+    if not len(elements):
+        return
+    if path.elementCount() > 0:
+        existing = path_elements(path)
+        if existing[-1]['type'] == MOVE_TO and elements[0]['type'] == MOVE_TO:
+            existing = existing[:-1]
+        elements = np.concatenate((existing, elements))
+
+    # Concatenating may change the byte order of the fields
+    elements = elements.astype(ELEMENT_DTYPE, copy=False)
+    starts = np.flatnonzero(elements['type'] == MOVE_TO)
+    c_start = int(starts[-1]) if len(starts) else 0
+    data = b''.join((
+        np.array([len(elements)], dtype='>i4').tobytes(),
+        elements.tobytes(),
+        np.array([c_start, enum_value(path.fillRule())], dtype='>i4').tobytes()
+    ))
+    QDataStream(QByteArray(data)) >> path
+
+
+def append_path_data(path, ops, points, arcs, arc, tolerance=None):
+    """ Append parsed path data to the path.
+
+    Parameters
+    ----------
+    path: QPainterPath
+        The path to add to
+    ops, points, arcs: numpy.ndarray
+        The parsed path data as returned by `parse`
+    arc: Callable
+        Called with (path, x1, y1, rx, ry, phi, large_arc_flag, sweep_flag,
+        x2, y2) to add an arc starting at the current position of the path.
+    tolerance: float or None
+        If given arcs are converted to cubic curves in one batch within this
+        distance instead of with the callback.
+
+    """
+    if len(ops):
+        load_elements(path, build_elements(ops, points, arcs, arc,
+                                           tolerance))
@@ -16,15 +16,34 @@ Created on Jan 5, 2015
 """
 import re
 import math
+import multiprocessing
+from io import BytesIO
+from time import time
+from types import MappingProxyType
+from functools import lru_cache
 from math import sqrt, tan, atan, atan2, cos, acos, sin, pi, radians
 from lxml import etree
 from copy import deepcopy
-from enaml.qt.QtGui import QPainterPath, QTransform, QFont
-from enaml.qt.QtCore import QPointF, QRectF
+from enaml.qt.QtGui import QPainterPath, QTransform, QFont, QFontMetricsF
+from enaml.qt.QtCore import QPointF, QRectF, QByteArray, QDataStream, QIODevice
+from . import pathdata
 
 ElementType = QPainterPath.ElementType
 EtreeElement = etree._Element
 
+#: Documents with fewer elements are always parsed in one process as
+#: starting the worker processes would take longer than parsing
+PARALLEL_MIN_ELEMENTS = 20000
+
+#: Number of distinct attribute values and styles remembered once parsed
+MEMO_SIZE = 4096
+
+#: Parsed style of elements without one
+EMPTY_STYLE = MappingProxyType({})
+
+#: Bytes used by each element of a QPainterPath, two doubles and the type
+PATH_ELEMENT_SIZE = 24
+
 # Inkcut assumes 90DPI for its internal units
 # It's an odd choice, but it's fine as long as it's consistent
 # throughout.
@@ -33,11 +52,18 @@ INKCUT_DPI = 90.0
 class QtSvgItem(QPainterPath):
     tag = None
     _nodes = None
+    _root = None
+    _flattened = False
     _uuconv = {'in': INKCUT_DPI, 'pt': 1.25, 'px': 1, 'mm': 3.5433070866,
                'cm': 35.433070866, 'm': 3543.3070866,
                'km': 3543307.0866, 'pc': 15.0, 'yd': 3240, 'ft': 1080}
+    _unit = re.compile('(%s)$' % '|'.join(_uuconv.keys()))
+    _param = re.compile(
+        r'(([-+]?[0-9]+(\.[0-9]*)?|[-+]?\.[0-9]+)([eE][-+]?[0-9]+)?)')
+    _transform = re.compile(
+        r"(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?")
 
-    def __init__(self, e, nodes=None, **kwargs):
+    def __init__(self, e, nodes=None, doc=None, transform=None, **kwargs):
         if not isinstance(e, EtreeElement):
             raise TypeError("%s only works with etree Elements, "
                             "given %s" % (self, type(e)))
@@ -49,11 +75,20 @@ class QtSvgItem(QPainterPath):
         self._nodes = nodes
         self._e = e
 
+        #: The root QtSvgDoc holding the parse options
+        if doc is not None:
+            self._root = doc
+
         # Parse from node
         self.parse(e)
 
-        # Parse transform
-        self *= self.parseTransform(e)
+        # Parse transform unless the geometry was already emitted in
+        # document coordinates
+        if not self._flattened:
+            t = self.parseTransform(e)
+            if transform is not None:
+                t = t * transform
+            self *= t
 
     def __imul__(self, m):
         """ Do in place multiplication by subtracting everything from itself
@@ -117,9 +152,11 @@ class QtSvgItem(QPainterPath):
         return paths
 
     @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
     def parseUnit(value):
         """ Returns userunits given a string representation of units
-        in another system
+        in another system. Results are memoized as documents repeat the
+        same few values many times.
         """
 
         if value is None:
@@ -128,12 +165,8 @@ class QtSvgItem(QPainterPath):
         if isinstance(value, (int, float)):
             return value
 
-        unit = re.compile('(%s)$' % '|'.join(QtSvgItem._uuconv.keys()))
-        param = re.compile(
-            r'(([-+]?[0-9]+(\.[0-9]*)?|[-+]?\.[0-9]+)([eE][-+]?[0-9]+)?)')
-
-        p = param.match(value)
-        u = unit.search(value)
+        p = QtSvgItem._param.match(value)
+        u = QtSvgItem._unit.search(value)
         if p:
             retval = float(p.string[p.start():p.end()])
         else:
@@ -146,16 +179,43 @@ class QtSvgItem(QPainterPath):
         return retval
 
     @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
     def getUnit(value):
         if not value:
             return None
-        unit = re.compile('(%s)$' % '|'.join(QtSvgItem._uuconv.keys()))
-        u = unit.search(value)
+        u = QtSvgItem._unit.search(value)
         if u:
             return u.string[u.start():u.end()]
         else:
             return None
 
+    @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
+    def parseStyle(style):
+        """ Parse a style attribute into a mapping of properties to values.
+        The result is shared by all elements using the same style so it's
+        read only.
+
+        Parameters
+        ----------
+            style: String or None
+                The style attribute
+
+        Returns
+        -------
+            styles: MappingProxyType
+                The value of each property or None if it has no value
+        """
+        if not style:
+            return EMPTY_STYLE
+        styles = {}
+        for item in style.split(";"):
+            k, sep, v = item.partition(":")
+            k = k.strip()
+            if k:
+                styles[k] = v.strip() if sep else None
+        return MappingProxyType(styles)
+
     @staticmethod
     def convertToUnit(val, unit='px'):
         """ Convert from px to given unit """
@@ -184,9 +244,7 @@ class QtSvgItem(QPainterPath):
         if not trans:
             return t
 
-        m = re.match(
-            r"(translate|scale|rotate|skewX|skewY|matrix)\s*\(([^)]*)\)\s*,?",
-            trans)
+        m = QtSvgItem._transform.match(trans)
         if m is None:
             return t
 
@@ -237,7 +295,7 @@ class QtSvgItem(QPainterPath):
             t = t*QTransform(*map(float, args))
 
         if m.end() < len(trans):
-            t = self.parseTransform(trans[m.end():])*t
+            t = QtSvgItem.parseTransform(self, trans[m.end():])*t
 
         return t
 
@@ -301,6 +359,8 @@ class QtSvgRect(QtSvgItem):
 
 class QtSvgPath(QtSvgItem):
     tag = "{http://www.w3.org/2000/svg}path"
+    _delim = re.compile(r'[ \t\r\n,]+')
+    _command = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]')
 
     # From  simplepath.py's parsePath by Aaron Spike, aaron@ekips.org
     pathdefs = {
@@ -396,6 +456,16 @@ class QtSvgPath(QtSvgItem):
         if not d:
             return
 
+        doc = self._root
+        fast = doc is None or doc.fast_parser
+        tolerance = doc.arc_tolerance if doc is not None else None
+
+        if fast and len(d) >= pathdata.MIN_LENGTH:
+            ops, points, arcs = pathdata.parse(d)
+            pathdata.append_path_data(self, ops, points, arcs,
+                                      QtSvgPath.arc, tolerance)
+            return
+
         for cmd, params in self.parsePath(d):
             if cmd == 'M':
                 self.moveTo(*params)
@@ -410,7 +480,15 @@ class QtSvgPath(QtSvgItem):
                 x1 = self.currentPosition().x()
                 y1 = self.currentPosition().y()
                 (rx, ry, x_axis_rotation, large_arc_flag, sweep_flag, x2, y2) = params
-                self.arc(x1, y1, rx, ry, x_axis_rotation, large_arc_flag, sweep_flag, x2, y2)
+                if tolerance:
+                    curves = pathdata.arc_to_curves(
+                        x1, y1, params[:5], x2, y2, tolerance)
+                    if curves is None:
+                        self.lineTo(x2, y2)
+                    for curve in curves or ():
+                        self.cubicTo(*curve)
+                else:
+                    self.arc(x1, y1, rx, ry, x_axis_rotation, large_arc_flag, sweep_flag, x2, y2)
 
             elif cmd == 'Z':
                 self.lineTo(mx, my)  # not self.closeSubpath() as arc() may have internal moveTo calls
@@ -424,10 +502,9 @@ class QtSvgPath(QtSvgItem):
         """
         offset = 0
         length = len(d)
-        delim = re.compile(r'[ \t\r\n,]+')
-        command = re.compile(r'[MLHVCSQTAZmlhvcsqtaz]')
-        parameter = re.compile(
-            r'(([-+]?[0-9]+(\.[0-9]*)?|[-+]?\.[0-9]+)([eE][-+]?[0-9]+)?)')
+        delim = self._delim
+        command = self._command
+        parameter = self._param
         while True:
             m = delim.match(d, offset)
             if m:
@@ -568,13 +645,18 @@ class QtSvgUse(QtSvgItem):
     xlink = "{http://www.w3.org/1999/xlink}href"
 
     def parseLink(self, e):
-        link = e.attrib.get(self.xlink, '').split("#")
+        link = e.attrib.get(QtSvgUse.xlink, '').split("#")
         if len(link) != 2:
             raise NotImplementedError(
                     "Cannot link to documents outside this "
                     "document, given %s!" % ("#".join(link),))
         link, id = link
 
+        # Use the document's index instead of searching the whole tree
+        doc = self._root
+        if doc is not None:
+            return doc.getElementById(id)
+
         svg = e.getroottree().getroot()
         ref = svg.xpath('//*[@id="%s"]' % id)
         if len(ref) > 0:
@@ -585,14 +667,14 @@ class QtSvgUse(QtSvgItem):
         if ref is None:
             return
         elif ref.tag == QtSvgSymbol.tag:
-            self.addPath(QtSvgSymbol(ref, self._nodes))
+            self.addPath(QtSvgSymbol(ref, self._nodes, doc=self._root))
         else:
             g = etree.Element(QtSvgG.tag)
             g.append(deepcopy(ref))
-            self.addPath(QtSvgG(g, self._nodes))
+            self.addPath(QtSvgG(g, self._nodes, doc=self._root))
 
     def parseTransform(self, e):
-        t = super(QtSvgUse, self).parseTransform(e)
+        t = QtSvgItem.parseTransform(self, e)
         if isinstance(e, EtreeElement):
             x, y = map(self.parseUnit, (e.attrib.get('x', 0),
                                         e.attrib.get('y', 0)))
@@ -602,6 +684,7 @@ class QtSvgUse(QtSvgItem):
 
 class QtSvgText(QtSvgItem):
     tag = "{http://www.w3.org/2000/svg}text"
+    tspan = "{http://www.w3.org/2000/svg}tspan"
 
     stylemap = {
         'normal': QFont.StyleNormal,
@@ -609,13 +692,146 @@ class QtSvgText(QtSvgItem):
         'oblique': QFont.StyleOblique
     }
 
+    weightmap = {
+        'normal': 400,
+        'bold': 700,
+        'lighter': 300,
+        'bolder': 900,
+    }
+
+    #: Style properties that are inherited by tspans
+    font_properties = ('font-style', 'font-weight', 'font-size',
+                       'font-family', 'text-anchor')
+
+    #: Glyphs are outlined at this size and scaled as it's much more
+    #: precise than rounding to the nearest pixel size
+    glyph_size = 1000
+
     def parse(self, e):
-        x, y = map(self.parseUnit, (e.attrib.get('x', 0),
-                                    e.attrib.get('y', 0)))
-        font = self.parseFont(e)
-        self.addText(x, y, font, e.text)
+        #: Glyphs of each text chunk, a new chunk is started whenever the
+        #: position is set explicitly
+        self._chunks = []
+        self.parseSpan(e, {'font-size': '16', 'text-anchor': 'start'}, 0, 0)
+        for anchor, start, end, glyphs in self._chunks:
+            shift = 0
+            if anchor == 'middle':
+                shift = (start - end) / 2
+            elif anchor == 'end':
+                shift = start - end
+            for glyph, x, y in glyphs:
+                self.addPath(glyph.translated(x + shift, y))
+        del self._chunks
+
+    def parseSpan(self, e, styles, x, y):
+        """ Add the glyphs of the text or tspan and its children.
 
-    def parseFont(self, e):
+        Parameters
+        ----------
+            e: Element
+                The text or tspan element
+            styles: Dict
+                The styles inherited from the parent
+            x, y: Float
+                The current text position
+
+        Returns
+        -------
+            position: Tuple
+                The text position after the last glyph
+        """
+        styles = self.mergeStyles(e, styles)
+        font = self.parseFont(styles)
+        size = self.parseUnit(styles['font-size'])
+
+        attrs = e.attrib
+        if 'x' in attrs or 'y' in attrs or not self._chunks:
+            x = self.parseUnit((attrs.get('x', '').split() or [x])[0])
+            y = self.parseUnit((attrs.get('y', '').split() or [y])[0])
+            self._chunks.append([styles['text-anchor'], x, x, []])
+        x += self.parseUnit((attrs.get('dx', '').split() or [0])[0])
+        y += self.parseUnit((attrs.get('dy', '').split() or [0])[0])
+
+        x = self.addGlyphs(font, size, e.text, x, y)
+        for node in e:
+            if node.tag == QtSvgText.tspan:
+                x, y = self.parseSpan(node, styles, x, y)
+            x = self.addGlyphs(font, size, node.tail, x, y)
+        return x, y
+
+    def addGlyphs(self, font, size, text, x, y):
+        """ Add each character to the current chunk and return the position
+        after the last one.
+
+        """
+        if not text:
+            return x
+        chunk = self._chunks[-1]
+        text = re.sub(r'\s+', ' ', text)
+        for char in text:
+            glyph, advance = self.glyph(font, size, char)
+            if not glyph.isEmpty():
+                chunk[3].append((glyph, x, y))
+            x += advance
+        chunk[2] = x
+        return x
+
+    @classmethod
+    def glyph(cls, font, size, char):
+        """ Get the outline and advance of a character from the cache or
+        create it if this is the first use.
+
+        Parameters
+        ----------
+            font: QFont
+                The font outlined at `glyph_size`
+            size: Float
+                The font size in user units
+            char: String
+                The character
+
+        Returns
+        -------
+            glyph: Tuple[QPainterPath, Float]
+                The outline with the origin on the baseline and the advance
+        """
+        return QtSvgText.outline(font.toString(), size, char)
+
+    @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
+    def outline(font, size, char):
+        """ Create the outline and advance of a character. The most recently
+        used glyphs are shared by all documents.
+
+        Parameters
+        ----------
+            font: String
+                The description of the font from `QFont.toString`
+            size: Float
+                The font size in user units
+            char: String
+                The character
+        """
+        qfont = QFont()
+        qfont.fromString(font)
+        scale = size / QtSvgText.glyph_size
+        path = QPainterPath()
+        path.addText(0, 0, qfont, char)
+        advance = QFontMetricsF(qfont).horizontalAdvance(char) * scale
+        return QTransform.fromScale(scale, scale).map(path), advance
+
+    def mergeStyles(self, e, parent):
+        """ Merge the font styles of the element with those of the parent """
+        styles = dict(parent)
+        for k in self.font_properties:
+            if k in e.attrib:
+                styles[k] = e.attrib[k]
+        for k, v in self.parseStyle(e.attrib.get('style')).items():
+            k = k.lower()
+            if v is not None and k in self.font_properties:
+                styles[k] = v
+        return styles
+
+    def parseFont(self, styles):
         """
         font-style:italic;
         font-variant:normal;
@@ -640,25 +856,18 @@ class QtSvgText(QtSvgItem):
 
         """
         font = QFont()
-        styles = {}
-        for item in e.attrib.get('style', '').split(";"):
-            k, v = item.split(":")
-            styles[k.lower()] = v.lower()
-
+        font.setPixelSize(self.glyph_size)
         if 'font-style' in styles:
             font.setStyle(self.stylemap.get(
-                styles['font-style'].lower(), 'normal'))
-        # if 'font-variant' in styles:
+                styles['font-style'].lower(), QFont.StyleNormal))
         if 'font-weight' in styles:
-            font.setWeight(self.parseUnit(styles['font-weight']))
-        if 'font-stretch' in styles:
-            font.setStretch(self.parseUnit(styles['font-stretch']))
-        if 'font-size' in styles:
-            font.setPixelSize(self.parseUnit(styles['font-size']))
+            weight = styles['font-weight'].lower()
+            weight = self.weightmap.get(weight) or self.parseUnit(weight)
+            weight = min(900, max(100, int(round(weight / 100.0)) * 100))
+            font.setWeight(QFont.Weight(weight))
         if 'font-family' in styles:
-            font.setFamily(styles['font-family'])
-        # if 'line-height' in styles:
-        #    font.setLineHeight(self.parseUnit(styles['font-size']))
+            family = styles['font-family'].split(",")[0]
+            font.setFamily(family.strip().strip("'\""))
         return font
 
 
@@ -668,10 +877,6 @@ class QtSvgG(QtSvgItem):
     def parse(self, e):
         valid_nodes = self._nodes
         for node in e:
-            if node.tag == QtSvgText.tag:
-                raise ValueError("Text nodes are not supported. "
-                                 "Please convert all text to paths and "
-                                 "re-open the document.")
             if valid_nodes and node not in valid_nodes:
                 continue
 
@@ -686,21 +891,199 @@ class QtSvgG(QtSvgItem):
                         QtSvgPolyline,
                         QtSvgLine,
                         QtSvgUse,
-                        #QtSvgText
+                        QtSvgText,
                     ]:
                 if node.tag == cls.tag:
-                    self.addPath(cls(node, valid_nodes))
+                    if cls in (QtSvgG, QtSvgDoc, QtSvgUse):
+                        self.addPath(cls(node, valid_nodes, doc=self._root))
+                    else:
+                        self.addShape(cls, node)
                     break
 
+    def addShape(self, cls, node, transform=None, tags=None):
+        """ Add the path of a shape element reusing the geometry of an
+        identical element from the document's geometry cache if possible.
+
+        Parameters
+        ----------
+            cls: Class
+                The QtSvgItem subclass to parse the element with
+            node: Element
+                The shape element
+            transform: QTransform or None
+                The transform from the parent of the element to document
+                coordinates
+            tags: frozenset or None
+                If given the path is also added to the geometry table of the
+                document with these tags
+        """
+        doc = self._root
+        cache = doc.geometry if doc is not None else None
+        if cache is None:
+            path = cls(node, self._nodes, doc=doc, transform=transform)
+        else:
+            key = cache.key(etree.tostring(node, with_tail=False), transform,
+                            (doc.fast_parser, doc.arc_tolerance))
+            path = cache.get(key)
+            if path is None:
+                path = QPainterPath(cls(node, self._nodes, doc=doc,
+                                        transform=transform))
+                cache.set(key, path)
+        self.addPath(path)
+        if tags is not None:
+            doc.addElement(tags, path)
+
+    def addFlattened(self, e, transform, tags=None):
+        """ Add the shapes within the element to this path with the transforms
+        of all of their parents composed into one. Unlike parse, no paths are
+        created for the groups so each shape is only mapped once.
+
+        Parameters
+        ----------
+            e: Element
+                The element containing the shapes
+            transform: QTransform
+                The transform from the element to document coordinates
+            tags: frozenset or None
+                If given the shapes are also added to the geometry table of
+                the document tagged with these and the tags of the elements
+                they are within.
+        """
+        valid_nodes = self._nodes
+        for node in e:
+            tag = node.tag
+            if valid_nodes and node not in valid_nodes:
+                continue
+
+            node_tags = tags
+            if tags is not None and isinstance(tag, str):
+                node_tags = self.elementTags(node, tags)
+
+            if tag == QtSvgG.tag:
+                t = QtSvgItem.parseTransform(self, node)
+                self.addFlattened(node, t * transform, node_tags)
+            elif tag == QtSvgDoc.tag:
+                # Nested svg elements are only positioned
+                t = QTransform()
+                t.translate(*map(self.parseUnit, (node.attrib.get('x', 0),
+                                                  node.attrib.get('y', 0))))
+                self.addFlattened(node, t * transform, node_tags)
+            elif tag == QtSvgUse.tag:
+                ref = QtSvgUse.parseLink(self, node)
+                if ref is None:
+                    continue
+                t = QtSvgUse.parseTransform(self, node) * transform
+                if ref.tag == QtSvgSymbol.tag:
+                    t = QtSvgItem.parseTransform(self, ref) * t
+                    if node_tags is not None:
+                        node_tags = self.elementTags(ref, node_tags)
+                    self.addFlattened(ref, t, node_tags)
+                else:
+                    # The referenced element is treated as the only
+                    # child of a group
+                    self.addFlattened((ref,), t, node_tags)
+            else:
+                for cls in [
+                            QtSvgPath,
+                            QtSvgRect,
+                            QtSvgCircle,
+                            QtSvgEllipse,
+                            QtSvgPolygon,
+                            QtSvgPolyline,
+                            QtSvgLine,
+                            QtSvgText,
+                        ]:
+                    if tag == cls.tag:
+                        self.addShape(cls, node, transform, node_tags)
+                        break
+
 
 class QtSvgSymbol(QtSvgG):
     tag = "{http://www.w3.org/2000/svg}symbol"
 
 
+class QtSvgImage(object):
+    """ Images are never cut, only their bounds are used """
+    tag = "{http://www.w3.org/2000/svg}image"
+    links = (QtSvgUse.xlink, "href")
+
+    @staticmethod
+    def strip(e):
+        """ Remove the embedded data of an image element """
+        for attr in QtSvgImage.links:
+            if e.attrib.get(attr, '').startswith('data:'):
+                del e.attrib[attr]
+
+    @staticmethod
+    def bounds(e, transform):
+        """ Return the rect of an image element mapped by the transform of
+        its parent and its own transform.
+
+        """
+        x, y, w, h = map(QtSvgItem.parseUnit, (
+            e.attrib.get('x', 0), e.attrib.get('y', 0),
+            e.attrib.get('width', 0), e.attrib.get('height', 0)))
+        t = QtSvgItem.parseTransform(None, e) * transform
+        return t.mapRect(QRectF(x, y, w, h))
+
+
 class QtSvgDoc(QtSvgG):
     tag = "{http://www.w3.org/2000/svg}svg"
+    groupmode = "{http://www.inkscape.org/namespaces/inkscape}groupmode"
+    _ids = None
 
-    def __init__(self, e, ids=None, parent=False, dpi_default=96.0, dpi_auto_detect_inkscape=True):
+    #: Source of a document loaded from the cache, the xml is only parsed
+    #: if it is accessed
+    _source = None
+
+    #: Indexes of the top level elements to include
+    _parts = None
+
+    #: Whether the document was parsed incrementally from a file
+    streaming = False
+
+    #: Maximum error of the curves arcs are converted to
+    arc_tolerance = None
+
+    #: File a streamed document was read from
+    _file = None
+
+    #: Predicates of the elements skipped when streaming
+    exclude = ()
+
+    #: Bounds of the images in document coordinates when their data is
+    #: stripped
+    images = ()
+
+    #: Cache of the geometry of each element
+    geometry = None
+
+    #: Geometry table of a tagged document. A list of (tags, path) in
+    #: document order where consecutive shapes with the same tags share a
+    #: path.
+    elements = None
+
+    #: Inkscape layer label
+    label = "{http://www.inkscape.org/namespaces/inkscape}label"
+
+    #: Style properties shapes are tagged with
+    tag_properties = ('fill', 'stroke')
+
+    #: Stylesheet element
+    style = "{http://www.w3.org/2000/svg}style"
+    _css_comment = re.compile(r'/\*.*?\*/', re.S)
+    _css_rule = re.compile(r'([^{}]+)\{([^{}]*)\}')
+    _css_selector = re.compile(r'(\*|[\w-]+)?((?:[.#][\w-]+)*)$')
+
+    #: Index of the layers and styles used in the document
+    _styleIndex = None
+
+    def __init__(self, e, ids=None, parent=False, dpi_default=96.0,
+                 dpi_auto_detect_inkscape=True, fast_parser=True,
+                 flatten=False, doc=None, cache=None, parallel=False,
+                 parts=None, streaming=False, exclude=None,
+                 strip_images=False, arc_tolerance=None, geometry=None,
+                 tagged=False):
         """
         Creates a QtPainterPath from an SVG document applying all transforms.
 
@@ -712,37 +1095,812 @@ class QtSvgDoc(QtSvgG):
                 An lxml etree.Element or an argument to pass to etree.parse()
             ids: List
                 List of node ids to include. If not given all will be used.
+            fast_parser: Bool
+                Parse path data with the vectorized parser in
+                `inkcut.core.pathdata` instead of token by token.
+            flatten: Bool
+                Compose the transforms of all groups and add each shape
+                already in document coordinates instead of building and
+                mapping a path for every group.
+            doc: QtSvgDoc
+                The root document when this is a nested svg element.
+            cache: inkcut.core.cache.ParseCache
+                If given the geometry of documents read from a file or string
+                is loaded from and saved to this cache.
+            parallel: Bool
+                Parse the top level groups of large documents in a pool of
+                processes.
+            parts: List[Int]
+                Indexes of the top level elements to parse. This is used by
+                the worker processes of a parallel parse.
+            streaming: Bool
+                Parse a document read from a file with iterparse and discard
+                each element once its geometry is added. Only the metadata
+                needed by the layer and color filters is kept in `_e`. The
+                cache and parallel options are not used in this mode.
+            exclude: List[Callable]
+                When streaming, elements for which any of these return True
+                are skipped along with their children.
+            strip_images: Bool
+                Remove the embedded data of `<image>` elements after parsing
+                so it's not kept in memory or copied by the filters. The
+                bounds of the images are saved in `images`.
+            arc_tolerance: Float
+                If given, arcs are converted to cubic curves in one batch
+                per path staying within this distance of the true arc
+                instead of with QPainterPath.arcTo one at a time.
+            geometry: inkcut.core.cache.GeometryCache
+                If given the path of each shape is looked up in and saved to
+                this cache so only elements that changed since the document
+                was last opened are parsed again. Not used by the worker
+                processes of a parallel parse.
+            tagged: Bool
+                Also build a geometry table in `elements` where each shape
+                is tagged with the layers, fills and strokes of itself and
+                the elements it is within so filters can mask shapes instead
+                of parsing the document again. The shapes are added
+                flattened and the table holds a second copy of the path.
+                Not used when streaming. See `tagElements` to build the
+                table later.
         """
         self.dpi_default = dpi_default
         self.dpi_auto_detect_inkscape = dpi_auto_detect_inkscape
+        self.fast_parser = fast_parser
+        self.flatten = flatten
+        self.parallel = parallel
+        self.strip_images = strip_images
+        self.arc_tolerance = arc_tolerance
+        self.geometry = geometry
+        self.tagged = tagged
+        self.ids = ids
+        if parts is not None:
+            self._parts = parts
 
         is_etree = isinstance(e, EtreeElement)
         self.isParentSvg = parent or not is_etree
+        if streaming and isinstance(e, str) and not e.startswith("<?xml"):
+            QPainterPath.__init__(self)
+            self.viewBox = QRectF(0, 0, -1, -1)
+            self.streaming = True
+            self.exclude = tuple(exclude or ())
+            self._file = e
+            self._root = self
+            self.parseStream(e)
+            return
+
+        key = None
         if self.isParentSvg:
-            if not is_etree:
+            doc = self
+            if cache is not None and isinstance(e, str):
+                start = time()
+                source = e
+                if e.startswith("<?xml"):
+                    data = e.encode()
+                    source = "pasted document"
+                else:
+                    with open(e, 'rb') as f:
+                        data = f.read()
+                key = cache.key(
+                    data, ids=sorted(ids or []), dpi_default=dpi_default,
+                    dpi_auto_detect_inkscape=dpi_auto_detect_inkscape,
+                    strip_images=strip_images, arc_tolerance=arc_tolerance,
+                    tagged=tagged)
+                geometry = cache.get(key)
+                if geometry is not None:
+                    QPainterPath.__init__(self)
+                    self.viewBox = QRectF(0, 0, -1, -1)
+                    self._source = data
+                    self.loadGeometry(geometry)
+                    cache.record(True, start, source)
+                    return
+                if e.startswith("<?xml"):
+                    e = self._svg = etree.fromstring(data)
+                else:
+                    self._doc = etree.parse(BytesIO(data), base_url=e)
+                    e = self._svg = self._doc.getroot()
+            elif not is_etree:
                 if isinstance(e, str) and e.startswith("<?xml"):
                     e = self._svg = etree.fromstring(e.encode())
                 else:
                     self._doc = etree.parse(e)
                     e = self._svg = self._doc.getroot()
+            if strip_images:
+                self.stripImages(e)
+            self._ids = self.indexIds(e)
             if ids:
                 nodes = set()
-                xpath = self._svg.xpath
                 for node_id in ids:
-                    nodes.update(set(xpath('//*[@id="%s"]' % node_id)))
+                    node = self._ids.get(node_id)
+                    if node is not None:
+                        nodes.add(node)
 
                 # Find all nodes and their parents
                 valid_nodes = set()
                 for node in nodes:
                     valid_nodes.add(node)
                     parent = node.getparent()
-                    while parent:
+                    while parent is not None:
                         valid_nodes.add(parent)
                         parent = parent.getparent()
                 self._nodes = valid_nodes
 
             self.viewBox = QRectF(0, 0, -1, -1)
-        super(QtSvgDoc, self).__init__(e, self._nodes)
+        super(QtSvgDoc, self).__init__(e, self._nodes, doc=doc)
+
+        if key is not None:
+            cache.set(key, self.saveGeometry())
+            cache.record(False, start, source)
+
+    def __getattr__(self, name):
+        # Parse the xml of a document loaded from the cache when it's used
+        if name == 'stylesheet':
+            self.loadStylesheet(
+                [node.text for node in self._e.iter(QtSvgDoc.style)])
+            return self.stylesheet
+        if name in ('_e', '_svg', '_doc') and self._source is not None:
+            self._svg = self._e = etree.fromstring(self._source)
+            self._doc = self._svg.getroottree()
+            self._source = None
+            if self.strip_images:
+                for node in self._e.iter(QtSvgImage.tag):
+                    QtSvgImage.strip(node)
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def saveGeometry(self):
+        """ Serialize the path into bytes
+
+        Returns
+        -------
+            data: Bytes
+                The path written by a QDataStream
+        """
+        data = QByteArray()
+        stream = QDataStream(data, QIODevice.WriteOnly)
+        stream << self
+        stream.writeInt32(len(self.images))
+        for rect in self.images:
+            stream << rect
+        self.writeElements(stream, self.elements)
+        return bytes(data)
+
+    def loadGeometry(self, data):
+        """ Replace the path with one serialized by `saveGeometry`
+
+        Parameters
+        ----------
+            data: Bytes
+                The path written by a QDataStream
+        """
+        stream = QDataStream(QByteArray(data))
+        stream >> self
+        self.images = self.readImages(stream)
+        self.elements = self.readElements(stream)
+
+    @staticmethod
+    def readImages(stream):
+        images = []
+        for i in range(stream.readInt32()):
+            rect = QRectF()
+            stream >> rect
+            images.append(rect)
+        return images
+
+    @staticmethod
+    def writeElements(stream, elements):
+        """ Write a geometry table to the stream
+
+        Parameters
+        ----------
+            stream: QDataStream
+                The stream to write to
+            elements: List or None
+                The geometry table
+        """
+        if elements is None:
+            stream.writeInt32(-1)
+            return
+        stream.writeInt32(len(elements))
+        for tags, path in elements:
+            stream.writeInt32(len(tags))
+            for kind, value in sorted(tags):
+                stream.writeQString(kind)
+                stream.writeQString(value)
+            stream << path
+
+    @staticmethod
+    def readElements(stream):
+        """ Read a geometry table written by `writeElements`
+
+        Parameters
+        ----------
+            stream: QDataStream
+                The stream to read from
+
+        Returns
+        -------
+            elements: List or None
+                The geometry table
+        """
+        count = stream.readInt32()
+        if count < 0:
+            return None
+        elements = []
+        for i in range(count):
+            tags = frozenset(
+                (stream.readQString(), stream.readQString())
+                for j in range(stream.readInt32()))
+            path = QPainterPath()
+            stream >> path
+            elements.append((tags, path))
+        return elements
+
+    def elementTags(self, e, tags):
+        """ Add the tags of an element to those of its parent
+
+        Parameters
+        ----------
+            e: Element
+                The element
+            tags: frozenset
+                The tags of the parent
+
+        Returns
+        -------
+            tags: frozenset
+                The tags of the parent with ('layer', label) if it's a
+                layer and a (property, value) for each of the
+                `tag_properties` set in its style or by the stylesheet.
+        """
+        attrib = e.attrib
+        groupmode = attrib.get(QtSvgDoc.groupmode)
+        if self.stylesheet:
+            style = self.elementStyle(e)
+            added = tuple((k, style[k]) for k in QtSvgDoc.tag_properties
+                          if style.get(k) is not None)
+        else:
+            style = attrib.get('style')
+            if style is None and groupmode is None:
+                return tags
+            added = QtSvgDoc.styleTags(style)
+        if groupmode == 'layer':
+            label = attrib.get(QtSvgDoc.label)
+            if label is not None:
+                added += (('layer', label),)
+        return tags.union(added) if added else tags
+
+    @staticmethod
+    @lru_cache(maxsize=MEMO_SIZE)
+    def styleTags(style):
+        """ Return a (property, value) tag for each of the `tag_properties`
+        set in the style.
+
+        """
+        style = QtSvgItem.parseStyle(style)
+        return tuple((k, style[k]) for k in QtSvgDoc.tag_properties
+                     if style.get(k) is not None)
+
+    @staticmethod
+    def parseStylesheet(text):
+        """ Parse the rules of a `<style>` element. Only selectors made of
+        a tag, an id and classes such as `rect`, `.a`, `path.a.b` or `#id`
+        are supported, rules using any others are ignored.
+
+        Parameters
+        ----------
+            text: String
+                The css text
+
+        Returns
+        -------
+            rules: List
+                A (specificity, tag, id, classes, style) tuple for each
+                selector of each rule
+        """
+        rules = []
+        text = QtSvgDoc._css_comment.sub('', text or '')
+        for selectors, body in QtSvgDoc._css_rule.findall(text):
+            style = QtSvgItem.parseStyle(body.strip())
+            for selector in selectors.split(","):
+                m = QtSvgDoc._css_selector.match(selector.strip())
+                if not m or not selector.strip():
+                    continue
+                tag = m.group(1) if m.group(1) != '*' else None
+                node_id = None
+                classes = []
+                for part in re.findall(r'[.#][\w-]+', m.group(2)):
+                    if part[0] == '#':
+                        node_id = part[1:]
+                    else:
+                        classes.append(part[1:])
+                specificity = (node_id is not None, len(classes),
+                               tag is not None)
+                rules.append((specificity, tag, node_id, frozenset(classes),
+                              style))
+        return rules
+
+    def loadStylesheet(self, texts):
+        """ Set the stylesheet from the text of the `<style>` elements of
+        the document. Rules are sorted so those with a higher specificity
+        are applied last.
+
+        """
+        rules = []
+        for text in texts:
+            rules.extend(self.parseStylesheet(text))
+        rules.sort(key=lambda rule: rule[0])
+        self.stylesheet = tuple(rules)
+        self._cascade = {}
+        self._cascadeIds = any(rule[2] is not None for rule in rules)
+
+    def elementStyle(self, e):
+        """ Return the style of an element including the properties set by
+        the rules of the stylesheet that match it. Like `parseStyle` the
+        result is shared and read only.
+
+        Parameters
+        ----------
+            e: Element
+                The element
+
+        Returns
+        -------
+            styles: MappingProxyType
+                The value of each property
+        """
+        attrib = e.attrib
+        style = attrib.get('style')
+        stylesheet = self.stylesheet
+        if not stylesheet:
+            return QtSvgItem.parseStyle(style)
+        tag = e.tag
+        if not isinstance(tag, str):
+            return EMPTY_STYLE
+        node_id = attrib.get('id') if self._cascadeIds else None
+        key = (tag, attrib.get('class'), node_id, style)
+        result = self._cascade.get(key)
+        if result is None:
+            name = tag.rsplit('}', 1)[-1]
+            classes = set((key[1] or '').split())
+            styles = {}
+            for specificity, t, i, c, rule in stylesheet:
+                if ((t is None or t == name) and (i is None or i == node_id)
+                        and c <= classes):
+                    styles.update(rule)
+            styles.update(QtSvgItem.parseStyle(style))
+            result = self._cascade[key] = MappingProxyType(styles)
+        return result
+
+    def styleIndex(self):
+        """ Index the layers and the values of every style property used in
+        the document in a single pass over the tree. Styles set by the
+        stylesheet are included.
+
+        Returns
+        -------
+            index: Dict
+                The `layers` as a list of (element, label) and the `styles`
+                as a dict of each property to the list of values it's set
+                to, both in document order.
+        """
+        if self._styleIndex is not None:
+            return self._styleIndex
+        layers = []
+        styles = {}
+        seen = set()
+        groupmode = QtSvgDoc.groupmode
+        for node in self._e.iter():
+            if not isinstance(node.tag, str):
+                continue
+            attrib = node.attrib
+            if attrib.get(groupmode) == 'layer':
+                label = attrib.get(QtSvgDoc.label)
+                if label is not None:
+                    layers.append((node, label))
+            style = self.elementStyle(node)
+            if id(style) in seen:
+                continue
+            seen.add(id(style))
+            for k, v in style.items():
+                if v is not None:
+                    styles.setdefault(k, {})[v] = None
+        self._styleIndex = {
+            'layers': layers,
+            'styles': {k: list(v) for k, v in styles.items()},
+        }
+        return self._styleIndex
+
+    def releaseTree(self):
+        """ Drop the xml tree of a tagged or streamed document once the
+        options of the filters are known. Filters then only use the geometry
+        table or read the file again. The stylesheet and style index are
+        kept but the index no longer references the layer elements.
+
+        """
+        if self.elements is None and not self.streaming:
+            raise ValueError("Only tagged or streamed documents can be "
+                             "filtered without the tree")
+        self.stylesheet  # Parse it while the tree is available
+        index = self.styleIndex()
+        index['layers'] = [(None, label) for g, label in index['layers']]
+        self._e = self._svg = self._doc = None
+        self._ids = self._nodes = self._source = None
+
+    def memoryUsage(self):
+        """ Estimate the memory used by the document in bytes
+
+        Returns
+        -------
+            usage: Dict
+                The size of the `path`, the geometry table in `elements` and
+                the serialized xml `tree`.
+        """
+        usage = {
+            'path': self.elementCount() * PATH_ELEMENT_SIZE,
+            'elements': sum(path.elementCount() for tags, path in
+                            self.elements or ()) * PATH_ELEMENT_SIZE,
+            'tree': 0,
+        }
+        e = self.__dict__.get('_e')
+        if e is not None:
+            usage['tree'] = len(etree.tostring(e))
+        elif self._source is not None:
+            usage['tree'] = len(self._source)
+        return usage
+
+    def addElement(self, tags, path):
+        """ Add a shape to the geometry table merging it with the previous
+        one if it has the same tags.
+
+        """
+        elements = self.elements
+        if elements and elements[-1][0] == tags:
+            elements[-1][1].addPath(path)
+        else:
+            elements.append((tags, QPainterPath(path)))
+
+    def tagElements(self):
+        """ Build the geometry table of a document parsed without one so the
+        filters can mask it. The document is parsed again from its tree so
+        this is only done the first time a filter needs the table.
+
+        """
+        if self.elements is not None:
+            return
+        if self.streaming:
+            raise ValueError("Streamed documents can not be tagged")
+        doc = QtSvgDoc(self._e, parent=True, tagged=True, ids=self.ids,
+                       dpi_default=self.dpi_default,
+                       dpi_auto_detect_inkscape=self.dpi_auto_detect_inkscape,
+                       fast_parser=self.fast_parser, parallel=self.parallel,
+                       arc_tolerance=self.arc_tolerance,
+                       geometry=self.geometry)
+        self.elements = doc.elements
+        self.tagged = True
+
+    def masked(self, tags):
+        """ Create a copy of a tagged document without the shapes tagged with
+        any of the given tags.
+
+        Parameters
+        ----------
+            tags: Iterable
+                Tags of the shapes to remove
+
+        Returns
+        -------
+            doc: QtSvgDoc
+                The filtered document
+        """
+        tags = frozenset(tags)
+        doc = QtSvgDoc.__new__(QtSvgDoc)
+        QPainterPath.__init__(doc)
+        doc.__dict__.update(self.__dict__)
+        doc.elements = [(t, path) for t, path in self.elements
+                        if tags.isdisjoint(t)]
+        for t, path in doc.elements:
+            doc.addPath(path)
+        return doc
+
+    def parse(self, e):
+        if not self.isParentSvg:
+            return super(QtSvgDoc, self).parse(e)
+
+        if (self._parts is None and self.parallel and
+                multiprocessing.cpu_count() > 1):
+            parts = [i for i, node in enumerate(e)
+                     if isinstance(node.tag, str)]
+            if len(parts) > 1 and self.countElements(e) >= \
+                    PARALLEL_MIN_ELEMENTS:
+                self.parseParallel(e, parts)
+                return
+
+        nodes = e if self._parts is None else [e[i] for i in self._parts]
+        if self.tagged:
+            self.elements = []
+            self.addFlattened(nodes, self.parseTransform(e), frozenset())
+            self._flattened = True
+        elif self.flatten:
+            self.addFlattened(nodes, self.parseTransform(e))
+            self._flattened = True
+        else:
+            super(QtSvgDoc, self).parse(nodes)
+
+    def parseStream(self, path):
+        """ Parse the file incrementally adding each shape in document
+        coordinates as soon as it's complete then discard it. Elements
+        referenced by a `use` are copied before being discarded and uses
+        of elements defined later in the file are added at the end.
+
+        Parameters
+        ----------
+            path: String
+                Path of the svg file
+        """
+        texts = []
+        refs = self.scanReferences(path, texts)
+        self.loadStylesheet(texts)
+        ids = set(self.ids) if self.ids else None
+        exclude = self.exclude
+        self._ids = {}
+
+        #: Transform of each open element or None if it's not drawn
+        transforms = []
+        skeleton = None
+        styles = set()
+        skipped = 0
+        retained = 0
+        deferred = []
+        if self.strip_images:
+            self.images = []
+        for event, node in etree.iterparse(path, events=('start', 'end'),
+                                           huge_tree=True):
+            tag = node.tag
+            if event == 'start':
+                if skipped or (transforms and
+                               any(f(node) for f in exclude)):
+                    skipped += 1
+                    continue
+                if not transforms:
+                    if tag != QtSvgDoc.tag:
+                        raise ValueError("%s is not an svg document" % path)
+                    t = self.parseTransform(node)
+                    skeleton = etree.Element(tag, dict(node.attrib),
+                                             nsmap=node.nsmap)
+                else:
+                    parent = transforms[-1]
+                    if parent is None:
+                        t = None
+                    elif tag == QtSvgG.tag:
+                        t = QtSvgItem.parseTransform(self, node) * parent
+                    elif tag == QtSvgDoc.tag:
+                        t = QTransform()
+                        t.translate(*map(self.parseUnit, (
+                            node.attrib.get('x', 0),
+                            node.attrib.get('y', 0))))
+                        t = t * parent
+                    else:
+                        t = None
+                    self.addStreamMetadata(skeleton, styles, node)
+                transforms.append(t)
+                if node.get('id') in refs:
+                    retained += 1
+                continue
+
+            if skipped:
+                skipped -= 1
+                if not skipped:
+                    node.getparent().remove(node)
+                elif not retained:
+                    self.releaseElement(node)
+                continue
+
+            transforms.pop()
+            node_id = node.get('id')
+            if node_id in refs:
+                retained -= 1
+                if node_id not in self._ids:
+                    self._ids[node_id] = deepcopy(node)
+
+            parent = transforms[-1] if transforms else None
+            if (parent is not None and tag not in (QtSvgG.tag, QtSvgDoc.tag)
+                    and (ids is None or node_id in ids)):
+                if tag == QtSvgImage.tag:
+                    if self.strip_images:
+                        self.images.append(QtSvgImage.bounds(node, parent))
+                elif tag == QtSvgUse.tag and \
+                        QtSvgUse.parseLink(self, node) is None:
+                    deferred.append((deepcopy(node), parent))
+                else:
+                    self.addFlattened((node,), parent)
+
+            # Children of elements that are not drawn directly such as text
+            # are released with their parent
+            if not retained and (parent is not None or not transforms):
+                self.releaseElement(node)
+
+        for node, t in deferred:
+            self.addFlattened((node,), t)
+
+        self._svg = self._e = skeleton
+        self._doc = skeleton.getroottree()
+        self._flattened = True
+
+    @staticmethod
+    def addStreamMetadata(skeleton, styles, node):
+        """ Add an attribute only copy of the layers and of the first
+        element using each style and class to the skeleton of a streamed
+        document.
+
+        """
+        style = (node.get('style'), node.get('class'))
+        if node.get(QtSvgDoc.groupmode) == 'layer':
+            etree.SubElement(skeleton, node.tag, dict(node.attrib))
+        elif style != (None, None) and style not in styles:
+            attrs = {}
+            for attr in ('style', 'class', 'id'):
+                if node.get(attr) is not None:
+                    attrs[attr] = node.get(attr)
+            etree.SubElement(skeleton, node.tag, attrs)
+        else:
+            return
+        styles.add(style)
+
+    @staticmethod
+    def scanReferences(path, stylesheets=None):
+        """ Find the ids of all elements referenced by a `use` in the file
+        without keeping the tree in memory. If a list of stylesheets is given
+        the text of the `<style>` elements is added to it.
+
+        """
+        refs = set()
+        for event, node in etree.iterparse(path, huge_tree=True):
+            if node.tag == QtSvgUse.tag:
+                link = node.get(QtSvgUse.xlink, '').split("#")
+                if len(link) == 2:
+                    refs.add(link[1])
+            elif node.tag == QtSvgDoc.style and stylesheets is not None:
+                stylesheets.append(node.text)
+            QtSvgDoc.releaseElement(node)
+        return refs
+
+    @staticmethod
+    def releaseElement(node):
+        """ Free a completed element and the siblings before it """
+        node.clear()
+        parent = node.getparent()
+        if parent is not None:
+            while node.getprevious() is not None:
+                del parent[0]
+
+    def excluding(self, predicate):
+        """ Stream the file of this document again skipping the elements
+        matching the predicate as well as those already excluded.
+
+        Parameters
+        ----------
+            predicate: Callable
+                Returns True for elements to skip
+
+        Returns
+        -------
+            doc: QtSvgDoc
+                The filtered document
+        """
+        return QtSvgDoc(
+            self._file, ids=self.ids, dpi_default=self.dpi_default,
+            dpi_auto_detect_inkscape=self.dpi_auto_detect_inkscape,
+            fast_parser=self.fast_parser, strip_images=self.strip_images,
+            arc_tolerance=self.arc_tolerance, geometry=self.geometry,
+            streaming=True,
+            exclude=self.exclude + (predicate,))
+
+    @staticmethod
+    def countElements(e):
+        return sum(1 for node in e.iter())
+
+    def parseParallel(self, e, parts):
+        """ Parse each of the top level elements in a separate process and
+        add them in order. The workers return the parts already in document
+        coordinates.
+
+        Parameters
+        ----------
+            e: Element
+                The root svg element
+            parts: List[Int]
+                Indexes of the top level elements to parse
+        """
+        options = dict(
+            ids=self.ids,
+            dpi_default=self.dpi_default,
+            dpi_auto_detect_inkscape=self.dpi_auto_detect_inkscape,
+            fast_parser=self.fast_parser,
+            flatten=self.flatten,
+            strip_images=self.strip_images,
+            arc_tolerance=self.arc_tolerance,
+            tagged=self.tagged,
+        )
+        data = etree.tostring(e)
+
+        # Qt and the twisted reactor do not survive a fork
+        context = multiprocessing.get_context('spawn')
+        processes = min(len(parts), multiprocessing.cpu_count())
+        with context.Pool(processes, initializer=_init_part_worker,
+                          initargs=(data, options)) as pool:
+            if self.tagged:
+                self.elements = []
+            for geometry in pool.imap(_parse_part, parts):
+                part = QPainterPath()
+                stream = QDataStream(QByteArray(geometry))
+                stream >> part
+                self.addPath(part)
+                if self.tagged:
+                    # Images are found by the main process
+                    self.readImages(stream)
+                    for tags, path in self.readElements(stream):
+                        self.addElement(tags, path)
+        self._flattened = True
+
+    def stripImages(self, e):
+        """ Remove the embedded data of the images drawn in the document
+        and save their bounds.
+
+        Parameters
+        ----------
+            e: Element
+                The root svg element
+        """
+        root = self.parseTransform(e)
+        self.images = []
+        for node in e.iter(QtSvgImage.tag):
+            QtSvgImage.strip(node)
+            t = root
+            parents = []
+            parent = node.getparent()
+            while parent is not None and parent is not e:
+                parents.append(parent)
+                parent = parent.getparent()
+            for parent in reversed(parents):
+                if parent.tag == QtSvgG.tag:
+                    t = QtSvgItem.parseTransform(self, parent) * t
+                elif parent.tag == QtSvgDoc.tag:
+                    t = QTransform.fromTranslate(*map(self.parseUnit, (
+                        parent.attrib.get('x', 0),
+                        parent.attrib.get('y', 0)))) * t
+                else:
+                    # Not drawn, eg in defs
+                    break
+            else:
+                self.images.append(QtSvgImage.bounds(node, t))
+
+    @staticmethod
+    def indexIds(e):
+        """ Build an index of the elements in the document by id. When an id
+        is used more than once the first element wins like an xpath lookup.
+
+        """
+        index = {}
+        for node in e.xpath('//*[@id]'):
+            index.setdefault(node.get('id'), node)
+        return index
+
+    def getElementById(self, node_id):
+        """ Lookup an element in the document by id
+
+        Parameters
+        ----------
+            node_id: String
+                The id of the element
+
+        Returns
+        -------
+            node: Element or None
+                The first element with the given id
+        """
+        if self._ids is None:
+            self._ids = self.indexIds(self._e)
+        return self._ids.get(node_id)
 
     # Return the DPI of the inkscape document detected
     # based on the version information in the SVG
@@ -853,3 +2011,30 @@ class QtSvgDoc(QtSvgG):
             t.translate(x, y)
 
         return t
+
+
+# -----------------------------------------------------------------------------
+# Parallel parsing
+# -----------------------------------------------------------------------------
+#: The root element and options of the document a worker is parsing
+_PART_CONTEXT = None
+
+#: Fonts are needed to outline text so workers need an application
+_PART_APP = None
+
+
+def _init_part_worker(data, options):
+    global _PART_CONTEXT, _PART_APP
+    from enaml.qt.QtGui import QGuiApplication
+    if QGuiApplication.instance() is None:
+        _PART_APP = QGuiApplication([])
+    _PART_CONTEXT = (etree.fromstring(data), options)
+
+
+def _parse_part(index):
+    """ Parse one top level element of the document into serialized
+    geometry in document coordinates.
+
+    """
+    e, options = _PART_CONTEXT
+    return QtSvgDoc(e, parent=True, parts=[index], **options).saveGeometry()
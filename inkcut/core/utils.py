@@ -12,14 +12,16 @@ Created on Jul 12, 2015
 import os
 import sys
 import logging
+import threading
 from enaml.colors import Color
 from enaml.image import Image
 from enaml.icon import Icon, IconImage
-from enaml.application import timed_call
+from enaml.application import timed_call, deferred_call
 from enaml.qt.QtCore import QPointF
 from enaml.qt.QtGui import QPainterPath, QPixmap, QIcon
 from enaml.qt.q_resource_helpers import get_cached_qcolor
 from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
 from .svg import QtSvgDoc
 
 
@@ -117,6 +119,28 @@ def async_sleep(ms):
     return d
 
 
+def async_thread(f, *args, **kwargs):
+    """Call f in a worker thread without blocking. The returned Deferred
+    fires in the main thread with the result. Typically this is used with
+    the inlineCallbacks decorator.
+    """
+    d = Deferred()
+
+    def run():
+        try:
+            result = f(*args, **kwargs)
+        except Exception:
+            deferred_call(d.errback, Failure())
+        else:
+            deferred_call(d.callback, result)
+
+    thread = threading.Thread(target=run, name="Worker {}".format(
+        getattr(f, '__name__', f)))
+    thread.daemon = True
+    thread.start()
+    return d
+
+
 # -----------------------------------------------------------------------------
 # QPainterPath helpers
 # -----------------------------------------------------------------------------
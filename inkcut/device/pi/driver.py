@@ -16,6 +16,7 @@ from cProfile import Profile
 from atom.api import Instance, List, Int, Float, Tuple, Dict, Bool, observe
 from inkcut.core.api import Model
 from inkcut.core.utils import async_sleep, log
+from inkcut.core.instanced import map_path
 from inkcut.device.plugin import Device, DeviceConfig
 from twisted.internet.defer import inlineCallbacks, DeferredList
 from contextlib import contextmanager
@@ -213,7 +214,7 @@ class PiDevice(Device):
         t.translate(x, y)
 
         #: Create the transformed model
-        model = job.model * t
+        model = map_path(t, job.model)
 
         # Clear
         #: Updating this does not update the UI
@@ -19,9 +19,12 @@ from atom.api import (
 from contextlib import contextmanager
 from datetime import datetime
 from enaml.qt import QtCore, QtGui
-from enaml.application import timed_call
+from enaml.application import timed_call, deferred_call
 from inkcut.core.api import Model, Plugin, AreaBase
-from inkcut.core.utils import parse_unit, from_unit, to_unit, async_sleep, log
+from inkcut.core.utils import (
+    parse_unit, from_unit, to_unit, async_sleep, async_thread, log
+)
+from inkcut.core.instanced import map_path, expand_path
 from twisted.internet import defer
 from io import BytesIO
 from . import extensions
@@ -320,6 +323,9 @@ class DeviceConfig(Model):
     #: Use a virtual connection
     test_mode = Bool().tag(config=True)
 
+    #: Create the model and apply the filters in a worker thread
+    background_compile = Bool(True).tag(config=True)
+
     #: Init commands
     commands_before = Str().tag(config=True)
     commands_after = Str().tag(config=True)
@@ -520,12 +526,12 @@ class Device(Model):
 
         Parameters
         ----------
-            path: QPainterPath
+            path: QPainterPath or InstancedPath
                 Path to transform
 
         Returns
         -------
-            path: QPainterPath
+            path: QPainterPath or InstancedPath
 
         """
         config = self.config
@@ -542,7 +548,7 @@ class Device(Model):
             t.rotate(config.rotation)
 
         #: TODO: Translate back to 0,0 so all coordinates are positive
-        path = t.map(path)
+        path = map_path(t, path)
 
         return path
 
@@ -585,13 +591,216 @@ class Device(Model):
         if job.feed_to_end:
             #: Move the job to the new origin
             x, y, z = self.origin
-            model.translate(x, -y)
+            model = map_path(QtGui.QTransform.fromTranslate(x, -y), model)
 
         #: TODO: Apply filters here
 
         #: Return the transformed model
         return model
 
+    def compile(self, job, cancelled=None, progress=None):
+        """ Create the model of the job with `init` and compile it. When
+        background compilation is enabled and the driver uses the default
+        `init` this runs in a worker thread with a snapshot of the job so
+        the ordering, copies, layout and device filters all run there.
+
+        Parameters
+        ----------
+            job: inkcut.job.models.Job
+                The job or snapshot of the job to compile
+            cancelled: Callable or None
+                Returns True when the compilation should be stopped
+            progress: Callable or None
+                Called with the percent done
+
+        Returns
+        -------
+            result: Tuple or None
+                The result of `compile_model` or None if cancelled.
+        """
+        if progress is not None:
+            progress(0)
+        model = self.init(job)
+        if cancelled is not None and cancelled():
+            return None
+        return self.compile_model(model, cancelled, progress)
+
+    def compile_model(self, model, cancelled=None, progress=None):
+        """ Apply the device filters to the model returned by `init`, convert
+        it to the polygons sent to the device and measure them. When
+        background compilation is enabled this runs in a worker thread so it
+        must not touch the UI.
+
+        Parameters
+        ----------
+            model: QPainterPath or InstancedPath
+                The model returned by `init`
+            cancelled: Callable or None
+                Returns True when the compilation should be stopped
+            progress: Callable or None
+                Called with the percent done
+
+        Returns
+        -------
+            result: Tuple or None
+                The list of polygons to process with the end point of the
+                model and their length or None if cancelled.
+        """
+        if progress is not None:
+            progress(30)
+        model = self.prepare(model)
+        if cancelled is not None and cancelled():
+            return None
+        if progress is not None:
+            progress(50)
+        polypath = list(self.flatten(model))
+        if cancelled is not None and cancelled():
+            return None
+        if progress is not None:
+            progress(80)
+        length = self.measure(polypath, cancelled)
+        if length is None:
+            return None
+        if progress is not None:
+            progress(100)
+        return (polypath, model.currentPosition()), length
+
+    def compile_in_background(self, job):
+        """ Compile the job in a worker thread so the UI stays responsive.
+        The driver `init` may use the application or return a Deferred so
+        a driver that reimplements it is still called on the main thread
+        and only `compile_model` runs in the worker. The compilation can be
+        cancelled with `job.info.cancelled`.
+
+        Parameters
+        ----------
+            job: inkcut.job.models.Job
+                The job to compile
+
+        Returns
+        -------
+            result: Deferred
+                Resolves to the result of `compile_model`
+        """
+        info = job.info
+
+        def cancelled():
+            return info.cancelled
+
+        def progress(percent):
+            deferred_call(setattr, self, 'status',
+                          "Compiling job ({}%)".format(percent))
+
+        if type(self).init is Device.init:
+            return async_thread(self.compile, job.snapshot(), cancelled,
+                                progress)
+        d = defer.maybeDeferred(self.init, job)
+        d.addCallback(lambda model: async_thread(
+            self.compile_model, model, cancelled, progress))
+        return d
+
+    def prepare(self, model):
+        """ Flip the model to the device coordinates and apply the device
+        filters of the model.
+
+        Parameters
+        ----------
+            model: QPainterPath or InstancedPath
+                The model to prepare. Instanced copies are only expanded if a
+                filter needs the whole model.
+
+        Returns
+        -------
+            model: QPainterPath or InstancedPath
+                The model ready to be processed
+        """
+        # Do a final translation since Qt's y axis is reversed from svg's
+        # It should now be a bbox of (x=0, y=0, width, height)
+        # this creates a copy
+        model = map_path(QtGui.QTransform.fromScale(1, -1), model)
+
+        # Apply device filters
+        for f in self.filters:
+            log.debug(" filter | Running {} on model".format(f))
+            if type(f).apply_to_model is not DeviceFilter.apply_to_model:
+                #: Filters of the model need the geometry of each copy
+                model = expand_path(model)
+            model = f.apply_to_model(model, job=self)
+        return model
+
+    def measure(self, polypath, cancelled=None):
+        """ Measure the length of the path the head follows including the
+        moves between subpaths.
+
+        Parameters
+        ----------
+            polypath: List of QPolygonF
+                The polygons returned by `flatten`
+            cancelled: Callable or None
+                Returns True when the measuring should be stopped
+
+        Returns
+        -------
+            length: Float or None
+                The length or None if cancelled
+        """
+        length = 0
+        last = QtCore.QPointF(0, 0)
+        for i, poly in enumerate(polypath):
+            if poly.isEmpty():
+                continue
+            length += QtCore.QLineF(last, poly.first()).length()
+            path = QtGui.QPainterPath()
+            path.addPolygon(poly)
+            length += path.length()
+            last = poly.last()
+            if i % 1000 == 999 and cancelled is not None and cancelled():
+                return None
+        return length
+
+    def flatten(self, model):
+        """ Convert the prepared model to the polygons sent to the device
+        and apply the device filters of the polygons.
+
+        Parameters
+        ----------
+            model: QPainterPath or InstancedPath
+                The model returned by `prepare`
+
+        Returns
+        -------
+            polypath: Iterable of QPolygonF
+                The polygons, a list if any filter was applied otherwise they
+                are created lazily.
+        """
+        config = self.config
+
+        # Since Qt's toSubpathPolygons converts curves without accepting
+        # a parameter to set the minimum distance between points on the
+        # curve, we need to prescale by a "quality factor" before
+        # converting then undo the scaling to effectively adjust the
+        # number of points on a curve.
+        m = QtGui.QTransform.fromScale(
+            config.quality_factor, config.quality_factor)
+        # Some versions of Qt seem to require a value in toSubpathPolygons
+        polypath = model.toSubpathPolygons(m)
+
+        if config.quality_factor != 1:
+            # Undo the prescaling, if the quality_factor > 1 the curve
+            # quality will be improved.
+            m_inv = QtGui.QTransform.fromScale(
+                1/config.quality_factor, 1/config.quality_factor)
+            polypath = map(m_inv.map, polypath)
+
+        # Apply device filters to polypath, the polygons are only
+        # created lazily when there are none
+        if self.filters:
+            polypath = list(polypath)
+        for f in self.filters:
+            log.debug(" filter | Running {} on polypath".format(f))
+            polypath = f.apply_to_polypath(polypath)
+        return polypath
+
     @defer.inlineCallbacks
     def connect(self):
         """ Connect to the device. By default this delegates handling
@@ -737,22 +946,26 @@ class Device(Model):
                         config.speed,  # in/s or cm/s
                         config.speed_units.split("/")[0])/1000.0
 
-                # Device model is updated in real time
-                model = yield defer.maybeDeferred(self.init, job)
-
                 #: Local references are faster
                 info = job.info
 
+                # Use the best order found so far
+                job.stop_optimizer()
+
+                # Device model is updated in real time
+                self.status = "Compiling job"
+                if config.background_compile:
+                    compiled = yield self.compile_in_background(job)
+                else:
+                    model = yield defer.maybeDeferred(self.init, job)
+                    compiled = self.compile_model(model)
+                if compiled is None:
+                    self.status = "Job cancelled"
+                    info.status = 'cancelled'
+                    return
+
                 #: Determine the length for tracking progress
-                whole_path = QtGui.QPainterPath()
-
-                #: Some versions of Qt seem to require a value in
-                #: toSubpathPolygons
-                m = QtGui.QTransform.fromScale(1, 1)
-                for path in model.toSubpathPolygons(m):
-                    for i, p in enumerate(path):
-                        whole_path.lineTo(p)
-                total_length = whole_path.length()
+                polypath, total_length = compiled
                 total_moved = 0
                 log.debug("device | Path length: {}".format(total_length))
 
@@ -801,7 +1014,8 @@ class Device(Model):
                                 protocol.set_velocity, config.speed)
 
                         #: For point in the path
-                        for (d, cmd, args, kwargs) in self.process(model):
+                        for (d, cmd, args, kwargs) in self.process(
+                                polypath, prepared=True):
 
                             #: Check if we paused
                             if info.paused:
@@ -867,6 +1081,7 @@ class Device(Model):
                         if info.status == 'running':
                             info.done = True
                             info.status = 'complete'
+                            self._release_completed_jobs()
                     except Exception as e:
                         log.error(traceback.format_exc())
                         raise
@@ -893,14 +1108,18 @@ class Device(Model):
                 traceback.format_exc()))
             raise
 
-    def process(self, model):
+    def process(self, model, prepared=False):
         """  Process the path model of a job and return each command
         within the job.
 
         Parameters
         ----------
-            model: QPainterPath
-                The path to process
+            model: QPainterPath, InstancedPath or Tuple
+                The path to process. Instanced copies are only expanded if a
+                filter needs the whole model.
+            prepared: Bool
+                Whether the model is the list of polygons and the end point
+                returned by `compile_model`
 
         Returns
         -------
@@ -914,11 +1133,6 @@ class Device(Model):
         # Previous point
         _p = QtCore.QPointF(self.origin[0], self.origin[1])
 
-        # Do a final translation since Qt's y axis is reversed from svg's
-        # It should now be a bbox of (x=0, y=0, width, height)
-        # this creates a copy
-        model = QtGui.QTransform.fromScale(1, -1).map(model)
-
         # Determine if interpolation should be used
         skip_interpolation = (self.connection.always_spools or config.spooled
                               or not config.interpolate)
@@ -929,32 +1143,11 @@ class Device(Model):
         if not skip_interpolation and step_size <= 0:
             raise ValueError("Cannot have a step size <= 0!")
         try:
-            # Apply device filters
-            for f in self.filters:
-                log.debug(" filter | Running {} on model".format(f))
-                model = f.apply_to_model(model, job=self)
-
-            # Since Qt's toSubpathPolygons converts curves without accepting
-            # a parameter to set the minimum distance between points on the
-            # curve, we need to prescale by a "quality factor" before
-            # converting then undo the scaling to effectively adjust the
-            # number of points on a curve.
-            m = QtGui.QTransform.fromScale(
-                config.quality_factor, config.quality_factor)
-            # Some versions of Qt seem to require a value in toSubpathPolygons
-            polypath = model.toSubpathPolygons(m)
-
-            if config.quality_factor != 1:
-                # Undo the prescaling, if the quality_factor > 1 the curve
-                # quality will be improved.
-                m_inv = QtGui.QTransform.fromScale(
-                    1/config.quality_factor, 1/config.quality_factor)
-                polypath = list(map(m_inv.map, polypath))
-
-            # Apply device filters to polypath
-            for f in self.filters:
-                log.debug(" filter | Running {} on polypath".format(f))
-                polypath = f.apply_to_polypath(polypath)
+            if prepared:
+                polypath, ep = model
+            else:
+                model = self.prepare(model)
+                polypath, ep = self.flatten(model), model.currentPosition()
 
             for path in polypath:
 
@@ -1017,7 +1210,6 @@ class Device(Model):
                         d += dl
 
             #: Make sure we get the endpoint
-            ep = model.currentPosition()
             x, y = ep.x(), ep.y()
             yield (0, self.move, ([x, y, 0],), {})
         except Exception as e:
@@ -1038,6 +1230,37 @@ class Device(Model):
                 jobs.append(job)
                 self.jobs = jobs
 
+    def _release_completed_jobs(self):
+        """ Release the completed jobs except the one open in the job
+        plugin.
+
+        """
+        from inkcut.core.workbench import InkcutWorkbench
+        workbench = InkcutWorkbench.instance()
+        if workbench is None:
+            return
+        plugin = workbench.get_plugin("inkcut.job")
+        self.release_jobs(keep=(plugin.job,))
+
+    def release_jobs(self, keep=()):
+        """ Drop the geometry of the completed jobs run on this device that
+        use the memory lean mode. Their settings and stats are kept.
+
+        Parameters
+        ----------
+            keep: Iterable
+                Jobs to keep the geometry of such as the open job
+        """
+        for job in self.jobs:
+            if (job is self.job and self.busy) or job in keep:
+                continue
+            if getattr(job, 'memory_lean', False) and job.info.done and \
+                    job.doc is not None:
+                usage = job.memory_usage()
+                job.release_geometry()
+                log.info("device | Released geometry of {} ({:.1f} MB)".format(
+                    job, usage['total'] / 1e6))
+
 
 class DevicePlugin(Plugin):
     """ Plugin for configuring, using, and communicating with
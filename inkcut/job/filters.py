@@ -14,6 +14,7 @@ from lxml import etree
 from atom.api import Atom, Str, Instance, Bool, Float
 from enaml.colors import Color, ColorMember, SVG_COLORS
 from inkcut.core.svg import QtSvgDoc, EtreeElement
+from inkcut.core.instanced import expand_path
 from enaml.qt.QtGui import QPainterPath, QPolygonF
 from enaml.qt.QtCore import QPointF
 from inkcut.core.utils import (
@@ -32,14 +33,11 @@ SVG_COLOR_NAMES['none'] = 'transparent'
 
 
 def get_node_style(e):
-    """ Retrun the parsed style of an svg node
+    """ Retrun the parsed style of an svg node. The result is shared with
+    other nodes using the same style and must not be modified.
 
     """
-    style = e.attrib.get('style')
-    if style is None:
-        return {}
-    return dict(it.split(":") if ":" in it else (it, None)
-                for it in style.split(";"))
+    return QtSvgDoc.parseStyle(e.attrib.get('style'))
 
 
 def get_layers(svg):
@@ -52,6 +50,11 @@ def get_layer_label(g):
     return g.attrib.get(attr)
 
 
+def is_layer(e):
+    attr = '{http://www.inkscape.org/namespaces/inkscape}groupmode'
+    return e.attrib.get(attr) == "layer"
+
+
 class Filter(Atom):
     #: A fixed type name for the UI to extract without using isinstance
     type = ""
@@ -109,7 +112,19 @@ class Filter(Atom):
 # based on the SVG document structure and
 # attributes.
 class SvgFilter(Filter):
-    pass
+
+    def get_mask_tag(self):
+        """ Get the tag of the shapes this filter removes from a tagged
+        document. Filters returning a tag are applied by masking the geometry
+        table of the document instead of calling `apply_filter`.
+
+        Returns
+        -------
+        tag: Tuple or None
+            The tag or None if this filter must be applied to the document
+
+        """
+        return None
 
 # These filters receive a general QPainterPath
 # of the entire job after the shapes have been
@@ -172,7 +187,7 @@ class ClipFilter(JobFilter):
         # before the optimize path because
         # removing path segments would change
         # the optimizer's results
-        clipped = doc.intersected(clip_path)
+        clipped = expand_path(doc).intersected(clip_path)
         return clipped
         
 class LayerFilter(SvgFilter):
@@ -186,22 +201,28 @@ class LayerFilter(SvgFilter):
 
     @classmethod
     def get_filter_options(cls, job, doc):
-        # TODO: Extract all layers in the document and return a list of them
-        svg = doc._e
         layers = []
-        for g in get_layers(svg):
-            label = get_layer_label(g)
-            if label is not None:
-                style = get_node_style(g)
-                # If the layer is hidden disable it by default
-                enabled = style.get('display') != "none"
-                layers.append(cls(name=label, layer=g, enabled=enabled))
+        for g, label in doc.styleIndex()['layers']:
+            style = doc.elementStyle(g)
+            # If the layer is hidden disable it by default
+            enabled = style.get('display') != "none"
+            layers.append(cls(name=label, layer=g, enabled=enabled))
         return layers
 
+    def get_mask_tag(self):
+        return ('layer', self.name)
+
     def apply_filter(self, job, doc):
         """ Remove all subpaths from doc that are in this layer by reparsing
         the xml.
         """
+        if doc.elements is not None:
+            return doc.masked([self.get_mask_tag()])
+        if doc.streaming:
+            name = self.name
+            return doc.excluding(
+                lambda e: is_layer(e) and get_layer_label(e) == name)
+
         # Copy it since we're modifying
         svg = copy.deepcopy(doc._e)
 
@@ -227,31 +248,37 @@ class FillColorFilter(SvgFilter):
 
     @classmethod
     def get_filter_options(cls, job, doc):
-        svg = doc._e
         colors = []
-        used = set()
-        for e in svg.xpath('//*[@style]'):
-            style = get_node_style(e)
-            color = style.get(cls.style_attr)
-            if color is not None and color not in used:
-                used.add(color)
-                # Try to look up a common name
-                label = SVG_COLOR_NAMES.get(color.lower(), color)
-                colors.append(cls(name=label, color=color, data=color))
+        for color in doc.styleIndex()['styles'].get(cls.style_attr, []):
+            # Try to look up a common name
+            label = SVG_COLOR_NAMES.get(color.lower(), color)
+            colors.append(cls(name=label, color=color, data=color))
         return colors
 
+    def get_mask_tag(self):
+        return (self.style_attr, self.data)
+
     def apply_filter(self, job, doc):
         """ Remove all subpaths from doc that are in this layer by reparsing
         the xml.
         """
+        if doc.elements is not None:
+            return doc.masked([self.get_mask_tag()])
+        if doc.streaming:
+            attr, data = self.style_attr, self.data
+            return doc.excluding(
+                lambda e: doc.elementStyle(e).get(attr) == data)
+
         # Copy it since we're modifying
         svg = copy.deepcopy(doc._e)
 
         # Remove all nodes with that stroke style
-        for e in svg.xpath('//*[@style]'):
-            style = get_node_style(e)
-            if style.get(self.style_attr) == self.data:
-                e.getparent().remove(e)
+        removed = [e for e in svg.iter() if e is not svg and
+                   doc.elementStyle(e).get(self.style_attr) == self.data]
+        for e in removed:
+            parent = e.getparent()
+            if parent is not None:
+                parent.remove(e)
 
         return QtSvgDoc(svg, parent=True)
 
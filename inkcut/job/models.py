@@ -13,17 +13,23 @@ Created on Jan 16, 2015
 from __future__ import division
 import os
 import sys
+import threading
+from time import time
 from datetime import datetime, timedelta
+from lxml import etree
 from atom.api import (
     Enum, Float, Int, Bool, Instance, ContainerList, Range, Str,
-    Dict, Callable, observe
+    Dict, Callable, Value, observe
 )
 from contextlib import contextmanager
+from enaml.application import Application, deferred_call, timed_call
 from enaml.qt.QtGui import QPainterPath, QTransform, QPolygonF
 from enaml.qt.QtCore import QPointF, QRectF
 from enaml.colors import ColorMember
 from inkcut.core.api import Model, AreaBase
-from inkcut.core.svg import QtSvgDoc
+from inkcut.core.svg import QtSvgDoc, QtSvgImage, PATH_ELEMENT_SIZE
+from inkcut.core.blobs import BlobStore
+from inkcut.core.instanced import InstancedPath, map_path, map_rect
 from inkcut.core.utils import split_painter_path, log
 
 
@@ -31,6 +37,10 @@ from . import filters
 from . import ordering
 
 
+#: Store of pasted documents and documents read from stdin
+BLOB_STORE = BlobStore()
+
+
 class Material(AreaBase):
     """ Model representing the plot media
     """
@@ -55,6 +65,17 @@ class Material(AreaBase):
         return
 
 
+def same_inputs(a, b):
+    """ Compare the inputs of a stage of the job pipeline. Paths are
+    compared by identity as comparing their elements is about as slow as
+    recomputing the stage.
+
+    """
+    return len(a) == len(b) and all(
+        x is y or (not isinstance(x, QPainterPath) and x == y)
+        for x, y in zip(a, b))
+
+
 class Padding:
     LEFT = 0
     TOP = 1
@@ -139,7 +160,27 @@ class Job(Model):
     """ Create a plot depending on the properties set. Any property that is a
     traitlet will cause an update when the value is changed.
 
+    The model is created by a pipeline of stages, each is only recomputed when
+    one of its inputs or the result of a previous stage changes.
+
     """
+    #: Stages of the pipeline creating the model in the order they run and
+    #: the members each depends on besides the result of the previous stage
+    STAGES = {
+        'filter': ('path', 'svg_filters'),
+        'order': ('order',),
+        'copy': ('scale', 'mirror', 'rotation', 'auto_scale',
+                 'copy_weedline', 'copy_weedline_padding',
+                 'material.size', 'material.padding'),
+        'layout': ('copies', 'auto_copies', 'copy_spacing', 'plot_weedline',
+                   'plot_weedline_padding', 'material.size',
+                   'material.padding'),
+        'transform': ('align_center', 'auto_shift', 'mirror',
+                      'material.size', 'material.padding'),
+        'finish': ('job_filters', 'clip_to_plot_area', 'material.size',
+                   'material.padding', 'feed_to_end', 'feed_after'),
+    }
+
     #: Material this job will be run on
     material = Instance(Material, ()).tag(config=True)
 
@@ -209,17 +250,54 @@ class Job(Model):
     optimized_path = Instance(QPainterPath)
 
     #: Finaly copy using all the applied job properties
-    #: This is what is actually cut out
-    model = Instance(QPainterPath)
+    #: This is what is actually cut out. Copies are kept as instances of
+    #: the base copy until they are sent to the device.
+    model = Instance((QPainterPath, InstancedPath))
+
+    #: Store documents without a file are saved in
+    blobs = Instance(BlobStore)
+
+    #: Release the xml tree once the filters are created and allow the
+    #: geometry to be dropped when the job is done. Set from the job plugin
+    #: when the document is parsed.
+    memory_lean = Bool()
+
+    #: Duration in seconds of the last run of parsing and each stage
+    stage_timings = Dict()
+
+    #: Milliseconds to wait for more changes before updating the model. If
+    #: zero or there is no event loop the model is updated immediately.
+    update_delay = Int()
+
+    #: Incremented whenever the inputs of the model change
+    update_generation = Int()
+
+    _batch_depth = Int()  # nesting of batch_updates blocks
+    _update_pending = Bool()  # inputs changed within a batch
+
+    #: Inputs and result of the last run of each stage
+    _stages = Dict()
+
+    #: Optimizer improving the order of the path in the background
+    optimizer = Value()
 
     _blocked = Bool(False)  # block change events
+    _restoring = Bool(False)  # restoring the saved state
     _desired_copies = Int(1)  # required for auto copies
 
+    def __init__(self, *args, **kwargs):
+        """ Update the model once after setting all the given members """
+        with self.batch_updates():
+            super(Job, self).__init__(*args, **kwargs)
+
+    def _default_blobs(self):
+        return BLOB_STORE
+
     def __str__(self):
         source = self.document
         if not source:
             return "Empty document"
-        if source.startswith("<?xml"):
+        if source.startswith("<?xml") or BlobStore.is_ref(source):
             return "Pasted document"
         try:
             return os.path.split(source)[-1]
@@ -237,8 +315,14 @@ class Job(Model):
         """ Ensure that when restoring from disk the material and info
         are not set to None. Ideally these would be defined as Typed but
         the material may be made extendable at some point.
+
+        The document is not parsed until the job is used, see `load`.
         """
-        super(Job, self).__setstate__(*args, **kwargs)
+        self._restoring = True
+        try:
+            super(Job, self).__setstate__(*args, **kwargs)
+        finally:
+            self._restoring = False
         if not self.info:
             self.info = JobInfo()
         if not self.material:
@@ -247,22 +331,184 @@ class Job(Model):
     def _observe_document(self, change):
         """ Read the document from stdin """
         source = self.document
+        if self._restoring:
+            return
+        if source == '-':
+            #: Only load from stdin when explicitly changed to it (when doing
+            #: open from the cli) otherwise when restoring state this hangs
+            #: startup
+            if change['type'] == 'update':
+                data = getattr(sys.stdin, 'buffer', sys.stdin).read()
+                self.document = self._save_source(data)
+            return
+        if source.startswith("<?xml"):
+            #: Keep pasted documents in the blob store so the state only
+            #: holds a reference to them
+            self.document = self._save_source(source)
+            return
+        self._parse_document()
+
+    def load(self):
+        """ Parse the document of a job restored from the saved state if it
+        was not parsed yet.
+
+        """
+        if self.doc is None and self.document:
+            self._parse_document()
+
+    def _parse_document(self):
+        with self.events_suppressed():
+            self._load_document()
+
+            # Recreate available filters when the document changes
+            self.svg_filters = self._default_svg_filters()
+            self.job_filters = self._default_job_filters()
+            self._release_tree()
+        self.update_document()
+
+    def _release_tree(self):
+        """ In memory lean mode drop the xml tree once the filters no longer
+        need it.
+
+        """
+        doc = self.doc
+        if not self.memory_lean or doc is None or (
+                doc.elements is None and not doc.streaming):
+            return
+        doc.releaseTree()
+        for f in self.svg_filters:
+            if isinstance(f, filters.LayerFilter):
+                f.layer = None
+        log.info("Released document tree of {}: {}".format(
+            self, self.memory_usage()))
+
+    def release_geometry(self):
+        """ Drop the parsed document and all the paths created from it
+        keeping the settings and stats of the job. The document is parsed
+        again by `load` if the job is used again.
+
+        """
+        self.stop_optimizer()
+        with self.suppress_notifications():
+            self.doc = self.path = None
+            self.optimized_path = self.model = None
+            self.svg_filters = []
+            self.job_filters = []
+            self._stages = {}
+
+    def memory_usage(self):
+        """ Estimate the memory used by the geometry of this job
+
+        Returns
+        -------
+            usage: Dict
+                Bytes used by the parsed document, its geometry table and xml
+                tree, the optimized path and the model as well as the total.
+        """
+        usage = {'path': 0, 'elements': 0, 'tree': 0}
+        if self.doc is not None:
+            usage.update(self.doc.memoryUsage())
+        for name in ('optimized_path', 'model'):
+            path = getattr(self, name)
+            if path is None or path is self.doc:
+                usage[name] = 0
+            elif isinstance(path, InstancedPath):
+                usage[name] = path.storedElementCount() * PATH_ELEMENT_SIZE
+            else:
+                usage[name] = path.elementCount() * PATH_ELEMENT_SIZE
+        usage['total'] = sum(usage.values())
+        return usage
+
+    def _save_source(self, data):
+        """ Save the source of a document without a file in the blob store
+
+        Parameters
+        ----------
+            data: String or Bytes
+                The document source
+
+        Returns
+        -------
+            ref: String
+                Reference to the saved document
+        """
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        from inkcut.core.workbench import InkcutWorkbench
+        workbench = InkcutWorkbench.instance()
+        plugin = workbench.get_plugin("inkcut.job")
+        if plugin.strip_images and b"data:" in data:
+            #: Don't save embedded images
+            svg = etree.fromstring(data)
+            for node in svg.iter(QtSvgImage.tag):
+                QtSvgImage.strip(node)
+            data = etree.tostring(svg, xml_declaration=True,
+                                  encoding="UTF-8")
+        return self.blobs.put(data)
+
+    def reload(self):
+        """ Parse the document again after it was edited. The geometry of
+        elements that did not change is reused from the geometry cache and
+        filters that were disabled stay disabled.
+
+        """
+        if not self.document or self.document == '-' or \
+                BlobStore.is_ref(self.document):
+            return
+        disabled = set((f.type, f.name) for f in
+                       self.svg_filters + self.job_filters if not f.enabled)
+        with self.events_suppressed():
+            self._load_document()
+            filters = []
+            for registry in (self._default_svg_filters(),
+                             self._default_job_filters()):
+                for f in registry:
+                    if (f.type, f.name) in disabled:
+                        f.enabled = False
+                filters.append(registry)
+            self.svg_filters, self.job_filters = filters
+            self._release_tree()
+        self.update_document()
+
+    def _load_document(self):
+        """ Parse the document using the settings of the job plugin
+
+        """
+        source = self.document
+        if BlobStore.is_ref(source):
+            source = self.blobs.resolve(source)
+            if not os.path.exists(source):
+                log.warning("Pasted document {} no longer exists".format(
+                    self.document))
+                return
         from inkcut.core.workbench import InkcutWorkbench
         workbench = InkcutWorkbench.instance()
         plugin = workbench.get_plugin("inkcut.job")
         self.document_kwargs["dpi_default"] = plugin.dpi_default
         self.document_kwargs["dpi_auto_detect_inkscape"] = plugin.dpi_auto_detect_inkscape
-        if change['type'] == 'update' and source == '-':
-            #: Only load from stdin when explicitly changed to it (when doing
-            #: open from the cli) otherwise when restoring state this hangs
-            #: startup
-            self.doc = self.path = QtSvgDoc(sys.stdin, **self.document_kwargs)
-        elif source and (source.startswith("<?xml") or os.path.exists(source)):
-            self.doc = self.path = QtSvgDoc(source, **self.document_kwargs)
-
-        # Recreate available filters when the document changes
-        self.svg_filters = self._default_svg_filters()
-        self.job_filters = self._default_job_filters()
+        self.document_kwargs["flatten"] = plugin.flatten_transforms
+        self.document_kwargs["parallel"] = plugin.parallel_parsing
+        self.document_kwargs["strip_images"] = plugin.strip_images
+        self.document_kwargs["arc_tolerance"] = plugin.arc_tolerance or None
+        self.memory_lean = plugin.memory_lean
+        geometry = (plugin.geometry_cache if plugin.geometry_cache_enabled
+                    else None)
+        start = time()
+        if source and os.path.exists(source) and plugin.streaming_enabled \
+                and os.path.getsize(source) >= plugin.streaming_min_size * 1e6:
+            #: Large files are streamed so the tree is not kept in memory
+            self.doc = self.path = QtSvgDoc(source, streaming=True,
+                                            geometry=geometry,
+                                            **self.document_kwargs)
+        elif source and os.path.exists(source):
+            cache = plugin.parse_cache if plugin.parse_cache_enabled else None
+            #: The geometry table is needed up front only when the tree is
+            #: released, otherwise the filters build it when first used
+            self.doc = self.path = QtSvgDoc(source, cache=cache,
+                                            geometry=geometry,
+                                            tagged=self.memory_lean,
+                                            **self.document_kwargs)
+        self.stage_timings['parse'] = time() - start
 
     def get_filters_from_registry(self, registry):
         results = []
@@ -283,47 +529,152 @@ class Job(Model):
         return self.get_filters_from_registry(filters.JOB_FILTERS)
 
     def apply_filters(self, filter_list, doc):
-        for f in filter_list:
+        disabled = [f for f in filter_list if not f.enabled]
+
+        # Remove the shapes of all layers/colors that can be masked at once
+        # using the geometry table of the document. The table is only built
+        # once a filter needs it.
+        masks = [f for f in disabled if isinstance(f, filters.SvgFilter)
+                 and f.get_mask_tag() is not None]
+        if masks and isinstance(doc, QtSvgDoc) and not doc.streaming:
+            if doc.elements is None:
+                doc.tagElements()
+            tags = [f.get_mask_tag() for f in masks]
+            log.debug("Masking {}".format(tags))
+            doc = doc.masked(tags)
+            disabled = [f for f in disabled if f not in masks]
+
+        for f in disabled:
             # If the color/layer is NOT enabled, then remove that color/layer
-            if not f.enabled:
-                log.debug("Applying filter {}".format(f))
-                doc = f.apply_filter(self, doc)
+            log.debug("Applying filter {}".format(f))
+            doc = f.apply_filter(self, doc)
         return doc
 
     def _default_optimized_path(self):
         """ Filter parts of the documen based on the selected layers and colors
 
         """
-        doc = self.path
+        if not self.path:
+            return None
+        doc = self.run_stage('filter', self._filter_path, self.path)
+        return self.run_stage('order', self._order_path, doc)
+
+    def _filter_path(self, doc):
         # SVG filters need to happen first,
         # these rely on the SVG structure of
         # the document.
-        doc = self.apply_filters(self.svg_filters, doc)
+        return self.apply_filters(self.svg_filters, doc)
 
+    def _order_path(self, doc):
         # Apply ordering to path
         # this delegates to objects in the ordering module
+        self.stop_optimizer()
         OrderingHandler = ordering.REGISTRY.get(self.order)
         if OrderingHandler:
-            doc = OrderingHandler().order(self, doc)
-
+            handler = OrderingHandler()
+            if (Application.instance() and
+                    threading.current_thread() is threading.main_thread()):
+                # Use a quick order now and swap in better ones as they
+                # are found
+                doc, self.optimizer = handler.order_anytime(
+                    self, doc, self._publish_order)
+            else:
+                doc = handler.order(self, doc)
         return doc
 
-    @observe('path', 'order', 'svg_filters', 'job_filters', 'clip_to_plot_area')
-    def _update_optimized_path(self, change):
-        """ Whenever the loaded file (and parsed SVG path) changes update
-        it based on the filters from the job.
+    def _publish_order(self, optimizer, path):
+        """ Called from the optimizer thread with a better ordering """
+        deferred_call(self._apply_order, optimizer, path)
 
-        """
-        self.optimized_path = self._default_optimized_path()
+    def _apply_order(self, optimizer, path):
+        """ Use the better ordering unless the optimizer was stopped or
+        replaced since it was found.
 
-    def _create_copy(self):
+        """
+        if optimizer is not self.optimizer or optimizer.stopped:
+            return
+        if self.replace_stage('order', path):
+            self.update_document()
+
+    def stop_optimizer(self):
+        """ Stop improving the order keeping the best one found so far """
+        if self.optimizer is not None:
+            self.optimizer.stop()
+            self.optimizer = None
+
+    def run_stage(self, name, func, *args):
+        """ Run a stage of the pipeline if its inputs changed since it last
+        ran otherwise return the previous result.
+
+        Parameters
+        ----------
+            name: String
+                Name of the stage in `STAGES`
+            func: Callable
+                Function computing the result of the stage from the args
+            args: Tuple
+                Results of previous stages and other arguments
+
+        Returns
+        -------
+            result: Object
+                The result of the stage
+        """
+        inputs = args + self._stage_inputs(name)
+        entry = self._stages.get(name)
+        if entry is not None and same_inputs(entry[0], inputs):
+            return entry[1]
+        start = time()
+        result = func(*args)
+        self.stage_timings[name] = duration = time() - start
+        log.debug("Job stage {} took {:.1f} ms".format(name, 1000*duration))
+
+        # The stage may update its own inputs (ex auto copies)
+        self._stages[name] = (args + self._stage_inputs(name), result)
+
+        # Later stages must run again
+        stages = list(self.STAGES)
+        for later in stages[stages.index(name)+1:]:
+            self._stages.pop(later, None)
+        return result
+
+    def replace_stage(self, name, result):
+        """ Replace the result of the last run of a stage and invalidate
+        the later stages.
+
+        Returns
+        -------
+            replaced: Bool
+                False if the stage has not run yet
+        """
+        entry = self._stages.get(name)
+        if entry is None:
+            return False
+        self._stages[name] = (entry[0], result)
+        stages = list(self.STAGES)
+        for later in stages[stages.index(name)+1:]:
+            self._stages.pop(later, None)
+        return True
+
+    def _stage_inputs(self, name):
+        """ Get the current values of the members a stage depends on """
+        inputs = []
+        for attr in self.STAGES[name]:
+            value = self
+            for part in attr.split('.'):
+                value = getattr(value, part)
+            if isinstance(value, list):
+                value = tuple((v, v.enabled) if isinstance(v, filters.Filter)
+                              else v for v in value)
+            inputs.append(value)
+        return tuple(inputs)
+
+    def _create_copy(self, optimized_path):
         """ Creates a copy of the original graphic applying the given
-        transforms
+        transforms. The transforms are composed and the bounding rects
+        derived from the bounding rect of the path so it is only mapped once.
 
         """
-        optimized_path = self.optimized_path
-        if optimized_path is None:
-            optimized_path = self.optimized_path = self._default_optimized_path()
         if optimized_path is None:
             log.debug("Path is %s" % self.path)
             raise ValueError("Path is empty")
@@ -346,15 +697,18 @@ class Job(Model):
             t.rotate(self.rotation)
             t.translate(c.x(), c.y())
 
-        # Apply transform
-        path = t.map(optimized_path)
-
-        # Add weedline to copy
+        # Size of the copy with the weedline
         if self.copy_weedline:
-            self._add_weedline(path, self.copy_weedline_padding)
+            padding = self.copy_weedline_padding
+        else:
+            padding = [0, 0, 0, 0]
+        rect = map_rect(t, optimized_path, bbox)
+        outline = rect.adjusted(
+            -padding[Padding.LEFT], -padding[Padding.TOP],
+            padding[Padding.RIGHT], padding[Padding.BOTTOM])
 
         # If it's too big we have to scale it
-        w, h = path.boundingRect().width(), path.boundingRect().height()
+        w, h = outline.width(), outline.height()
         available_area = self.material.available_area
 
         #: This screws stuff up!
@@ -368,14 +722,24 @@ class Job(Model):
                 if h > available_area.height():
                     sy = available_area.height() / h
                 s = min(sx, sy)  # Fit to the smaller of the two
-                path = QTransform.fromScale(s, s).map(optimized_path)
-
-        # Save original bbox
-        bbox = path.boundingRect()
+                scale = QTransform.fromScale(s, s)
+                t *= scale
+                rect = scale.mapRect(rect)
+                outline = rect.adjusted(
+                    -padding[Padding.LEFT], -padding[Padding.TOP],
+                    padding[Padding.RIGHT], padding[Padding.BOTTOM])
 
         # Move to bottom left
-        br = bbox.bottomRight()
-        path = QTransform.fromTranslate(-br.x(), -br.y()).map(path)
+        br = outline.bottomRight()
+        t *= QTransform.fromTranslate(-br.x(), -br.y())
+
+        # Apply transform
+        path = t.map(optimized_path)
+
+        # Add weedline to copy
+        if self.copy_weedline:
+            self._add_weedline(path, padding,
+                               rect.translated(-br.x(), -br.y()))
         return path
 
     @contextmanager
@@ -383,32 +747,64 @@ class Job(Model):
         """ Block change events to prevent feedback loops
 
         """
-        self._blocked = True
+        blocked, self._blocked = self._blocked, True
         try:
             yield
         finally:
-            self._blocked = False
+            self._blocked = blocked
 
     @observe('path', 'scale', 'auto_scale', 'lock_scale', 'mirror',
              'align_center', 'rotation', 'auto_rotate', 'copies', 'order',
              'copy_spacing', 'copy_weedline', 'copy_weedline_padding',
              'plot_weedline', 'plot_weedline_padding', 'feed_to_end',
              'feed_after', 'material', 'material.size', 'material.padding',
-             'auto_copies', 'auto_shift', 'clip_to_plot_area')
+             'auto_copies', 'auto_shift', 'clip_to_plot_area', 'svg_filters',
+             'job_filters')
     def update_document(self, change=None):
-        """ Recreate an instance of of the plot using the current settings
+        """ Recreate an instance of of the plot using the current settings.
+        Only the stages depending on what changed are recomputed.
 
         """
         if self._blocked:
             return
 
-        if change:
-            name = change['name']
-            if name == 'copies':
-                self._desired_copies = self.copies
-            elif name in ('layer', 'color'):
-                self._update_optimized_path(change)
+        if change and change['name'] == 'copies':
+            self._desired_copies = self.copies
+
+        self.update_generation += 1
+        if self._batch_depth:
+            self._update_pending = True
+        elif change and self.update_delay > 0 and Application.instance():
+            # Wait for more changes, ex from dragging a spin box
+            timed_call(self.update_delay, self._update_if_latest,
+                       self.update_generation)
+        else:
+            self._update_model()
 
+    @contextmanager
+    def batch_updates(self):
+        """ Update the model only once after all the changes made within
+        the block.
+
+        """
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._update_pending:
+                self._update_model()
+
+    def _update_if_latest(self, generation):
+        """ Update the model unless the inputs changed again since this
+        update was scheduled. The newer change schedules its own update.
+
+        """
+        if generation == self.update_generation and not self._batch_depth:
+            self._update_model()
+
+    def _update_model(self):
+        self._update_pending = False
         model = self.create()
         if model:
             self.model = model
@@ -417,17 +813,27 @@ class Job(Model):
         """ Create a path model that is rotated and scaled
 
         """
-        model = QPainterPath()
-
         if not self.path:
             return
 
-        path = self._create_copy()
+        self.optimized_path = optimized_path = self._default_optimized_path()
+        path = self.run_stage('copy', self._create_copy, optimized_path)
 
         # Update size
         bbox = path.boundingRect()
         self.size = [bbox.width(), bbox.height()]
 
+        model = self.run_stage('layout', self._layout_copies, path)
+        model = self.run_stage('transform', self._transform_model, model,
+                               swap_xy, tuple(scale) if scale else None)
+        return self.run_stage('finish', self._finish_model, model)
+
+    def _layout_copies(self, path):
+        """ Create instances of the base copy and add the plot weedline
+
+        """
+        offsets = []
+
         # Create copies
         c = 0
         points = self._copy_positions_iter(path)
@@ -443,13 +849,23 @@ class Job(Model):
 
         while c < self.copies:
             x, y = next(points)
-            model.addPath(QTransform.fromTranslate(x, -y).map(path))
+            offsets.append((x, -y))
             c += 1
+        model = InstancedPath(path, offsets)
 
         # Create weedline
         if self.plot_weedline:
-            self._add_weedline(model, self.plot_weedline_padding)
+            weedline = QPainterPath()
+            self._add_weedline(weedline, self.plot_weedline_padding,
+                               model.boundingRect())
+            model = model.copy(tail=weedline)
+        return model
+
+    def _transform_model(self, model, swap_xy, scale):
+        """ Apply the device transform and move the model to the origin
+        with the padding of the material
 
+        """
         # Determine padding
         bbox = model.boundingRect()
         if self.align_center[0]:
@@ -464,13 +880,13 @@ class Job(Model):
 
         # Scale and rotate
         if scale:
-            model = QTransform.fromScale(*scale).map(model)
+            model = map_path(QTransform.fromScale(*scale), model)
             px, py = px*abs(scale[0]), py*abs(scale[1])
 
         if swap_xy:
             t = QTransform()
             t.rotate(90)
-            model = t.map(model)
+            model = map_path(t, model)
 
         # Move to 0,0
         bbox = model.boundingRect()
@@ -489,8 +905,12 @@ class Job(Model):
         tx += px
         ty += py
 
-        model = QTransform.fromTranslate(tx, ty).map(model)
+        return map_path(QTransform.fromTranslate(tx, ty), model)
 
+    def _finish_model(self, model):
+        """ Apply the job filters and add the move to the end point
+
+        """
         # Apply the job filters to the final result
         # after copies and transformations have been applied.
         model = self.apply_filters(self.job_filters, model)
@@ -498,9 +918,12 @@ class Job(Model):
         end_point = (QPointF(
             0, -self.feed_after + model.boundingRect().top())
                      if self.feed_to_end else QPointF(0, 0))
-        model.moveTo(end_point)
+        if isinstance(model, InstancedPath):
+            return model.copy(end=end_point)
 
-        return model
+        # Keep a single instance so later transforms are composed instead
+        # of copying the filtered path
+        return InstancedPath(model, [(0, 0)], end=end_point)
 
     def _check_bounds(self, plot, area):
         """ Checks that the width and height of plot are less than the width
@@ -553,12 +976,13 @@ class Job(Model):
         self.stack_size = stack_size
         return stack_size
 
-    def _add_weedline(self, path, padding):
+    def _add_weedline(self, path, padding, bbox=None):
         """ Adds a weedline to the path
-        by creating a box around the path with the given padding
+        by creating a box around the path (or bbox) with the given padding
 
         """
-        bbox = path.boundingRect()
+        if bbox is None:
+            bbox = path.boundingRect()
         w, h = bbox.width(), bbox.height()
 
         tl = bbox.topLeft()
@@ -580,10 +1004,38 @@ class Job(Model):
         """ Returns the path the head moves when not cutting
 
         """
-        # Compute the negative
-        path = QPainterPath()
-        for i in range(self.model.elementCount()):
-            e = self.model.elementAt(i)
+        model = self.model
+        if not isinstance(model, InstancedPath):
+            return self._negative_path(model)
+
+        # Moves within each copy are instanced as well, the moves between
+        # copies and to the tail are added to the tail
+        base = QPainterPath()
+        if model.path.elementCount():
+            e = model.path.elementAt(0)
+            base.moveTo(e.x, e.y)
+        base = self._negative_path(model.path, base, start=1)
+        tail = QPainterPath()
+        p = QPointF(0, 0)
+        for start, end in model.copyEnds():
+            tail.moveTo(p)
+            tail.lineTo(start)
+            p = end
+        tail.moveTo(p)
+        tail = self._negative_path(model.tail, tail)
+        if model.end is not None:
+            tail.lineTo(model.end)
+        return InstancedPath(base, model.offsets, model.transform, tail)
+
+    def _negative_path(self, model, path=None, start=0):
+        """ Add the negative of the model from the start element to the
+        path.
+
+        """
+        if path is None:
+            path = QPainterPath()
+        for i in range(start, model.elementCount()):
+            e = model.elementAt(i)
             if e.isMoveTo():
                 path.lineTo(e.x, e.y)
             else:
@@ -659,3 +1111,29 @@ class Job(Model):
             'info': JobInfo(**self.info.__getstate__()),
         })
         return Job(**state)
+
+    def snapshot(self):
+        """ Return a copy of this job for compiling in a worker thread. The
+        parsed document and the paths are shared instead of parsed again and
+        the results of the stages are reused. Changes to the snapshot do not
+        update its model.
+
+        """
+        state = self.__getstate__()
+        state.update({
+            'material': Material(**self.material.__getstate__()),
+            'info': JobInfo(**self.info.__getstate__()),
+        })
+        job = Job.__new__(Job)
+        with job.suppress_notifications():
+            job.__setstate__(state)
+            job.doc = self.doc
+            job.path = self.path
+            job.optimized_path = self.optimized_path
+            job.model = self.model
+            job.svg_filters = list(self.svg_filters)
+            job.job_filters = list(self.job_filters)
+            job._desired_copies = self._desired_copies
+            job._stages = dict(self._stages)
+            job._blocked = True
+        return job
@@ -9,11 +9,18 @@ Created on Dec 15, 2018
 
 @author: jrm
 """
+import os
 import sys
 import itertools
 import math
+import heapq
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 from time import time
-from atom.api import Atom, Instance, Int, ForwardInstance, List
+from atom.api import Atom, Instance, Int
 from enaml.qt.QtGui import QVector2D
 from enaml.qt.QtWidgets import QApplication
 from inkcut.core.utils import (
@@ -52,6 +59,28 @@ class OrderHandler(Atom):
         """
         raise NotImplementedError()
 
+    def order_anytime(self, job, path, publish):
+        """ Order the path quickly and keep improving the order in the
+        background if the handler supports it.
+
+        Parameters
+        ----------
+        job: inkcut.models.Job
+            The job that is being processed.
+        path: QPainterPath
+            The path model to re-order.
+        publish: Callable
+            Called from the worker thread with the optimizer and each better
+            ordering found.
+
+        Returns
+        -------
+        result: Tuple[QPainterPath, BackgroundOptimizer or None]
+            The first ordering and the running optimizer if any.
+
+        """
+        return self.order(job, path), None
+
     @staticmethod
     def subpath_move_distance(p0, subpaths, limit=sys.maxsize):
         d = 0
@@ -112,122 +141,585 @@ class OrderMaxY(OrderHandler):
             job, path, lambda p: p.boundingRect().top())
 
 
-class KdTree(Atom):
-    class Node(Atom):
-        position = Instance(QVector2D)
-        id = Int()
-        count = Int(0)
-        left = ForwardInstance(lambda: KdTree.Node)
-        right = ForwardInstance(lambda: KdTree.Node)
-        parent = ForwardInstance(lambda: KdTree.Node)
+class PointIndex(object):
+    """ Nearest neighbour index of points supporting removal. It is a kd-tree
+    stored in flat lists with small buckets of points at the leaves. Queries
+    are iterative and removing a point swaps it out of its bucket so it's
+    O(1) except when a bucket becomes empty.
 
-        def __init__(self, position, id):
-            self.position = position
-            self.id = id
+    """
 
-    points = List(QVector2D)
-    n = Int(0)
-    nodes = List(Node)
-    minp = Instance(QVector2D)
-    maxp = Instance(QVector2D)
-    root = Instance(Node)
+    #: Maximum number of points in a leaf
+    LEAF_SIZE = 8
 
     def __init__(self, points):
-        self.points = points
-        self.n = len(points)
-        self.nodes = []
-        if points:
-            self.minp = QVector2D(points[0])
-            self.maxp = QVector2D(points[0])
-            for p in points:
-                self.minp.setX(min(self.minp.x(), p.x()))
-                self.minp.setY(min(self.minp.y(), p.y()))
-                self.maxp.setX(max(self.maxp.x(), p.x()))
-                self.maxp.setY(max(self.maxp.y(), p.y()))
-        self.nodes = [KdTree.Node(p, i) for (i, p) in enumerate(self.points)]
-        self.root = KdTree._recursive_build(self.nodes[:], 0, None)
-
-    def _item_count(node):
-        if node:
-            return node.count
-        return 0
-
-    @staticmethod
-    def _recursive_build(items, depth, parent):
-        if not items:
-            return None
-        if depth & 1:
-            items.sort(key=lambda v: v.position.y())
-        else:
-            items.sort(key=lambda v: v.position.x())
+        """ Build the index
 
-        m = len(items) // 2
-        pivot = items[m]
-        left, right = items[:m], items[m+1:]
-
-        pivot.parent = parent
-        pivot.left = KdTree._recursive_build(left, depth + 1, pivot)
-        pivot.right = KdTree._recursive_build(right, depth + 1, pivot)
-        pivot.count = 1
-        pivot.count += KdTree._item_count(pivot.left)
-        pivot.count += KdTree._item_count(pivot.right)
-        return pivot
+        Parameters
+        ----------
+            points: numpy.ndarray or Sequence[Tuple[Float, Float]]
+                The points to index. The id of each point is its position.
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        n = len(points)
+        self.count = n
+        order = np.arange(n)
+
+        #: Nodes, a leaf has a left child of -1 and holds the points of
+        #: order[start:start+size]
+        self.axis = axis = []
+        self.split = split = []
+        self.left = left = []
+        self.right = right = []
+        self.start = start = []
+        self.size = size = []
+        self.parent = parent = []
+        self.empty = empty = []
+
+        stack = [(0, n, -1)] if n else []
+        while stack:
+            lo, hi, up = stack.pop()
+            node = len(axis)
+            if up >= 0:
+                # Children are always created left first
+                if left[up] < 0:
+                    left[up] = node
+                else:
+                    right[up] = node
+            parent.append(up)
+            empty.append(False)
+            start.append(lo)
+            size.append(hi - lo)
+            left.append(-1)
+            right.append(-1)
+            if hi - lo <= self.LEAF_SIZE:
+                axis.append(0)
+                split.append(0.0)
+                continue
+
+            # Split the widest side at the median
+            ids = order[lo:hi]
+            coords = points[ids]
+            a = int(np.argmax(coords.max(axis=0) - coords.min(axis=0)))
+            m = (hi - lo) // 2
+            part = np.argpartition(coords[:, a], m)
+            order[lo:hi] = ids[part]
+            axis.append(a)
+            split.append(float(coords[part[m], a]))
+            stack.append((lo + m, hi, node))
+            stack.append((lo, lo + m, node))
+
+        #: Python lists are much faster than arrays for scalar access
+        self.xs = points[:, 0].tolist()
+        self.ys = points[:, 1].tolist()
+        self.order = order.tolist()
+
+        #: Position of each point in order and the leaf containing it
+        self.where = where = [0] * n
+        self.leaf = leaf = [0] * n
+        for node, s in enumerate(start):
+            if left[node] < 0:
+                for i in range(s, s + size[node]):
+                    where[order[i]] = i
+                    leaf[order[i]] = node
+
+    def __len__(self):
+        return self.count
 
     def remove(self, id):
-        if id < 0:
+        """ Remove the point with the given id if it was not removed yet """
+        if id < 0 or self.where[id] < 0:
             return
-        node = self.nodes[id]
-        node.id = -1
+        node = self.leaf[id]
+        order, where, size = self.order, self.where, self.size
+
+        # Swap it with the last point of the bucket
+        i = where[id]
+        last = self.start[node] + size[node] - 1
+        other = order[last]
+        order[i], order[last] = other, id
+        where[other] = i
+        where[id] = -1
+        size[node] -= 1
+        self.count -= 1
+
+        # Mark nodes with no points left so queries skip them
+        if size[node] == 0:
+            empty, left, right, parent = (self.empty, self.left, self.right,
+                                          self.parent)
+            empty[node] = True
+            node = parent[node]
+            while node >= 0 and empty[left[node]] and empty[right[node]]:
+                empty[node] = True
+                node = parent[node]
+
+    def nearest(self, x, y):
+        """ Find the closest point that was not removed.
+
+        Returns
+        -------
+            id: Int
+                The id of the closest point or -1 if the index is empty
+        """
+        if not self.count:
+            return -1
+        xs, ys, order = self.xs, self.ys, self.order
+        axis, split, left, right = self.axis, self.split, self.left, \
+            self.right
+        start, size, empty = self.start, self.size, self.empty
+        best, best_d = -1, math.inf
+        stack = [(0, 0.0)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, d = pop()
+            if d >= best_d or empty[node]:
+                continue
+            a = left[node]
+            if a < 0:
+                s = start[node]
+                for i in range(s, s + size[node]):
+                    id = order[i]
+                    dx, dy = xs[id] - x, ys[id] - y
+                    d = dx * dx + dy * dy
+                    if d < best_d:
+                        best, best_d = id, d
+                continue
+            diff = (y if axis[node] else x) - split[node]
+            if diff < 0:
+                push((right[node], max(d, diff * diff)))
+                push((a, d))
+            else:
+                push((a, max(d, diff * diff)))
+                push((right[node], d))
+        return best
 
-        while node:
-            node.count -= 1
-            node = node.parent
+    def nearest_k(self, x, y, k):
+        """ Find the k closest points that were not removed.
 
-    @staticmethod
-    def recursive_find(target_pos, node, depth, minp, maxp, best):
-        if node.id >= 0:
-            d2 = (target_pos - node.position).lengthSquared()
-            if d2 < best[1]:
-                best[0] = node
-                best[1] = d2
-
-        first, second = node.left, node.right
-
-        dx = ((depth & 1 ) == 0)
-        if dx:
-            split_position = node.position.x()
-            target_v = target_pos.x()
-            first_size = (minp, QVector2D(split_position, maxp.y()))
-            second_size = (QVector2D(split_position, minp.y()), maxp)
-        else:
-            split_position = node.position.y()
-            target_v = target_pos.y()
-            first_size = (minp, QVector2D(maxp.x(), split_position))
-            second_size = (QVector2D(minp.x(), split_position), maxp)
-
-        if target_v >= split_position:
-            first, second = second, first
-            first_size, second_size = second_size, first_size
-
-        if first and first.count:
-            KdTree.recursive_find(target_pos, first, depth + 1, *first_size, best)
-        if second and second.count:
-            de = (target_v - split_position)
-            de = de * de
-            if dx:
-                vy = max(0, minp.y() - target_pos.y()) + max(0, target_pos.y() - maxp.y())
-                de += vy * vy
+        Returns
+        -------
+            ids: List[Int]
+                The ids of the closest points sorted by distance
+        """
+        if not self.count or k <= 0:
+            return []
+        xs, ys, order = self.xs, self.ys, self.order
+        axis, split, left, right = self.axis, self.split, self.left, \
+            self.right
+        start, size, empty = self.start, self.size, self.empty
+
+        #: Max heap of the k closest found so far
+        found = []
+        limit = math.inf
+        stack = [(0, 0.0)]
+        pop, push = stack.pop, stack.append
+        while stack:
+            node, d = pop()
+            if d >= limit or empty[node]:
+                continue
+            a = left[node]
+            if a < 0:
+                s = start[node]
+                for i in range(s, s + size[node]):
+                    id = order[i]
+                    dx, dy = xs[id] - x, ys[id] - y
+                    d = dx * dx + dy * dy
+                    if len(found) < k:
+                        heapq.heappush(found, (-d, id))
+                    elif d < -found[0][0]:
+                        heapq.heapreplace(found, (-d, id))
+                    else:
+                        continue
+                    if len(found) == k:
+                        limit = -found[0][0]
+                continue
+            diff = (y if axis[node] else x) - split[node]
+            if diff < 0:
+                push((right[node], max(d, diff * diff)))
+                push((a, d))
             else:
-                vy = max(0, minp.x() - target_pos.x()) + max(0, target_pos.x() - maxp.x())
-                de += vy * vy
+                push((a, max(d, diff * diff)))
+                push((right[node], d))
+        found.sort(reverse=True)
+        return [id for d, id in found]
+
+
+class LocalSearch(object):
+    """ Improve a tour of subpaths that starts at the origin and returns to
+    it (or ends at a given destination) with
+    2-opt moves, which reverse a run of subpaths, and Or-opt moves, which
+    move a run of up to 3 subpaths elsewhere, optionally reversed. Reversing
+    a single subpath flips its direction. Only moves connecting an endpoint
+    to one of its nearest neighbours are tried.
+
+    The tour is a list of endpoint ids where subpath `i` has the ids `2*i`
+    for its start and `2*i+1` for its end, each entry is the id the subpath
+    is entered from so it is left from `id ^ 1`.
 
-            if de < best[1]:
-                KdTree.recursive_find(target_pos, second, depth + 1, *second_size, best)
+    """
+
+    #: Number of neighbours of each endpoint to try
+    NEIGHBOURS = 8
+
+    #: Longest run of subpaths moved by Or-opt
+    SEGMENT = 3
+
+    def __init__(self, endpoints, tour, index=None, origin=(0.0, 0.0),
+                 destination=None):
+        """ Create a search
+
+        Parameters
+        ----------
+            endpoints: List[Tuple[Float, Float]]
+                The start and end point of each subpath
+            tour: List[Int]
+                The endpoint id each subpath is entered from in order
+            index: PointIndex or None
+                Index of all the endpoints, created if not given
+            origin: Tuple[Float, Float]
+                Point the tour starts from
+            destination: Tuple[Float, Float] or None
+                Point the tour ends at, defaults to the origin
+        """
+        self.origin = origin
+        self.destination = origin if destination is None else destination
+        self.endpoints = endpoints
+        self.tour = list(tour)
+        self.index = PointIndex(endpoints) if index is None else index
+        self.pos = [0] * len(self.tour)
+        self._update_positions(0, len(self.tour))
+        self.neighbours = {}
+
+    def _update_positions(self, lo, hi):
+        pos, tour = self.pos, self.tour
+        for k in range(lo, hi):
+            pos[tour[k] >> 1] = k
+
+    def near(self, id):
+        """ Ids of the closest endpoints of other subpaths """
+        result = self.neighbours.get(id)
+        if result is None:
+            x, y = self.endpoints[id]
+            result = [c for c in self.index.nearest_k(
+                x, y, self.NEIGHBOURS + 2) if c >> 1 != id >> 1]
+            result = self.neighbours[id] = result[:self.NEIGHBOURS]
+        return result
 
-    def nearest_node(self, target_pos):
-        best = [None, math.inf]
-        KdTree.recursive_find(target_pos, self.root, 0, self.minp, self.maxp, best)
-        return best[0]
+    def start(self, k):
+        """ Point the subpath at position k is entered from """
+        if k >= len(self.tour):
+            return self.destination
+        return self.endpoints[self.tour[k]]
+
+    def end(self, k):
+        """ Point the subpath at position k is left from """
+        if k < 0:
+            return self.origin
+        return self.endpoints[self.tour[k] ^ 1]
+
+    def length(self):
+        """ Travel distance of the tour including the move to the
+        destination
+
+        """
+        d = 0
+        p = self.origin
+        endpoints = self.endpoints
+        for id in self.tour:
+            d += dist(p, endpoints[id])
+            p = endpoints[id ^ 1]
+        return d + dist(p, self.destination)
+
+    def run(self, time_limit, cancelled=None, publish=None, interval=0.5):
+        """ Apply improving moves until none is found or the time is up.
+
+        Parameters
+        ----------
+            time_limit: Float
+                Time to stop at
+            cancelled: Callable or None
+                Returns True when the search should be stopped
+            publish: Callable or None
+                Called with a copy of the tour when it improved, at most
+                once per interval and once more when the search ends.
+            interval: Float
+                Seconds between publishing improvements
+
+        Returns
+        -------
+            tour: List[Int]
+                The improved tour
+        """
+        changed = False
+        last = time()
+        improved = True
+        while improved:
+            improved = False
+            for i in range(len(self.tour) + 1):
+                now = time()
+                if now > time_limit or (cancelled is not None and
+                                        cancelled()):
+                    improved = False
+                    break
+                if self.two_opt(i):
+                    improved = changed = True
+                if i < len(self.tour) and self.or_opt(i):
+                    improved = changed = True
+                if publish is not None and changed and \
+                        now - last >= interval:
+                    publish(list(self.tour))
+                    changed = False
+                    last = now
+        if publish is not None and changed and not (
+                cancelled is not None and cancelled()):
+            publish(list(self.tour))
+        return self.tour
+
+    def reverse_delta(self, a, b):
+        """ Change of the travel distance when reversing positions a to b
+
+        """
+        start, end = self.start, self.end
+        return (dist(end(a - 1), end(b)) + dist(start(a), start(b + 1)) -
+                dist(end(a - 1), start(a)) - dist(end(b), start(b + 1)))
+
+    def reverse(self, a, b):
+        tour = self.tour
+        tour[a:b + 1] = [id ^ 1 for id in reversed(tour[a:b + 1])]
+        self._update_positions(a, b + 1)
+
+    def two_opt(self, i):
+        """ Try to replace the move into the subpath at position i and a
+        move connecting one of its ends to a nearby endpoint.
+
+        """
+        tour, pos = self.tour, self.pos
+        n = len(tour)
+        moves = []
+        removed = dist(self.end(i - 1), self.start(i))
+        if i > 0:
+            a = self.end(i - 1)
+            for c in self.near(tour[i - 1] ^ 1):
+                if dist(a, self.endpoints[c]) >= removed:
+                    break
+                k = pos[c >> 1]
+                if tour[k] == c:
+                    continue
+                if k >= i:
+                    moves.append((i, k))
+                elif k < i - 1:
+                    moves.append((k + 1, i - 1))
+        if i < n:
+            a = self.start(i)
+            for c in self.near(tour[i]):
+                if dist(a, self.endpoints[c]) >= removed:
+                    break
+                k = pos[c >> 1]
+                if tour[k] != c:
+                    continue
+                if k > i:
+                    moves.append((i, k - 1))
+                elif k < i:
+                    moves.append((k, i - 1))
+        if i < n:
+            # Flip the direction of the subpath
+            moves.append((i, i))
+        for a, b in moves:
+            if self.reverse_delta(a, b) < -EPSILON:
+                self.reverse(a, b)
+                return True
+        return False
+
+    def or_opt(self, i):
+        """ Try to move the run of subpaths starting at position i next to
+        one of the neighbours of its ends.
+
+        """
+        tour, pos, start, end = self.tour, self.pos, self.start, self.end
+        n = len(tour)
+        for size in range(1, min(self.SEGMENT, n - i) + 1):
+            j = i + size - 1
+            s, e = start(i), end(j)
+            p, q = end(i - 1), start(j + 1)
+            gain = dist(p, s) + dist(e, q) - dist(p, q)
+            if gain <= EPSILON:
+                continue
+            for id, point, first in ((tour[i], s, True),
+                                     (tour[j] ^ 1, e, False)):
+                for c in self.near(id):
+                    d = dist(point, self.endpoints[c])
+                    if d >= gain:
+                        break
+                    k = pos[c >> 1]
+                    is_start = tour[k] == c
+                    # Position to insert before and whether the run is
+                    # reversed so the endpoint is next to c
+                    if is_start:
+                        m, flip = k, first
+                    else:
+                        m, flip = k + 1, not first
+                    if i <= m <= j + 1:
+                        continue
+                    x, y = end(m - 1), start(m)
+                    if flip:
+                        added = dist(x, e) + dist(s, y) - dist(x, y)
+                    else:
+                        added = dist(x, s) + dist(e, y) - dist(x, y)
+                    if added - gain < -EPSILON:
+                        self.move(i, j, m, flip)
+                        return True
+        return False
+
+    def move(self, i, j, m, flip):
+        """ Move the run at positions i to j before position m """
+        tour = self.tour
+        run = tour[i:j + 1]
+        if flip:
+            run = [id ^ 1 for id in reversed(run)]
+        del tour[i:j + 1]
+        if m > i:
+            m -= len(run)
+        tour[m:m] = run
+        self._update_positions(min(i, m), max(j + 1, m + len(run)))
+
+
+class BackgroundOptimizer(object):
+    """ Keep improving the order of subpaths with a LocalSearch in a worker
+    thread and publish each better ordering found.
+
+    """
+
+    #: Seconds between publishing improvements
+    interval = 0.5
+
+    def __init__(self, subpaths, search, time_limit, publish):
+        """ Create an optimizer
+
+        Parameters
+        ----------
+            subpaths: List[QPainterPath]
+                The subpaths ordered by the tour of the search
+            search: LocalSearch
+                The search improving the tour
+            time_limit: Float
+                Time to stop at
+            publish: Callable
+                Called from the worker thread with this optimizer and the
+                joined path of each better tour.
+        """
+        self.subpaths = subpaths
+        self.search = search
+        self.time_limit = time_limit
+        self.publish = publish
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run,
+                                       name="Path optimizer")
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """ Stop improving, nothing is published after this returns """
+        self.stopped = True
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def run(self):
+        search = self.search
+        before = search.length()
+        start = time()
+        search.run(self.time_limit, cancelled=lambda: self.stopped,
+                   publish=self._publish, interval=self.interval)
+        log.debug("Background path optimizer: Saved {} in of movement "
+                  "in {}".format(to_unit(before - search.length(), 'in'),
+                                 time() - start))
+
+    def _publish(self, tour):
+        path = join_tour(self.subpaths, tour)
+        if not self.stopped:
+            self.publish(self, path)
+
+
+def subpath_endpoints(subpaths):
+    """ List the start and end point of each subpath """
+    endpoints = []
+    for sp in subpaths:
+        e = sp.elementAt(0)
+        endpoints.append((e.x, e.y))
+        e = sp.elementAt(sp.elementCount() - 1)
+        endpoints.append((e.x, e.y))
+    return endpoints
+
+
+def greedy_tour(endpoints, x=0.0, y=0.0, time_limit=math.inf):
+    """ Create a tour by always moving to the closest subpath
+
+    Parameters
+    ----------
+        endpoints: List[Tuple[Float, Float]]
+            The start and end point of each subpath
+        x, y: Float
+            Point to start from
+        time_limit: Float
+            Time to stop at, the remaining subpaths are added in order
+
+    Returns
+    -------
+        result: Tuple[List[Int], Bool]
+            The tour and whether it completed within the time limit
+    """
+    count = len(endpoints) // 2
+    point_index = PointIndex(endpoints)
+    used = [False] * count
+    tour = []
+    complete = True
+    for i in range(count):
+        idb = point_index.nearest(x, y)
+        subpath_id = idb // 2
+        # remove both ends
+        point_index.remove(idb)
+        point_index.remove(idb ^ 1)
+
+        assert subpath_id >= 0
+        assert not used[subpath_id]
+
+        used[subpath_id] = True
+        tour.append(idb)
+        x, y = endpoints[idb ^ 1]
+
+        if time() > time_limit and i + 1 < count:
+            complete = False
+            break
+
+    tour.extend([2 * i for i in range(count) if not used[i]])
+    return tour, complete
+
+
+def tour_subpaths(subpaths, tour):
+    """ List the subpaths in the order of the tour reversing the ones that
+    are entered from their end.
+
+    """
+    result = []
+    for idb in tour:
+        subpath = subpaths[idb // 2]
+        result.append(subpath.toReversed() if idb & 1 else subpath)
+    return result
+
+
+def join_tour(subpaths, tour):
+    """ Join the subpaths in the order of the tour """
+    return join_painter_paths(tour_subpaths(subpaths, tour))
+
+
+def dist(p, q):
+    return math.hypot(p[0] - q[0], p[1] - q[1])
+
+
+#: Smallest change of distance considered an improvement
+EPSILON = 1e-9
 
 
 def element_to_vec(element):
@@ -243,7 +735,8 @@ def end_point(path):
 
 
 class OrderShortestPath(OrderHandler):
-    """  Variation of greedy TSP solution using KDtree to query nearest point
+    """  Variation of greedy TSP solution using a PointIndex to query the
+    nearest point, refined by a LocalSearch within the optimizer timeout.
 
     """
     name = QApplication.translate("job", "Shortest Path")
@@ -260,70 +753,111 @@ class OrderShortestPath(OrderHandler):
             return path
 
         now = time()
-        # This is in the UI thread
+        # This may run in the UI thread or in the device compile worker
         time_limit = now + self.plugin.optimizer_timeout
-        zero = QVector2D(0, 0)
-        endpoints = []
-        for sp in subpaths:
-            start = start_point(sp)
-            end = end_point(sp)
-            endpoints.append(start)
-            endpoints.append(end)
-
-        point_tree = KdTree(endpoints)
-        used = [False] * len(subpaths)
-        original = subpaths
-        result = []
-        p = zero
-        for i in range(len(subpaths)):
-            idb = point_tree.nearest_node(p).id
-            subpath_id = idb // 2
-            # remove both ends
-            point_tree.remove(idb)
-            point_tree.remove(idb ^ 1)
-
-            assert subpath_id >= 0
-            assert not used[subpath_id]
-
-            used[subpath_id] = True
-            subpath = subpaths[subpath_id]
-            if idb & 1:
-                p = start_point(subpath)
-                result.append(subpath.toReversed())
-            else:
-                p = end_point(subpath)
-                result.append(subpath)
-
-            if time() > time_limit:
-                # At least part of it is optimized. Shouldn't happen
-                # with a typical input.
-                log.warning(
-                    "Shortest path search aborted (time limit reached)")
-                break
-        else:
-            log.debug("Shortest path processed all")
-        
-        result.extend([p for (i, p) in enumerate(subpaths) if not used[i]])
+        endpoints, tour = self.greedy(subpaths, time_limit)
+
+        # Refine the greedy tour with the time left
+        if time() < time_limit:
+            greedy = time()
+            search = LocalSearch(endpoints, tour)
+            before = search.length()
+            tour = search.run(time_limit)
+            log.debug("Shortest path local search: Saved {} in of movement "
+                      "in {}".format(to_unit(before - search.length(), 'in'),
+                                     time() - greedy))
+
+        result = tour_subpaths(subpaths, tour)
 
         duration = time() - now
-        d = OrderHandler.subpath_move_distance(zero, original)
+        zero = QVector2D(0, 0)
+        d = OrderHandler.subpath_move_distance(zero, subpaths)
         d = d - OrderHandler.subpath_move_distance(zero, result)
         log.debug("Shortest path search: Saved {} in of movement in {}".format(
                 to_unit(d, 'in'), duration))
 
         return join_painter_paths(result)
 
+    def order_anytime(self, job, path, publish):
+        """ Publish the greedy tour and refine it in a background thread
+        when the background optimizer is enabled.
+
+        """
+        if not self.plugin.background_optimizer:
+            return super(OrderShortestPath, self).order_anytime(
+                job, path, publish)
+        subpaths = split_painter_path(path)
+        if len(subpaths) <= 1:
+            return path, None
+        time_limit = time() + self.plugin.optimizer_timeout
+        endpoints, tour = self.greedy(subpaths, time_limit)
+        optimizer = BackgroundOptimizer(
+            subpaths, LocalSearch(endpoints, tour), time_limit, publish)
+        optimizer.start()
+        return join_tour(subpaths, tour), optimizer
+
+    def greedy(self, subpaths, time_limit):
+        """ Create a tour by always moving to the closest subpath
+
+        Returns
+        -------
+            result: Tuple[List[Tuple[Float, Float]], List[Int]]
+                The start and end point of each subpath and the tour
+        """
+        endpoints = subpath_endpoints(subpaths)
+        tour, complete = greedy_tour(endpoints, time_limit=time_limit)
+        if complete:
+            log.debug("Shortest path processed all")
+        else:
+            # At least part of it is optimized. Shouldn't happen
+            # with a typical input.
+            log.warning("Shortest path search aborted (time limit reached)")
+        return endpoints, tour
+
+
 class SpaceFillingCurveOrder(OrderHandler):
+    #: Number of levels of the curve, each adds 2 bits to the key
+    STEPS = 32
+
     def curve_pos(self, p, p0, s):
         raise NotImplementedError 
 
+    def curve_keys(self, x, y, s):
+        """ Compute the position along the curve of many points at once.
+        The result is the same as calling `curve_pos` for each point.
+
+        Parameters
+        ----------
+        x, y: numpy.ndarray
+            Coordinates of the points relative to the top left of the bounds
+        s: Float
+            Size of the bounds
+
+        Returns
+        -------
+        keys: numpy.ndarray
+            The position of each point as an uint64
+
+        """
+        raise NotImplementedError
+
     def order(self, job, path):
         bounds = path.boundingRect()
         max_size = max(bounds.size().width(), bounds.size().height())
         p0 = bounds.topLeft()
-        res = self.order_by_func(
-            job, path, lambda p: self.curve_pos(start_point(p), p0, max_size))
-        return res
+        subpaths = split_painter_path(path)
+        starts = []
+        for sp in subpaths:
+            e = sp.elementAt(0)
+            starts.append((e.x, e.y))
+
+        # Round to single precision like the QVector2D used by curve_pos
+        starts = np.array(starts, dtype=np.float32).reshape(-1, 2)
+        starts = starts.astype(float)
+        keys = self.curve_keys(starts[:, 0] - p0.x(), starts[:, 1] - p0.y(),
+                               max_size)
+        order = np.argsort(keys, kind='stable')
+        return join_painter_paths([subpaths[i] for i in order.tolist()])
 
 
 class OrderHilbert(SpaceFillingCurveOrder):
@@ -355,6 +889,27 @@ class OrderHilbert(SpaceFillingCurveOrder):
             s *= 0.5
         return result
 
+    def curve_keys(self, x, y, s):
+        s *= 0.5
+        two = np.uint64(2)
+        # Bits of the quadrants indexed by right * 2 + up
+        table = np.array([0, 3, 1, 2], dtype=np.uint64)
+        result = np.zeros(len(x), dtype=np.uint64)
+        for i in range(self.STEPS):
+            right = x > s
+            up = y > s
+            result = (result << two) | table[(right << 1) | up]
+
+            # Select the new coordinates by multiplying with 0 or 1 which is
+            # exact and much faster than np.where
+            r, u = right.astype(float), up.astype(float)
+            left, down = 1 - r, 1 - u
+            d = y - s
+            x, y = ((x - s) * r + ((s - d) * u + y * down) * left,
+                    (y - s * u) * r + ((s - x) * u + x * down) * left)
+            s *= 0.5
+        return result
+
 
 class OrderZCurve(SpaceFillingCurveOrder):
     name = QApplication.translate("job", 'SFC Z-curve')
@@ -377,6 +932,230 @@ class OrderZCurve(SpaceFillingCurveOrder):
             s *= 0.5
         return result
 
+    def curve_keys(self, x, y, s):
+        # The bits of each axis only depend on that axis
+        one = np.uint64(1)
+        xbits = np.zeros(len(x), dtype=np.uint64)
+        ybits = np.zeros(len(y), dtype=np.uint64)
+        for i in range(self.STEPS):
+            up = y > s
+            y = y - s * up
+            right = x > s
+            x = x - s * right
+            ybits = (ybits << one) | up.astype(np.uint64)
+            xbits = (xbits << one) | right.astype(np.uint64)
+            s *= 0.5
+        return (interleave_bits(ybits) << one) | interleave_bits(xbits)
+
+
+def interleave_bits(v):
+    """ Spread the lower 32 bits of each value to the even bits """
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF),
+                        (4, 0x0F0F0F0F0F0F0F0F), (2, 0x3333333333333333),
+                        (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+class OrderClustered(OrderHandler):
+    """ Order very large jobs by bucketing the subpaths into a grid of cells,
+    visiting the cells along a Hilbert curve and ordering the subpaths
+    within each cell with a greedy tour refined by a LocalSearch. The cells
+    are independent so large jobs are split across a pool of processes.
+
+    """
+    name = QApplication.translate("job", "Shortest Path (Clustered)")
+
+    #: Average number of subpaths in a cell
+    cluster_size = Int(4096)
+
+    #: Use a process pool for jobs with at least this many subpaths
+    parallel_threshold = Int(50000)
+
+    def order(self, job, path):
+        subpaths = split_painter_path(path)
+        n = len(subpaths)
+        if n <= 1:
+            return path
+        now = time()
+        clusters, tasks = self.cluster(subpath_endpoints(subpaths))
+        tour = self.join_clusters(clusters, self.order_clusters(tasks))
+        log.debug("Clustered order of {} subpaths in {} cells in {}".format(
+            n, len(clusters), time() - now))
+        return join_tour(subpaths, tour)
+
+    def order_anytime(self, job, path, publish):
+        """ Publish the subpaths visited cell by cell along the curve and
+        order the cells in a background thread when the background
+        optimizer is enabled.
+
+        """
+        if not self.plugin.background_optimizer:
+            return super(OrderClustered, self).order_anytime(
+                job, path, publish)
+        subpaths = split_painter_path(path)
+        if len(subpaths) <= 1:
+            return path, None
+        clusters, tasks = self.cluster(subpath_endpoints(subpaths))
+        tour = (2 * np.concatenate(clusters)).tolist()
+        optimizer = ClusterOptimizer(self, subpaths, clusters, tasks, publish)
+        optimizer.start()
+        return join_tour(subpaths, tour), optimizer
+
+    def cluster(self, endpoints):
+        """ Bucket the subpaths into cells and create the task ordering each
+        one.
+
+        Parameters
+        ----------
+            endpoints: List[Tuple[Float, Float]]
+                The start and end point of each subpath
+
+        Returns
+        -------
+            result: Tuple[List[numpy.ndarray], List[Tuple]]
+                The subpaths of each cell in the order they are visited and
+                the task of each cell for `order_cluster`
+        """
+        n = len(endpoints) // 2
+        points = np.array(endpoints).reshape(-1, 2)
+
+        # Bucket the subpaths by the midpoint of their ends
+        mid = (points[0::2] + points[1::2]) / 2
+        p0 = mid.min(axis=0)
+        size = max(float((mid.max(axis=0) - p0).max()), 1e-9)
+        side = max(1, int(math.ceil(math.sqrt(n / self.cluster_size))))
+        ij = np.minimum((mid - p0) / size * side, side - 1).astype(int)
+        cells = ij[:, 0] * side + ij[:, 1]
+
+        # Visit the cells along the curve
+        occupied = np.unique(cells)
+        hilbert = OrderHilbert(plugin=self.plugin)
+        keys = hilbert.curve_keys((occupied // side + 0.5) / side,
+                                  (occupied % side + 0.5) / side, 1)
+        rank = np.empty(side * side, dtype=int)
+        rank[occupied[np.argsort(keys, kind='stable')]] = np.arange(
+            len(occupied))
+        ids = np.argsort(rank[cells], kind='stable')
+        counts = np.bincount(rank[cells], minlength=len(occupied))
+        clusters = np.split(ids, np.cumsum(counts)[:-1])
+
+        # Go through each cell from the center of the previous one to the
+        # center of the next one so the cells can be ordered independently
+        centers = [(0.0, 0.0)]
+        centers.extend(tuple(mid[members].mean(axis=0).tolist())
+                       for members in clusters)
+        centers.append((0.0, 0.0))
+        budget = self.plugin.optimizer_timeout / n
+        tasks = []
+        for i, members in enumerate(clusters):
+            local = np.empty(2 * len(members), dtype=int)
+            local[0::2], local[1::2] = 2 * members, 2 * members + 1
+            tasks.append((points[local].tolist(), centers[i], centers[i + 2],
+                          budget * len(members)))
+        return clusters, tasks
+
+    def join_clusters(self, clusters, tours):
+        """ Join the tours of the cells into a tour of all the subpaths """
+        tour = []
+        for members, local in zip(clusters, tours):
+            members = members.tolist()
+            tour.extend(2 * members[idb // 2] + (idb & 1) for idb in local)
+        return tour
+
+    def order_clusters(self, tasks, cancelled=None):
+        """ Create the greedy tour of each cell in a process pool if the
+        job is large enough and there is more than one cpu.
+
+        Returns
+        -------
+            tours: List[List[Int]] or None
+                The tour of each cell or None if cancelled
+        """
+        workers = os.cpu_count() or 1
+        n = sum(len(task[0]) for task in tasks) // 2
+        if workers > 1 and len(tasks) > 1 and n >= self.parallel_threshold:
+            try:
+                # Each worker has the whole budget of its share of the cells
+                tasks = [task[:3] + (task[3] * workers,) for task in tasks]
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                    chunksize = max(1, len(tasks) // (4 * workers))
+                    return list(pool.map(order_cluster, tasks,
+                                         chunksize=chunksize))
+            except (OSError, BrokenProcessPool) as e:
+                log.warning("Ordering clusters in parallel failed: {}".format(
+                    e))
+        tours = []
+        for task in tasks:
+            if cancelled is not None and cancelled():
+                return None
+            tours.append(order_cluster(task))
+        return tours
+
+
+class ClusterOptimizer(BackgroundOptimizer):
+    """ Order the cells of an OrderClustered job in a worker thread and
+    publish the result.
+
+    """
+
+    def __init__(self, handler, subpaths, clusters, tasks, publish):
+        """ Create an optimizer
+
+        Parameters
+        ----------
+            handler: OrderClustered
+                The handler ordering the cells
+            subpaths: List[QPainterPath]
+                The subpaths of the job
+            clusters: List[numpy.ndarray]
+                The subpaths of each cell
+            tasks: List[Tuple]
+                The task of each cell for `order_cluster`
+            publish: Callable
+                Called from the worker thread with this optimizer and the
+                joined path of the ordered cells.
+        """
+        super(ClusterOptimizer, self).__init__(
+            subpaths, None, math.inf, publish)
+        self.handler = handler
+        self.clusters = clusters
+        self.tasks = tasks
+
+    def run(self):
+        start = time()
+        handler = self.handler
+        tours = handler.order_clusters(self.tasks,
+                                       cancelled=lambda: self.stopped)
+        if tours is None:
+            return
+        self._publish(handler.join_clusters(self.clusters, tours))
+        log.debug("Background clustered order of {} cells in {}".format(
+            len(self.clusters), time() - start))
+
+def order_cluster(task):
+    """ Create the greedy tour of the subpaths of one cell then refine it
+    with a LocalSearch within the time budget.
+
+    Parameters
+    ----------
+        task: Tuple
+            The endpoints of the subpaths, the point the cell is entered
+            from, the point it is left to and the time budget in seconds
+
+    Returns
+    -------
+        tour: List[Int]
+            The tour of the endpoints of the cell
+    """
+    endpoints, origin, destination, budget = task
+    time_limit = time() + budget
+    tour = greedy_tour(endpoints, origin[0], origin[1])[0]
+    search = LocalSearch(endpoints, tour, origin=origin,
+                         destination=destination)
+    return search.run(time_limit)
+
 
 #: Register all subclasses
 REGISTRY = {c.name: c for c in find_subclasses(OrderHandler) if c.name}
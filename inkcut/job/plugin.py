@@ -12,10 +12,16 @@ Created on Jul 12, 2015
 import os
 import sys
 import enaml
-from atom.api import Instance, Enum, List, Str, Int, Float, observe, Bool
+from atom.api import (
+    Instance, Enum, List, Str, Int, Float, observe, Bool, Value
+)
+from enaml.application import timed_call
+from enaml.qt.QtCore import QFileSystemWatcher
 from inkcut.core.api import Plugin, unit_conversions, log
+from inkcut.core.cache import ParseCache, GeometryCache
 
-from .models import Job, JobError, Material
+from inkcut.core.blobs import BlobStore
+from .models import Job, JobError, Material, BLOB_STORE
 
 with enaml.imports():
     from enaml.workbench.ui.workbench_menus import WorkbenchMenu
@@ -48,15 +54,93 @@ class JobPlugin(Plugin):
     #: Timeout for optimizing paths
     optimizer_timeout = Float(10, strict=False).tag(config=True)
 
+    #: Keep improving the order of paths in the background
+    background_optimizer = Bool(True).tag(config=True)
+
     # Default DPI setting if no units are specified in document.
     dpi_default = Float(96, strict=False).tag(config=True)
 
     # Whether or not to auto-detect DPI settings for Inkscape SVG files.
     dpi_auto_detect_inkscape = Bool(True).tag(config=True)
 
+    # Whether to compose group transforms and map each shape only once
+    # when importing SVG files.
+    flatten_transforms = Bool(False).tag(config=True)
+
+    # Whether to parse the top level groups of large SVG files in
+    # multiple processes.
+    parallel_parsing = Bool(False).tag(config=True)
+
+    # Whether to parse large SVG files incrementally without keeping the
+    # whole document in memory.
+    streaming_enabled = Bool(True).tag(config=True)
+
+    # Files larger than this size in MB are parsed incrementally.
+    streaming_min_size = Float(50, strict=False).tag(config=True)
+
+    # Maximum error in px when converting SVG arcs to curves. If zero arcs
+    # are added one at a time with QPainterPath.arcTo.
+    arc_tolerance = Float(0.01, strict=False).tag(config=True)
+
+    # Whether to drop the data of embedded images when importing SVG files.
+    strip_images = Bool(True).tag(config=True)
+
+    # Whether to cache the geometry of parsed documents on disk.
+    parse_cache_enabled = Bool(True).tag(config=True)
+
+    # Size limit of the parse cache in MB.
+    parse_cache_size = Float(100, strict=False).tag(config=True)
+
+    #: Cache of parsed documents
+    parse_cache = Instance(ParseCache)
+
+    # Whether to keep the geometry of each element in memory so documents
+    # opened again after an edit only parse the elements that changed.
+    geometry_cache_enabled = Bool(True).tag(config=True)
+
+    # Size limit of the geometry cache in millions of path elements.
+    geometry_cache_size = Float(4, strict=False).tag(config=True)
+
+    #: Cache of parsed elements
+    geometry_cache = Instance(GeometryCache)
+
+    # Whether to drop the xml tree once the filters are created and the
+    # geometry of completed jobs that are no longer open.
+    memory_lean = Bool(False).tag(config=True)
+
+    # Whether to reload the document when its file is saved.
+    watch_document = Bool(False).tag(config=True)
+
+    # Milliseconds to wait for more changes to the job before updating the
+    # model and the preview.
+    update_delay = Int(150).tag(config=True)
+
+    #: Number of preview refreshes requested
+    _refresh_count = Int()
+
+    #: Watches the file of the current job
+    _watcher = Value()
+    _reload_pending = Bool()
+
     def _default_job(self):
         return Job(material=self.material)
 
+    def _default_parse_cache(self):
+        return ParseCache(max_size=int(self.parse_cache_size * 1024 * 1024))
+
+    def _observe_parse_cache_size(self, change):
+        if change['type'] == 'update' and self.parse_cache is not None:
+            self.parse_cache.max_size = int(
+                self.parse_cache_size * 1024 * 1024)
+
+    def _default_geometry_cache(self):
+        return GeometryCache(max_size=int(self.geometry_cache_size * 1e6))
+
+    def _observe_geometry_cache_size(self, change):
+        if change['type'] == 'update' and self.geometry_cache is not None:
+            self.geometry_cache.max_size = int(
+                self.geometry_cache_size * 1e6)
+
     def _default_units(self):
         return "in"
 
@@ -70,8 +154,12 @@ class JobPlugin(Plugin):
 
         #: If we loaded from state, refresh
         if self.job.document:
+            self.job.load()
             self.refresh_preview()
 
+        #: Remove pasted documents no job uses anymore
+        BLOB_STORE.collect([job.document for job in self.jobs + [self.job]])
+
         self.init_recent_documents_menu()
 
     # -------------------------------------------------------------------------
@@ -89,7 +177,7 @@ class JobPlugin(Plugin):
 
     def refresh_preview(self):
         """Refresh the preview. Other plugins can request this"""
-        self._refresh_preview({})
+        self._redraw_preview({})
 
     def can_open(self, url):
         """Check if the given source url can be opened"""
@@ -148,6 +236,56 @@ class JobPlugin(Plugin):
 
             self.recent_documents = docs
 
+    def reload_document(self):
+        """Parse the document of the current job again after it was edited
+        reusing the geometry of the elements that did not change.
+
+        """
+        job = self.job
+        path = job.document
+        if not path or path == "-" or BlobStore.is_ref(path):
+            return
+        if not os.path.isfile(path):
+            raise JobError("Cannot reload %s, it does not exist!" % path)
+        log.info("Reloading {doc}".format(doc=path))
+        try:
+            job.reload()
+        except ValueError as e:
+            raise JobError(e)
+
+    @observe("job", "job.document", "watch_document")
+    def _update_watcher(self, change):
+        """Watch the file of the current job for changes if enabled"""
+        watcher = self._watcher
+        if watcher is None:
+            if not self.watch_document:
+                return
+            watcher = self._watcher = QFileSystemWatcher()
+            watcher.fileChanged.connect(self._on_document_changed)
+        if watcher.files():
+            watcher.removePaths(watcher.files())
+        path = self.job.document
+        if self.watch_document and path and os.path.isfile(path):
+            watcher.addPath(path)
+
+    def _on_document_changed(self, path):
+        """Reload the document once the editor is done writing it"""
+        if not self._reload_pending:
+            self._reload_pending = True
+            timed_call(250, self._reload_changed_document, path)
+
+    def _reload_changed_document(self, path):
+        self._reload_pending = False
+        if path != self.job.document or not self.watch_document:
+            return
+        # Files saved by replacing them are no longer watched
+        if path not in self._watcher.files() and os.path.isfile(path):
+            self._watcher.addPath(path)
+        try:
+            self.reload_document()
+        except Exception as e:
+            log.error("Failed to reload {}: {}".format(path, e))
+
     def save_document(self):
         # Copy so the ui's update
         job = self.job
@@ -155,6 +293,9 @@ class JobPlugin(Plugin):
         if job in jobs:
             # Save a copy or any changes will update the copy as well
             job = job.clone()
+            if job.memory_lean:
+                # It's parsed again if reopened
+                job.release_geometry()
         jobs.append(job)
 
         # Limit size
@@ -175,6 +316,17 @@ class JobPlugin(Plugin):
         # Create a new default job
         self.job = self._default_job()
 
+    @observe("job")
+    def _load_job(self, change):
+        """Parse the document of a job reopened from the history and release
+        the geometry of the completed jobs that are no longer open."""
+        if change['type'] == 'update':
+            self.job.load()
+            if self.memory_lean:
+                device = self.workbench.get_plugin("inkcut.device").device
+                if device is not None:
+                    device.release_jobs(keep=(self.job,))
+
     @observe("job.material")
     def _observe_material(self, change):
         """Keep the job material and plugin material in sync."""
@@ -183,8 +335,29 @@ class JobPlugin(Plugin):
         if job.material != m:
             job.material = m
 
+    @observe("job", "update_delay")
+    def _sync_update_delay(self, change):
+        """Debounce the updates of the current job"""
+        self.job.update_delay = self.update_delay
+
     @observe("job", "job.model", "job.material", "material.size", "material.padding")
     def _refresh_preview(self, change):
+        """Redraw the preview once the changes stop for the update delay.
+        The job model is already debounced by the job so it's redrawn right
+        away."""
+        self._refresh_count += 1
+        if self.update_delay > 0 and change['name'] != 'model':
+            timed_call(self.update_delay, self._refresh_if_latest,
+                       self._refresh_count, change)
+        else:
+            self._redraw_preview(change)
+
+    def _refresh_if_latest(self, count, change):
+        """Skip refreshes that were followed by another request"""
+        if count == self._refresh_count:
+            self._redraw_preview(change)
+
+    def _redraw_preview(self, change):
         """Redraw the preview on the screen"""
         log.info(change)
         view_items = []
@@ -18,23 +18,31 @@ from atom.api import (
 from enaml.core.declarative import d_
 from enaml.qt.qt_application import QtApplication
 from enaml.qt.qt_control import QtControl
-from enaml.qt import QtGui
+from enaml.qt import QtCore, QtGui
 from enaml.widgets.control import Control, ProxyControl
 from pyqtgraph.widgets.PlotWidget import PlotWidget
 from pyqtgraph.graphicsItems.PlotCurveItem import PlotCurveItem
 from pyqtgraph.graphicsItems.ViewBox.ViewBox import ViewBox
 from pyqtgraph.graphicsItems.AxisItem import AxisItem
 from pyqtgraph.graphicsItems.GraphicsObject import GraphicsObject
+from inkcut.core.instanced import InstancedPath, map_path
 
 
 class PainterPathPlotItem(PlotCurveItem):
 
+    #: Copies drawn by painting the base path once for each
+    instances = None
+
     def updateData(self, path, **kargs):
         # Invert for display
-        self.path = QtGui.QTransform.fromScale(1, -1).map(path)
+        path = map_path(QtGui.QTransform.fromScale(1, -1), path)
+        if isinstance(path, InstancedPath):
+            self.instances, self.path = path, path.tail
+        else:
+            self.instances, self.path = None, path
+        self.bbox = bbox = path.boundingRect()
 
         # Trick the checks so it still paints
-        bbox = self.path.boundingRect()
         self.xData = [bbox.left(), bbox.right()]
         self.yData = [bbox.bottom(), bbox.top()]
 
@@ -80,7 +88,24 @@ class PainterPathPlotItem(PlotCurveItem):
         self.sigPlotChanged.emit(self)
 
     def boundingRect(self):
-        return self.path.boundingRect()
+        return self.bbox
+
+    def paint(self, p, opt, widget):
+        instances = self.instances
+        if instances is None:
+            return super(PainterPathPlotItem, self).paint(p, opt, widget)
+        pen = self.opts['pen']
+        if pen is None or pen.style() == QtCore.Qt.PenStyle.NoPen:
+            return
+        p.setRenderHint(p.RenderHint.Antialiasing, self.opts['antialias'])
+        p.setPen(pen)
+        path = instances.path
+        for t in instances.transforms():
+            p.save()
+            p.setTransform(t, True)
+            p.drawPath(path)
+            p.restore()
+        p.drawPath(self.path)
 
     def getPath(self):
         return self.path
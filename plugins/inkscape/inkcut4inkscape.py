@@ -35,13 +35,6 @@ if optparse_spec:
 else:
     VERSION= "0.9"
 
-def contains_text(nodes):
-    for node in nodes:
-        tag = node.tag[node.tag.rfind("}")+1:]
-        if tag == 'text':
-            return True
-    return False
-
 def convert_objects_to_paths(file, document):
     tempfile = os.path.splitext(file)[0] + "-prepare.svg"
     # tempfile is needed here only because we want to force the extension to be .svg
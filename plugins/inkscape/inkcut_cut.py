@@ -37,7 +37,6 @@ if VERSION == "1.X":
 else:
     inkex.localize()
 import subprocess
-from inkcut4inkscape import contains_text, convert_objects_to_paths
 
 
 
@@ -60,9 +59,8 @@ class InkscapeInkcutPlugin(inkex.Effect):
             inkex.errormsg("There were no paths were selected.")
             return
 
+        # Text is outlined by inkcut so it's sent as is
         document = self.document
-        if contains_text(self.svg.selected.values() if VERSION == "1.X" else self.selected.values()):
-            document = convert_objects_to_paths(self.options.input_file if VERSION == "1.X" else self.args[-1], self.document)
 
         #: If running from source
         if DEBUG:
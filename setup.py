@@ -22,6 +22,7 @@ install_requires = [
     'pyserial>=3.5',
     'jsonpickle',
     'lxml',  # use sudo apt install libxml2-dev libxslt-dev
+    'numpy',
 
     #'PyQt6', # Let users install whatever Qt they want
     'qt-reactor',
@@ -0,0 +1,46 @@
+"""
+Copyright (c) 2026, the Inkcut team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Created on Oct 18, 2026
+
+"""
+import pytest
+
+from inkcut.core.workbench import InkcutWorkbench
+
+
+class FakeJobPlugin(object):
+    dpi_default = 96.0
+    dpi_auto_detect_inkscape = True
+    flatten_transforms = False
+    parallel_parsing = False
+    strip_images = True
+    arc_tolerance = 0.01
+    geometry_cache_enabled = False
+    streaming_enabled = False
+    parse_cache_enabled = False
+    memory_lean = False
+
+
+class FakeWorkbench(object):
+    def __init__(self):
+        self.plugin = FakeJobPlugin()
+
+    def get_plugin(self, name):
+        return self.plugin
+
+
+@pytest.fixture
+def workbench(monkeypatch):
+    """ Install a workbench whose job plugin is `workbench.plugin` so jobs
+    can be created without starting the application.
+
+    """
+    workbench = FakeWorkbench()
+    monkeypatch.setattr(InkcutWorkbench, '_instance', workbench,
+                        raising=False)
+    return workbench
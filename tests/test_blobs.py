@@ -0,0 +1,99 @@
+"""
+Copyright (c) 2026, the Inkcut team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Created on Oct 18, 2026
+
+"""
+import os
+import pytest
+import jsonpickle as pickle
+
+from inkcut.core.blobs import BlobStore
+from inkcut.job.models import Job
+
+
+SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:xlink="http://www.w3.org/1999/xlink" width="200" height="200">
+  <image width="5" height="5" xlink:href="data:image/png;base64,%s"/>
+  <rect x="10" y="10" width="10" height="10"/>
+</svg>
+""" % ("A" * 100000)
+
+
+@pytest.fixture
+def blobs(tmpdir, monkeypatch, workbench):
+    store = BlobStore(str(tmpdir.join('blobs')))
+    monkeypatch.setattr('inkcut.job.models.BLOB_STORE', store)
+    return store
+
+
+def test_blob_store(tmpdir):
+    store = BlobStore(str(tmpdir))
+    ref = store.put("<svg/>")
+    assert BlobStore.is_ref(ref)
+    assert store.put(b"<svg/>") == ref
+    assert store.get(ref) == b"<svg/>"
+    assert os.path.exists(store.resolve(ref))
+    other = store.put("<svg></svg>")
+    assert len(os.listdir(str(tmpdir))) == 2
+
+    # Recently saved blobs are kept
+    store.collect([ref])
+    assert store.get(other) is not None
+    store.collect([ref], min_age=0)
+    assert store.get(other) is None
+    assert store.get(ref) == b"<svg/>"
+
+    with pytest.raises(ValueError):
+        store.resolve("/tmp/file.svg")
+
+
+def test_pasted_job_state(blobs):
+    """ Make sure pasted documents are saved in the blob store without
+    their images and restored jobs are only parsed when used.
+
+    """
+    job = Job(document=SVG)
+    assert BlobStore.is_ref(job.document)
+    assert str(job) == "Pasted document"
+    assert job.doc is not None
+    assert len(job.doc.images) == 1
+    assert b"data:" not in blobs.get(job.document)
+
+    state = pickle.dumps(job.__getstate__())
+    assert len(state) < 10000
+    assert job.document in state
+    restored = Job.__new__(Job)
+    restored.__setstate__(pickle.loads(state))
+    assert restored.document == job.document
+    assert restored.doc is None
+    restored.load()
+    assert restored.doc.boundingRect() == job.doc.boundingRect()
+
+
+def test_memory_lean_job(blobs, workbench):
+    """ Make sure a job in memory lean mode drops the tree and the geometry
+    but can still be filtered and loaded again.
+
+    """
+    workbench.plugin.memory_lean = True
+    job = Job(document=SVG)
+    assert job.memory_lean
+    assert job.doc.elements is not None
+    usage = job.memory_usage()
+    assert usage['tree'] == 0
+    assert usage['path'] > 0 and usage['total'] >= usage['path']
+    with pytest.raises(AttributeError):
+        job.doc._e.getroot()
+
+    rect = job.model.boundingRect()
+    job.release_geometry()
+    assert job.doc is None and job.model is None
+    assert job.memory_usage()['total'] == 0
+    job.load()
+    assert job.model.boundingRect() == rect
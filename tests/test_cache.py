@@ -0,0 +1,135 @@
+"""
+Copyright (c) 2026, the Inkcut team.
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Created on Oct 18, 2026
+
+"""
+import os
+import pytest
+from glob import glob
+from lxml import etree
+
+from inkcut.core.cache import ParseCache, GeometryCache
+from inkcut.core.svg import QtSvgDoc
+from enaml.qt.QtGui import QPainterPath
+
+
+def path_elements(path):
+    return [(e.type, e.x, e.y) for e in map(path.elementAt,
+                                             range(path.elementCount()))]
+
+
+@pytest.mark.parametrize('path', glob('tests/data/*.svg'))
+def test_parse_cache(tmp_path, path):
+    """ Make sure documents loaded from the cache match the parsed one """
+    cache = ParseCache(str(tmp_path))
+    try:
+        expected = QtSvgDoc(path)
+    except NotImplementedError as e:
+        pytest.skip(str(e))
+    doc = QtSvgDoc(path, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    cached = QtSvgDoc(path, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached._source is not None
+    assert path_elements(cached) == path_elements(doc) == path_elements(
+        expected)
+
+    # The xml is parsed on demand
+    assert cached._e.tag == doc._e.tag
+    assert cached._source is None
+
+
+def test_parse_cache_options(tmp_path):
+    """ Make sure the parse options are part of the key """
+    cache = ParseCache(str(tmp_path))
+    path = 'tests/data/scale/ScaleTest-px-with-viewbox-old-inkscape.svg'
+    a = QtSvgDoc(path, cache=cache)
+    b = QtSvgDoc(path, cache=cache, dpi_auto_detect_inkscape=False)
+    assert cache.misses == 2
+    assert a.boundingRect() != b.boundingRect()
+    assert QtSvgDoc(path, cache=cache).boundingRect() == a.boundingRect()
+    assert cache.hits == 1
+
+
+def test_parse_cache_eviction(tmp_path):
+    """ Make sure the least recently used entries are removed first """
+    cache = ParseCache(str(tmp_path), max_size=25)
+    cache.set('a', b'0' * 10)
+    cache.set('b', b'1' * 10)
+    os.utime(cache.entry('a'), (0, 0))
+    os.utime(cache.entry('b'), (1, 1))
+    assert cache.get('a') == b'0' * 10  # Now the most recently used
+    cache.set('c', b'2' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == b'0' * 10
+    assert cache.get('c') == b'2' * 10
+
+    # Too big to store
+    cache.set('d', b'3' * 30)
+    assert cache.get('d') is None
+
+    cache.clear()
+    assert cache.get('a') is None
+
+
+@pytest.mark.parametrize('flatten', (False, True))
+@pytest.mark.parametrize('path', glob('tests/data/*.svg'))
+def test_geometry_cache(path, flatten):
+    """ Make sure documents using the geometry cache match the parsed one
+    and only changed elements are parsed again """
+    try:
+        expected = QtSvgDoc(path, flatten=flatten)
+    except NotImplementedError as e:
+        pytest.skip(str(e))
+    cache = GeometryCache()
+    doc = QtSvgDoc(path, flatten=flatten, geometry=cache)
+    assert path_elements(doc) == path_elements(expected)
+    misses = cache.misses
+    doc = QtSvgDoc(path, flatten=flatten, geometry=cache)
+    assert path_elements(doc) == path_elements(expected)
+    assert cache.misses == misses
+
+    # Move one shape
+    tree = etree.parse(path)
+    shapes = [e for e in tree.iter() if e.tag in (
+        '{http://www.w3.org/2000/svg}path', '{http://www.w3.org/2000/svg}rect')]
+    if not shapes:
+        return
+    shapes[0].attrib['transform'] = 'translate(1, 2) ' + \
+        shapes[0].attrib.get('transform', '')
+    edited = etree.tostring(tree, xml_declaration=True,
+                            encoding='UTF-8').decode()
+    doc = QtSvgDoc(edited, flatten=flatten, geometry=cache)
+    assert path_elements(doc) == path_elements(
+        QtSvgDoc(edited, flatten=flatten))
+    assert cache.misses <= misses + 1
+
+
+def test_geometry_cache_options():
+    """ Make sure elements parsed with other options are not reused """
+    cache = GeometryCache()
+    path = 'tests/data/scale/ScaleTest-px-with-viewbox-old-inkscape.svg'
+    a = QtSvgDoc(path, flatten=True, geometry=cache)
+    b = QtSvgDoc(path, flatten=True, geometry=cache,
+                 dpi_auto_detect_inkscape=False)
+    assert a.boundingRect() != b.boundingRect()
+    assert b.boundingRect() == QtSvgDoc(
+        path, flatten=True, dpi_auto_detect_inkscape=False).boundingRect()
+
+
+def test_geometry_cache_eviction():
+    """ Make sure the cache stays within the size limit """
+    cache = GeometryCache(max_size=10)
+    path = QPainterPath()
+    path.addRect(0, 0, 10, 10)
+    for i in range(5):
+        cache.set(i, path)
+    assert cache.size <= 10
+    assert cache.get(0) is None
+    cache.clear()
+    assert len(cache) == 0 and cache.size == 0
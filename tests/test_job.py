@@ -0,0 +1,407 @@
+"""
+Copyright (c) 2026, The Inkcut Team
+
+Distributed under the terms of the GPL v3 License.
+
+The full license is in the file LICENSE, distributed with this software.
+
+Created on Oct 18, 2026
+
+"""
+import pytest
+import random
+import threading
+from enaml.qt.QtGui import QPainterPath, QTransform, QVector2D
+from inkcut.core.svg import QtSvgDoc
+from inkcut.core.utils import split_painter_path
+from inkcut.core.instanced import InstancedPath, map_path, map_rect
+from inkcut.device.extensions import DeviceDriver
+from inkcut.device.plugin import DeviceConfig, Device, DeviceFilter
+from inkcut.device.protocols.hpgl import HPGLProtocol
+from inkcut.job.models import Job
+from inkcut.job.ordering import OrderHandler, OrderClustered, order_cluster
+from inkcut.job.plugin import JobPlugin
+
+
+SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     width="200" height="200">
+  <g inkscape:groupmode="layer" inkscape:label="A">
+    <rect width="10" height="10"/>
+  </g>
+  <g inkscape:groupmode="layer" inkscape:label="B">
+    <rect x="50" y="50" width="10" height="20"/>
+  </g>
+</svg>
+"""
+
+
+@pytest.fixture
+def test_device():
+    config = DeviceConfig()
+    config.test_mode = True
+    return Device(config=config, declaration=DeviceDriver())
+
+
+def stage_results(job):
+    return dict((name, entry[1]) for name, entry in job._stages.items())
+
+
+def test_pipeline_stages():
+    """ Make sure changing a member only reruns the stages depending on it
+    and the result is the same as running all of them.
+
+    """
+    job = Job()
+    job.path = QtSvgDoc(SVG, tagged=True)
+    assert job.model is not None
+    assert set(job.stage_timings) == set(Job.STAGES)
+    results = stage_results(job)
+
+    # Only the layout and later stages run for copies
+    job.copies = 2
+    copies = stage_results(job)
+    for name in ('filter', 'order', 'copy'):
+        assert copies[name] is results[name]
+    for name in ('layout', 'transform', 'finish'):
+        assert copies[name] is not results[name]
+    assert job.size[0] * 2 < job.model.boundingRect().width()
+
+    # Same inputs give the same model
+    model = job.model
+    job.update_document()
+    assert job.model is model
+
+    # Filters that are toggled rerun from the first stage
+    layer = [f for f in job.svg_filters if f.name == 'B'][0]
+    layer.enabled = False
+    job.update_document({'name': 'layer'})
+    filtered = stage_results(job)
+    assert filtered['filter'] is not copies['filter']
+    assert job.size[0] == job.size[1]
+
+    # Same as a job created with all the settings at once
+    other = Job(copies=2)
+    other.path = QtSvgDoc(SVG)
+    assert other.path.elements is None
+    [f for f in other.svg_filters if f.name == 'B'][0].enabled = False
+    other.update_document()
+    assert other.path.elements is not None
+    assert other.model.boundingRect() == job.model.boundingRect()
+    assert other.model.elementCount() == job.model.elementCount()
+
+
+def test_pipeline_device_transform():
+    """ Make sure models created for a device are not changed when moved """
+    job = Job()
+    job.path = QtSvgDoc(SVG)
+    model = job.create(scale=[2, 2])
+    assert job.create(scale=[2, 2]) is model
+    rect = model.boundingRect()
+    moved = model.translated(10, 10)
+    assert job.create(scale=[2, 2]).boundingRect() == rect
+    assert moved.boundingRect() != rect
+    assert job.create().boundingRect().width() * 2 == rect.width()
+
+
+def polygons(polys):
+    return [[(round(p.x(), 6), round(p.y(), 6)) for p in poly]
+            for poly in polys]
+
+
+def segments(path):
+    """ Set of the line segments drawn by the path """
+    result = set()
+    for poly in path.toSubpathPolygons():
+        for i in range(1, len(poly)):
+            a, b = poly[i-1], poly[i]
+            result.add((round(a.x(), 6), round(a.y(), 6),
+                        round(b.x(), 6), round(b.y(), 6)))
+    return result
+
+
+def test_instanced_copies():
+    """ Make sure copies are instanced and match the expanded model """
+    job = Job(copies=20, plot_weedline=True, feed_to_end=True, feed_after=5)
+    job.path = QtSvgDoc(SVG)
+    model = job.model
+    assert isinstance(model, InstancedPath)
+    assert model.storedElementCount() < model.elementCount()
+    expanded = model.toPath()
+    assert expanded.elementCount() == model.elementCount()
+    assert expanded.boundingRect() == model.boundingRect()
+    assert expanded.currentPosition() == model.currentPosition()
+    assert polygons(expanded.toSubpathPolygons()) == polygons(
+        model.toSubpathPolygons())
+
+    # Mapping keeps the copies instanced
+    t = QTransform()
+    t.rotate(30)
+    t.scale(2, -1)
+    mapped = map_path(t, model)
+    assert isinstance(mapped, InstancedPath)
+    rect, other = t.map(expanded).boundingRect(), mapped.boundingRect()
+    for a, b in ((rect.left(), other.left()), (rect.top(), other.top()),
+                 (rect.width(), other.width()),
+                 (rect.height(), other.height())):
+        assert abs(a - b) < 1e-6
+
+    # The moves between copies are the same
+    negative = QPainterPath()
+    for i in range(expanded.elementCount()):
+        e = expanded.elementAt(i)
+        if e.isMoveTo():
+            negative.lineTo(e.x, e.y)
+        else:
+            negative.moveTo(e.x, e.y)
+    assert segments(job.move_path.toPath()) == segments(negative)
+
+    # Clipping expands the copies into a single instance
+    job.clip_to_plot_area = True
+    assert len(job.model.offsets) == 1
+    assert job.model.storedElementCount() >= expanded.elementCount()
+
+
+@pytest.mark.parametrize('rotation', [0, 90, 30])
+def test_composed_copy_transform(rotation):
+    """ Make sure the composed copy transform gives the same copy as mapping
+    the path by each transform in turn.
+
+    """
+    job = Job(rotation=rotation, mirror=[True, False], scale=[2, 1],
+              copy_weedline=True, copy_weedline_padding=[1, 2, 3, 4])
+    job.path = QtSvgDoc(SVG)
+    path = job.optimized_path
+    bbox = path.boundingRect()
+    t = QTransform.fromScale(-2, 1)
+    c = bbox.center()
+    t.translate(-c.x(), -c.y())
+    t.rotate(rotation)
+    t.translate(c.x(), c.y())
+    expected = t.map(path)
+    job._add_weedline(expected, job.copy_weedline_padding)
+    br = expected.boundingRect().bottomRight()
+    expected = QTransform.fromTranslate(-br.x(), -br.y()).map(expected)
+
+    copy = job._create_copy(path)
+    assert polygons(copy.toSubpathPolygons()) == polygons(
+        expected.toSubpathPolygons())
+    assert map_rect(t, path) == t.map(path).boundingRect()
+
+
+def test_instanced_device(test_device):
+    """ Make sure the device sends the same commands for instanced copies """
+    job = Job(copies=5)
+    job.path = QtSvgDoc(SVG)
+    model = job.create()
+    assert isinstance(model, InstancedPath)
+    commands = [args for d, cmd, args, kwargs in
+                test_device.process(model)]
+    expected = [args for d, cmd, args, kwargs in
+                test_device.process(model.toPath())]
+    assert len(commands) > 5
+    assert commands == expected
+
+    # Filters still receive a list of the polygons of every copy
+    class PolypathFilter(DeviceFilter):
+        def apply_to_polypath(self, polypath):
+            assert isinstance(polypath, list)
+            return polypath[:]
+
+    test_device.filters = [PolypathFilter()]
+    assert [args for d, cmd, args, kwargs in
+            test_device.process(model)] == expected
+
+
+def test_compile_in_background(app, qtbot, workbench, test_device,
+                               monkeypatch):
+    """ Make sure submitting a job creates and compiles its model in a
+    worker thread, reports the progress in the device status and can be
+    cancelled while it compiles.
+
+    """
+    created = []
+    gate = threading.Event()
+    create = Job.create
+
+    def create_in_worker(self, *args, **kwargs):
+        if threading.current_thread() is not threading.main_thread():
+            created.append(self)
+            gate.wait(10)
+        return create(self, *args, **kwargs)
+
+    monkeypatch.setattr(Job, 'create', create_in_worker)
+    statuses = []
+    test_device.observe('status', lambda change: statuses.append(
+        change['value']))
+    test_device.config.custom_rate = 0
+    test_device.connection.protocol = HPGLProtocol()
+
+    job = Job(copies=3)
+    job.path = QtSvgDoc(SVG)
+    job.info.auto_approve = True
+    gate.set()
+    test_device.submit(job)
+    qtbot.waitUntil(lambda: job.info.status == 'complete')
+    assert len(created) == 1 and created[0] is not job
+    assert "Compiling job (100%)" in statuses
+    polypath, length = test_device.compile(job)
+    assert job.info.length == pytest.approx(length) and length > 0
+
+    # Cancelling while the model is created stops the compilation
+    gate.clear()
+    job = Job(copies=3)
+    job.path = QtSvgDoc(SVG)
+    job.info.auto_approve = True
+    test_device.submit(job)
+    qtbot.waitUntil(lambda: test_device.status == "Compiling job (0%)")
+    job.info.cancelled = True
+    gate.set()
+    qtbot.waitUntil(lambda: job.info.status == 'cancelled')
+    assert test_device.status == "Job cancelled"
+    assert not test_device.busy
+
+
+def test_batch_updates():
+    """ Make sure changes within a batch update the model once """
+    job = Job()
+    job.path = QtSvgDoc(SVG)
+    models = []
+    job.observe('model', lambda change: models.append(change['value']))
+    generation = job.update_generation
+    with job.batch_updates():
+        job.scale = [2, 2]
+        job.rotation = 90
+        with job.batch_updates():
+            job.copies = 3
+        assert not models
+    assert len(models) == 1
+    assert job.update_generation == generation + 3
+
+    other = Job(scale=[2, 2], rotation=90, copies=3)
+    other.path = QtSvgDoc(SVG)
+    assert other.model.boundingRect() == job.model.boundingRect()
+
+
+@pytest.fixture
+def app(qtbot):
+    from enaml.application import Application
+    from enaml.qt.qt_application import QtApplication
+    # The application is kept for the whole session since deferred calls
+    # fail once the first one is destroyed
+    return Application.instance() or QtApplication()
+
+
+def test_debounced_updates(app, qtbot):
+    """ Make sure changes within the update delay update the model once """
+    job = Job(update_delay=20)
+    job.path = QtSvgDoc(SVG)
+    models = []
+    job.observe('model', lambda change: models.append(change['value']))
+    for i in range(5):
+        job.rotation = i * 10
+    assert not models
+    qtbot.waitUntil(lambda: len(models) == 1)
+    qtbot.wait(50)
+    assert len(models) == 1
+
+
+def random_lines(count):
+    rand = random.Random(0)
+    lines = ['<path d="M %f,%f l %f,%f"/>' % (
+        rand.uniform(0, 500), rand.uniform(0, 500), rand.uniform(-5, 5),
+        rand.uniform(-5, 5)) for i in range(count)]
+    return QtSvgDoc('<?xml version="1.0"?><svg '
+                    'xmlns="http://www.w3.org/2000/svg" width="500" '
+                    'height="500">%s</svg>' % ''.join(lines))
+
+
+def test_background_optimizer(app, qtbot, workbench):
+    """ Make sure the order is improved in the background and frozen when
+    the optimizer is stopped.
+
+    """
+    workbench.plugin = JobPlugin()
+    job = Job(order='Shortest Path', document='')
+    job.path = random_lines(2000)
+    optimizer = job.optimizer
+    assert optimizer is not None
+    first = job.optimized_path
+    models = []
+    job.observe('model', lambda change: models.append(change['value']))
+    qtbot.waitUntil(lambda: not optimizer.thread.is_alive(), timeout=20000)
+    qtbot.waitUntil(lambda: job.optimized_path is not first)
+
+    distance = lambda path: OrderHandler.subpath_move_distance(
+        QVector2D(0, 0), split_painter_path(path))
+    assert distance(job.optimized_path) < 0.95 * distance(first)
+    assert models and models[-1] is job.model
+    assert len(split_painter_path(job.optimized_path)) == 2000
+
+    # Stopped optimizers do not change the job
+    job.order = 'Normal'
+    job.order = 'Shortest Path'
+    optimizer = job.optimizer
+    job.stop_optimizer()
+    frozen = job.optimized_path
+    optimizer.join()
+    qtbot.wait(50)
+    assert job.optimized_path is frozen
+
+
+def test_clustered_background(app, qtbot, workbench, monkeypatch):
+    """ Make sure the clustered order publishes the cells along the curve
+    right away and orders them in the background.
+
+    """
+    workbench.plugin = JobPlugin()
+    started = threading.Event()
+
+    def order_clusters(self, tasks, cancelled=None):
+        # The first order is published before any cell is ordered
+        started.wait()
+        return [order_cluster(task) for task in tasks]
+
+    monkeypatch.setattr(OrderClustered, 'order_clusters', order_clusters)
+    job = Job(order='Shortest Path (Clustered)', document='')
+    job.path = random_lines(2000)
+    optimizer = job.optimizer
+    assert optimizer is not None
+    first = job.optimized_path
+    assert len(split_painter_path(first)) == 2000
+    started.set()
+    qtbot.waitUntil(lambda: not optimizer.thread.is_alive(), timeout=20000)
+    qtbot.waitUntil(lambda: job.optimized_path is not first)
+
+    distance = lambda path: OrderHandler.subpath_move_distance(
+        QVector2D(0, 0), split_painter_path(path))
+    assert distance(job.optimized_path) < 0.5 * distance(first)
+    assert len(split_painter_path(job.optimized_path)) == 2000
+
+
+def test_preview_refresh(app, qtbot, workbench, monkeypatch):
+    """ Make sure the preview is redrawn as soon as the debounced model
+    changes and other changes are debounced by the plugin.
+
+    """
+    redraws = []
+    monkeypatch.setattr(JobPlugin, '_redraw_preview',
+                        lambda self, change: redraws.append(change['name']))
+    plugin = workbench.plugin = JobPlugin()
+    job = plugin.job
+    job.path = QtSvgDoc(SVG)
+    qtbot.wait(2 * plugin.update_delay)
+    del redraws[:]
+
+    models = []
+    job.observe('model', lambda change: models.append(list(redraws)))
+    job.rotation = 90
+    assert not redraws
+    qtbot.waitUntil(lambda: redraws == ['model'])
+    # Redrawn when the model changed without waiting again
+    assert models == [['model']]
+
+    plugin.material.size = [100, 100]
+    assert redraws == ['model']
+    qtbot.waitUntil(lambda: 'size' in redraws)
@@ -9,8 +9,11 @@ Created on Nov 3, 2022
 
 @author: karliss
 """
+import numpy
 import pytest
-from enaml.qt.QtGui import QVector2D
+import random
+from time import time
+from enaml.qt.QtGui import QPainterPath, QVector2D
 
 import inkcut.job.ordering as ordering
 import inkcut.core.utils as utils
@@ -27,7 +30,8 @@ EXPECTED_RANGES_RECT = {
     'OrderMaxX': (6000, 8000),
     'OrderMinY': (6000, 8000),
     'OrderMaxY': (6000, 8000),
-    'OrderShortestPath': (2683, 2684),
+    'OrderShortestPath': (2268, 2270),
+    'OrderClustered': (2268, 2270),
     'OrderHilbert': (2564, 2565),
     'OrderZCurve': (3716, 3718),
 }
@@ -74,3 +78,110 @@ def test_shortest_path(path, expected):
     move_length = ordering.OrderHandler.subpath_move_distance(QVector2D(0, 0), path_items)
     move_length = to_unit(move_length, "mm")
     assert expected[0] <= move_length <= expected[1]
+
+
+def test_point_index():
+    """ Compare the nearest points found by the index with a brute force
+    search while removing points.
+
+    """
+    rand = random.Random(0)
+    points = [(rand.randint(0, 50), rand.uniform(0, 50)) for i in range(500)]
+    index = ordering.PointIndex(points)
+    assert len(index) == 500
+    alive = set(range(len(points)))
+    for i in range(len(points)):
+        x, y = rand.uniform(-10, 60), rand.uniform(-10, 60)
+        dist = lambda j: (points[j][0] - x) ** 2 + (points[j][1] - y) ** 2
+        found = index.nearest(x, y)
+        assert dist(found) == min(dist(j) for j in alive)
+        index.remove(found)
+        index.remove(found)  # Removing twice is ignored
+        alive.remove(found)
+    assert len(index) == 0
+    assert index.nearest(0, 0) == -1
+    assert ordering.PointIndex([]).nearest(0, 0) == -1
+
+
+def test_local_search():
+    """ Make sure the local search keeps every subpath and only shortens a
+    greedy tour.
+
+    """
+    rand = random.Random(0)
+    endpoints = []
+    for i in range(300):
+        x, y = rand.uniform(0, 100), rand.uniform(0, 100)
+        endpoints.append((x, y))
+        endpoints.append((x + rand.uniform(-5, 5), y + rand.uniform(-5, 5)))
+    index = ordering.PointIndex(endpoints)
+    tour = []
+    x, y = 0, 0
+    for i in range(300):
+        idb = index.nearest(x, y)
+        index.remove(idb)
+        index.remove(idb ^ 1)
+        tour.append(idb)
+        x, y = endpoints[idb ^ 1]
+
+    search = ordering.LocalSearch(endpoints, tour)
+    before = search.length()
+    result = search.run(time() + 60)
+    assert sorted(idb // 2 for idb in result) == list(range(300))
+    assert search.length() < 0.95 * before
+
+    # Without time left the tour is unchanged
+    assert ordering.LocalSearch(endpoints, tour).run(0) == tour
+
+
+def test_clustered(monkeypatch):
+    """ Make sure ordering the cells in a process pool gives the same order
+    as ordering them in this process.
+
+    """
+    job_plugin = JobPlugin()
+    job_plugin.optimizer_timeout = 0
+    doc = QtSvgDoc(DATA_PREFIX + "sequence.svg")
+    sorter = ordering.OrderClustered(plugin=job_plugin, cluster_size=4)
+    expected = sorter.order(None, doc)
+
+    monkeypatch.setattr(ordering.os, 'cpu_count', lambda: 2)
+    sorter.parallel_threshold = 0
+    result = sorter.order(None, doc)
+    assert len(utils.split_painter_path(doc)) == len(
+        utils.split_painter_path(result))
+    assert result == expected
+
+
+@pytest.mark.parametrize('order', [ordering.OrderHilbert,
+                                   ordering.OrderZCurve])
+def test_curve_keys(order):
+    """ Make sure the vectorized keys and orderings of the space filling
+    curves are the same as computing each key on its own.
+
+    """
+    rand = random.Random(0)
+    path = QPainterPath()
+    for i in range(2000):
+        # Include points on the boundaries of the cells
+        if i % 4:
+            x, y = rand.uniform(0, 100), rand.uniform(0, 100)
+        else:
+            x, y = rand.randint(0, 8) * 12.5, rand.randint(0, 16) * 6.25
+        path.moveTo(x, y)
+        path.lineTo(x + 1, y + 1)
+    sorter = order(plugin=JobPlugin())
+    bounds = path.boundingRect()
+    size = max(bounds.width(), bounds.height())
+    p0 = bounds.topLeft()
+    subpaths = utils.split_painter_path(path)
+    points = [ordering.start_point(sp) for sp in subpaths]
+    keys = sorter.curve_keys(
+        numpy.array([p.x() for p in points]) - p0.x(),
+        numpy.array([p.y() for p in points]) - p0.y(), size)
+    assert keys.tolist() == [sorter.curve_pos(p, p0, size) for p in points]
+
+    expected = sorter.order_by_func(
+        None, path, lambda p: sorter.curve_pos(
+            ordering.start_point(p), p0, size))
+    assert sorter.order(None, path) == expected
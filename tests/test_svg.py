@@ -10,10 +10,15 @@ Created on Mar 14, 2018
 @author: jrm
 """
 import os
+import math
 import pytest
+import numpy as np
 from glob import glob
 
-from inkcut.core.svg import QtSvgDoc
+from lxml import etree
+from inkcut.core import pathdata
+from inkcut.core.svg import QtSvgDoc, QtSvgPath
+from enaml.qt.QtCore import QRectF
 
 
 @pytest.mark.parametrize('path', glob('tests/data/*.svg'))
@@ -23,3 +28,553 @@ def test_svg(path):
         doc = QtSvgDoc(path)
     except NotImplementedError as e:
          pytest.skip(str(e))
+
+
+def path_elements(path):
+    return [(e.type, e.x, e.y) for e in map(path.elementAt,
+                                             range(path.elementCount()))]
+
+
+def path_distance(path, p, samples=100):
+    """ Approximate distance from the point to the path """
+    points = []
+    t = np.linspace(0, 1, samples)[:, None]
+    elements = pathdata.path_elements(path)
+    last = None
+    for i, (kind, x, y) in enumerate(elements.tolist()):
+        if kind == pathdata.LINE_TO:
+            points.append(last + t * ((x, y) - last))
+        elif kind == pathdata.CURVE_TO:
+            p0, (p1, p2, p3) = last, np.array(elements[i:i + 3].tolist())[
+                :, 1:]
+            points.append((1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1 +
+                          3 * (1 - t) * t ** 2 * p2 + t ** 3 * p3)
+        if kind != pathdata.CURVE_TO:
+            last = np.array((x, y))
+    # Distance to the closest segment of the polyline
+    points = np.vstack(points)
+    a, b = points[:-1], points[1:]
+    ab, ap = b - a, (p.x(), p.y()) - a
+    length = np.maximum((ab ** 2).sum(1), 1e-300)
+    t = np.clip((ap * ab).sum(1) / length, 0, 1)[:, None]
+    return np.hypot(*(ap - t * ab).T).min()
+
+
+@pytest.fixture
+def fast_parser(monkeypatch):
+    """ Use the fast path data parser regardless of the length """
+    monkeypatch.setattr(pathdata, 'MIN_LENGTH', 0)
+
+
+@pytest.mark.parametrize('path', glob('tests/data/**/*.svg', recursive=True))
+def test_fast_parser(fast_parser, path):
+    """ Make sure the fast path data parser matches the original one """
+    try:
+        doc = QtSvgDoc(path)
+    except NotImplementedError as e:
+        pytest.skip(str(e))
+    assert path_elements(doc) == path_elements(QtSvgDoc(path,
+                                                        fast_parser=False))
+
+
+@pytest.mark.parametrize('d', [
+    'M 0 0 L 10 10 20 0 z',
+    'm 10,10 l 5,5 -5,5 h 10 v -10 z m 5 5 l 1 1 z l 2 2',
+    'M0-1.5.5.5e1L2e-1,3',
+    'M 0 0 C 1 2 3 4 5 6 S 7 8 9 10 s 1 1 2 2',
+    'M 0 0 Q 5 5 10 0 T 20 0 t 10 0 q 1 1 2 0',
+    'M 0 0 L 0 0 L 1e-13 0 M 5 5 M 6 6 L 7 7 C 7 7 7 7 7 7',
+    'M 0 0 A 5 5 0 0 1 10 0 L 20 0',
+    'M 10 10 a 20 10 30 1 0 30 5 l 5 5 A 3 3 0 1 1 0 0 z',
+    'M 0 0 L 5 5 Z A 5 5 0 0 1 10 0 Z',
+])
+def test_fast_parser_path_data(fast_parser, d):
+    """ Make sure the fast path data parser matches the original one """
+    e = etree.Element(QtSvgPath.tag, d=d)
+    legacy = QtSvgDoc.__new__(QtSvgDoc)
+    legacy.fast_parser = False
+    assert path_elements(QtSvgPath(e)) == path_elements(
+        QtSvgPath(e, doc=legacy))
+
+
+@pytest.fixture(params=[True, False], ids=['batch', 'single'])
+def arc_batch(monkeypatch, request):
+    """ Convert arcs in a batch with the fast parser or one at a time """
+    if request.param:
+        monkeypatch.setattr(pathdata, 'MIN_LENGTH', 0)
+    return request.param
+
+
+@pytest.mark.parametrize('tolerance', [0.1, 0.001])
+@pytest.mark.parametrize('d, center, radius', [
+    ('M 0 0 A 5 5 0 0 1 10 0', (5, 0), 5),
+    ('M 0 0 A 5 5 30 1 0 10 0', (5, 0), 5),
+    ('M 10 0 A 10 10 0 1 1 0 10', (10, 10), 10),
+    ('M 0 0 A 1 1 0 0 0 100 0', (50, 0), 50),
+])
+def test_arc_tolerance(arc_batch, d, center, radius, tolerance):
+    """ Make sure arcs converted in a batch stay within the tolerance """
+    e = etree.Element(QtSvgPath.tag, d=d)
+    doc = QtSvgDoc.__new__(QtSvgDoc)
+    doc.fast_parser = True
+    doc.arc_tolerance = tolerance
+    path = QtSvgPath(e, doc=doc)
+    for t in range(101):
+        p = path.pointAtPercent(t / 100.0)
+        r = math.hypot(p.x() - center[0], p.y() - center[1])
+        assert abs(r - radius) <= tolerance
+
+    # Qt's curves are up to 2.7e-4 times the radius off of a quarter turn
+    expected = QtSvgPath(e)
+    error = tolerance + 3e-4 * radius
+    assert path_distance(path, expected.currentPosition()) < error
+    for t in range(101):
+        p = expected.pointAtPercent(t / 100.0)
+        assert path_distance(path, p) < error
+
+
+@pytest.mark.parametrize('d', [
+    'M 10 10 a 20 10 30 1 0 30 5 l 5 5 A 3 3 0 1 1 0 0 z',
+    'M 0 0 L 5 5 Z A 5 5 0 0 1 10 0 Z',
+    'M 0 0 A 80 20 -45 0 1 100 0 L 0 0',
+])
+def test_arc_tolerance_segments(arc_batch, d):
+    """ Make sure the segments around arcs converted in a batch match """
+    e = etree.Element(QtSvgPath.tag, d=d)
+    doc = QtSvgDoc.__new__(QtSvgDoc)
+    doc.fast_parser = True
+    doc.arc_tolerance = 0.01
+    lines = lambda p: [e for e in path_elements(p)
+                       if e[0] in (pathdata.MOVE_TO, pathdata.LINE_TO)]
+    assert lines(QtSvgPath(e, doc=doc)) == lines(QtSvgPath(e))
+
+
+def test_arc_curves():
+    """ Make sure lines and omitted arcs are handled """
+    x1, y1 = np.array([0.0, 0.0, 0.0]), np.array([0.0, 0.0, 0.0])
+    x2, y2 = np.array([10.0, 10.0, 0.0]), np.array([0.0, 0.0, 0.0])
+    arcs = np.array([[5, 5, 0, 0, 1], [0, 5, 0, 0, 1], [5, 5, 0, 0, 1]])
+    elements, counts = pathdata.arc_curves(x1, y1, arcs, x2, y2, 0.01)
+    assert counts[1:].tolist() == [1, 0]
+    assert counts[0] % 3 == 0 and counts[0] >= 6
+    assert elements[-1].tolist() == (pathdata.LINE_TO, 10.0, 0.0)
+    assert elements[counts[0] - 1].tolist() == (pathdata.CURVE_TO_DATA,
+                                                10.0, 0.0)
+
+    # Short paths convert arcs one at a time the same way
+    assert pathdata.arc_to_curves(0, 0, [0, 5, 0, 0, 1], 10, 0, 0.01) is None
+    assert pathdata.arc_to_curves(0, 0, [5, 5, 0, 0, 1], 0, 0, 0.01) == []
+    curves = pathdata.arc_to_curves(0, 0, [5, 5, 0, 0, 1], 10, 0, 0.01)
+    assert np.allclose(np.array(curves).reshape(-1, 2),
+                       np.column_stack((elements['x'], elements['y']))[
+                           :counts[0]])
+
+
+
+@pytest.mark.parametrize('d', ['10 10', 'L 10 10', 'M 10 10 x 5', 'M 10',
+                               'M 0 0 A 0 0 0 0 0 0 0'])
+def test_fast_parser_errors(fast_parser, d):
+    """ Make sure invalid path data is rejected like the original parser """
+    e = etree.Element(QtSvgPath.tag, d=d)
+    legacy = QtSvgDoc.__new__(QtSvgDoc)
+    legacy.fast_parser = False
+    with pytest.raises(Exception) as legacy_error:
+        QtSvgPath(e, doc=legacy)
+    with pytest.raises(legacy_error.type):
+        QtSvgPath(e)
+
+
+USE_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:xlink="http://www.w3.org/1999/xlink" width="200" height="200">
+  <defs>
+    <rect id="r" width="10" height="10"/>
+    <symbol id="s"><use xlink:href="#r" x="5"/></symbol>
+  </defs>
+  <g id="a">
+    <use id="u1" xlink:href="#r" x="20"/>
+    <use id="u2" xlink:href="#r" x="40"/>
+  </g>
+  <g id="b">
+    <use id="u3" xlink:href="#s" y="100"/>
+    <use id="u4" xlink:href="#missing"/>
+  </g>
+</svg>
+"""
+
+EXPANDED_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="200" height="200">
+  <g id="a">
+    <rect id="r1" x="20" width="10" height="10"/>
+    <rect id="r2" x="40" width="10" height="10"/>
+  </g>
+  <rect id="r3" x="5" y="100" width="10" height="10"/>
+</svg>
+"""
+
+
+def test_use_id_index():
+    """ Make sure use elements are resolved with the document's id index """
+    doc = QtSvgDoc(USE_SVG)
+    assert doc.getElementById('r').tag.endswith('rect')
+    assert doc.getElementById('missing') is None
+    assert doc.boundingRect() == QtSvgDoc(EXPANDED_SVG).boundingRect()
+
+
+def test_select_ids():
+    """ Make sure only the selected ids are included """
+    doc = QtSvgDoc(EXPANDED_SVG, ids=['r2', 'r3', 'missing'])
+    expected = QtSvgDoc(EXPANDED_SVG).boundingRect()
+    assert doc.boundingRect() == expected
+    doc = QtSvgDoc(EXPANDED_SVG, ids=['r2'])
+    assert doc.boundingRect().right() == expected.right()
+    assert doc.boundingRect().left() > expected.left()
+
+
+@pytest.mark.parametrize('value, expected', (
+    ('10', 10.0),
+    ('10px', 10.0),
+    ('1in', 90.0),
+    ('2.5mm', 2.5 * 3.5433070866),
+    ('-1e1cm', -354.33070866),
+    (None, None),
+    (5, 5),
+))
+def test_parse_unit(value, expected):
+    result = QtSvgDoc.parseUnit(value)
+    assert result == expected or abs(result - expected) < 1e-9
+    # Memoized results must not change
+    assert QtSvgDoc.parseUnit(value) == result
+
+
+def test_parse_style():
+    style = QtSvgDoc.parseStyle("fill:#ff0000; stroke : none;;opacity")
+    assert dict(style) == {'fill': '#ff0000', 'stroke': 'none',
+                           'opacity': None}
+    assert QtSvgDoc.parseStyle("fill:#ff0000; stroke : none;;opacity") is style
+    assert dict(QtSvgDoc.parseStyle(None)) == {}
+    assert dict(QtSvgDoc.parseStyle("")) == {}
+    # Shared between elements so it must be read only
+    with pytest.raises(TypeError):
+        style['fill'] = 'none'
+
+
+def assert_paths_equal(a, b, tolerance=1e-9):
+    ea, eb = path_elements(a), path_elements(b)
+    assert len(ea) == len(eb)
+    for (t1, x1, y1), (t2, x2, y2) in zip(ea, eb):
+        assert t1 == t2
+        assert abs(x1 - x2) <= tolerance * max(1, abs(x1))
+        assert abs(y1 - y2) <= tolerance * max(1, abs(y1))
+
+
+@pytest.mark.parametrize('path', glob('tests/data/**/*.svg', recursive=True))
+def test_flatten(path):
+    """ Make sure composing the transforms gives the same geometry """
+    try:
+        doc = QtSvgDoc(path)
+    except NotImplementedError as e:
+        pytest.skip(str(e))
+    assert_paths_equal(doc, QtSvgDoc(path, flatten=True))
+
+
+def test_flatten_use():
+    """ Make sure use and symbol elements are flattened """
+    assert_paths_equal(QtSvgDoc(USE_SVG), QtSvgDoc(USE_SVG, flatten=True))
+
+
+@pytest.mark.parametrize('path', ['tests/data/multi-layer.svg',
+                                  'tests/data/groups.svg'])
+def test_parallel(monkeypatch, path):
+    """ Make sure parsing the top level groups in parallel gives the same
+    result as parsing serially.
+
+    """
+    from inkcut.core import svg
+    monkeypatch.setattr(svg, 'PARALLEL_MIN_ELEMENTS', 0)
+    monkeypatch.setattr(svg.multiprocessing, 'cpu_count', lambda: 2)
+    for kwargs in ({}, {'flatten': True}):
+        expected = QtSvgDoc(path, **kwargs)
+        doc = QtSvgDoc(path, parallel=True, **kwargs)
+        assert path_elements(doc) == path_elements(expected)
+
+
+@pytest.mark.parametrize('path', glob('tests/data/**/*.svg', recursive=True))
+def test_streaming(path):
+    """ Make sure streaming a file gives the same geometry as flattening it
+    and keeps the layers and styles.
+
+    """
+    expected = QtSvgDoc(path, flatten=True)
+    doc = QtSvgDoc(path, streaming=True)
+    assert doc.streaming
+    assert path_elements(doc) == path_elements(expected)
+    for node in expected._e.xpath('//*[@style]'):
+        assert doc._e.xpath('//*[@style=$style]', style=node.get('style'))
+
+
+def test_streaming_use(tmpdir):
+    """ Make sure uses are resolved when streaming including references
+    to elements later in the file.
+
+    """
+    path = str(tmpdir.join('use.svg'))
+    with open(path, 'w') as f:
+        f.write(USE_SVG)
+    assert_paths_equal(QtSvgDoc(USE_SVG), QtSvgDoc(path, streaming=True))
+
+    # Move the defs to the end
+    svg = etree.fromstring(USE_SVG.encode())
+    svg.append(svg[0])
+    with open(path, 'wb') as f:
+        f.write(etree.tostring(svg))
+    doc = QtSvgDoc(path, streaming=True)
+    assert doc.boundingRect() == QtSvgDoc(USE_SVG).boundingRect()
+
+
+def test_streaming_filters():
+    """ Make sure filters exclude the same elements from a streamed document
+    as they remove from the tree.
+
+    """
+    from inkcut.job.filters import LayerFilter, FillColorFilter
+    path = 'tests/data/multi-layer.svg'
+    doc = QtSvgDoc(path, flatten=True)
+    streamed = QtSvgDoc(path, streaming=True)
+    for Filter in (LayerFilter, FillColorFilter):
+        options = Filter.get_filter_options(None, doc)
+        streamed_options = Filter.get_filter_options(None, streamed)
+        assert [f.name for f in options] == [f.name for f in streamed_options]
+        for f, g in zip(options, streamed_options):
+            result = g.apply_filter(None, streamed)
+            assert result.streaming
+            assert_paths_equal(result, f.apply_filter(None, doc))
+
+
+TAGGED_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:xlink="http://www.w3.org/1999/xlink"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     width="200" height="200">
+  <defs>
+    <rect id="r" width="5" height="5" style="fill:#0000ff"/>
+  </defs>
+  <g inkscape:groupmode="layer" inkscape:label="A" style="stroke:#000000">
+    <rect width="10" height="10" style="fill:#ff0000"/>
+    <g style="fill:#00ff00" transform="translate(20, 0)">
+      <circle r="5"/>
+      <use xlink:href="#r" x="10"/>
+    </g>
+  </g>
+  <g inkscape:groupmode="layer" inkscape:label="B">
+    <rect y="50" width="10" height="10" style="fill:#ff0000"/>
+    <use xlink:href="#r" y="50"/>
+  </g>
+</svg>
+"""
+
+
+@pytest.mark.parametrize('path', glob('tests/data/*.svg'))
+def test_tagged(path):
+    """ Make sure the geometry table of a tagged document matches the
+    document.
+
+    """
+    try:
+        expected = QtSvgDoc(path, flatten=True)
+    except NotImplementedError as e:
+        pytest.skip(str(e))
+    doc = QtSvgDoc(path, tagged=True)
+    assert_paths_equal(doc, expected)
+    table = QtSvgDoc(path, flatten=True)
+    table -= table
+    for tags, part in doc.elements:
+        table.addPath(part)
+    assert_paths_equal(table, doc)
+    assert_paths_equal(doc.masked([]), doc)
+
+
+def test_tagged_filters(tmpdir):
+    """ Make sure masking the geometry table removes the same shapes as
+    removing them from the tree.
+
+    """
+    from inkcut.core.cache import ParseCache
+    from inkcut.job.filters import (
+        LayerFilter, FillColorFilter, StrokeColorFilter
+    )
+    for source in (TAGGED_SVG, 'tests/data/multi-layer.svg'):
+        doc = QtSvgDoc(source, flatten=True)
+        tagged = QtSvgDoc(source, tagged=True)
+        for Filter in (LayerFilter, FillColorFilter, StrokeColorFilter):
+            for f in Filter.get_filter_options(None, doc):
+                result = f.apply_filter(None, tagged)
+                assert result.elements is not None
+                assert_paths_equal(result, f.apply_filter(None, doc))
+
+    # The table is saved in the parse cache
+    cache = ParseCache(str(tmpdir))
+    tagged = QtSvgDoc(TAGGED_SVG, tagged=True, cache=cache)
+    cached = QtSvgDoc(TAGGED_SVG, tagged=True, cache=cache)
+    assert cache.hits == 1
+    assert [tags for tags, p in cached.elements] == [
+        tags for tags, p in tagged.elements]
+    assert ('layer', 'A') in cached.elements[0][0]
+    assert_paths_equal(cached.masked([('fill', '#ff0000')]),
+                       tagged.masked([('fill', '#ff0000')]))
+
+
+
+def test_tag_elements():
+    """ Make sure the geometry table built when a filter first needs it
+    matches the table of a document tagged when it is parsed.
+
+    """
+    for flatten in (False, True):
+        doc = QtSvgDoc(TAGGED_SVG, flatten=flatten)
+        assert doc.elements is None
+        doc.tagElements()
+        tagged = QtSvgDoc(TAGGED_SVG, tagged=True)
+        assert [tags for tags, p in doc.elements] == [
+            tags for tags, p in tagged.elements]
+        assert_paths_equal(doc.masked([('layer', 'A')]),
+                           tagged.masked([('layer', 'A')]))
+
+CSS_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     width="200" height="200">
+  <style type="text/css"><![CDATA[
+    /* Colors */
+    .cut, #special { stroke: #ff0000 }
+    rect.engrave { fill : #0000ff; stroke: #00ff00 }
+    g.hidden { display: none }
+    svg > rect, @media print { fill: #123456 }
+  ]]></style>
+  <g inkscape:groupmode="layer" inkscape:label="A" class="hidden">
+    <rect class="cut" width="10" height="10"/>
+    <rect class="engrave cut" x="20" width="10" height="10"/>
+  </g>
+  <g inkscape:groupmode="layer" inkscape:label="B">
+    <circle id="special" cx="50" cy="50" r="5"/>
+    <rect class="engrave" x="40" width="10" height="10" style="fill:#ffffff"/>
+    <rect x="60" width="10" height="10" style="stroke:#00ff00"/>
+  </g>
+</svg>
+"""
+
+
+def test_stylesheet(tmpdir):
+    """ Make sure the rules of style elements are used by the style index
+    and the filters.
+
+    """
+    from inkcut.job.filters import (
+        LayerFilter, FillColorFilter, StrokeColorFilter
+    )
+    doc = QtSvgDoc(CSS_SVG, tagged=True)
+    rect = doc._e.findall('.//{http://www.w3.org/2000/svg}rect')[1]
+    assert dict(doc.elementStyle(rect)) == {'fill': '#0000ff',
+                                            'stroke': '#00ff00'}
+    index = doc.styleIndex()
+    assert [label for g, label in index['layers']] == ['A', 'B']
+    assert index['styles']['stroke'] == ['#ff0000', '#00ff00']
+    assert index['styles']['fill'] == ['#0000ff', '#ffffff']
+
+    layers = LayerFilter.get_filter_options(None, doc)
+    assert [f.enabled for f in layers] == [False, True]
+    assert [f.data for f in StrokeColorFilter.get_filter_options(
+        None, doc)] == ['#ff0000', '#00ff00']
+
+    path = str(tmpdir.join('css.svg'))
+    with open(path, 'w') as f:
+        f.write(CSS_SVG)
+    streamed = QtSvgDoc(path, streaming=True)
+    plain = QtSvgDoc(CSS_SVG, flatten=True)
+    assert streamed.styleIndex()['styles'] == index['styles']
+    for Filter in (LayerFilter, FillColorFilter, StrokeColorFilter):
+        for f in Filter.get_filter_options(None, doc):
+            expected = f.apply_filter(None, plain)
+            assert expected.elementCount() < plain.elementCount()
+            assert_paths_equal(f.apply_filter(None, doc), expected)
+            assert_paths_equal(f.apply_filter(None, streamed), expected)
+
+
+IMAGE_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg"
+     xmlns:xlink="http://www.w3.org/1999/xlink" width="200" height="200">
+  <defs>
+    <image id="i0" width="5" height="5" xlink:href="data:image/png;base64,AA"/>
+  </defs>
+  <g transform="translate(10, 20)">
+    <image id="i1" x="5" width="50" height="40"
+           xlink:href="data:image/png;base64,%s"/>
+    <rect width="10" height="10"/>
+  </g>
+</svg>
+""" % ("A" * 1000)
+
+
+def test_strip_images(tmpdir):
+    """ Make sure the image data is removed and only the bounds of the drawn
+    images are kept.
+
+    """
+    from inkcut.core.cache import ParseCache
+    doc = QtSvgDoc(IMAGE_SVG, strip_images=True)
+    assert path_elements(doc) == path_elements(QtSvgDoc(IMAGE_SVG))
+    assert b'data:' not in etree.tostring(doc._e)
+    assert len(doc.images) == 1
+    expected = QtSvgDoc(IMAGE_SVG).parseTransform(doc._e).mapRect(
+        QRectF(15, 20, 50, 40))
+    assert doc.images[0] == expected
+
+    path = str(tmpdir.join('image.svg'))
+    with open(path, 'w') as f:
+        f.write(IMAGE_SVG)
+    assert QtSvgDoc(path, strip_images=True, streaming=True).images == \
+        doc.images
+
+    # The bounds are cached with the geometry
+    cache = ParseCache(str(tmpdir.join('cache')))
+    for i in range(2):
+        doc = QtSvgDoc(path, strip_images=True, cache=cache)
+        assert doc.images == [expected]
+    assert cache.hits == 1
+    assert b'data:' not in etree.tostring(doc._e)
+
+
+TEXT_SVG = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" width="200" height="200">
+  <g transform="translate(10, 0)">
+    <text x="10" y="50" style="font-size:20px;font-family:'DejaVu Sans'"
+      >Hello <tspan dy="5" style="font-weight:bold">World</tspan>!</text>
+    <text x="100" y="100" text-anchor="middle" font-size="10">ABBA</text>
+  </g>
+</svg>
+"""
+
+
+def test_text(qapp, tmpdir):
+    """ Make sure text is outlined using the glyph cache """
+    from inkcut.core.svg import QtSvgText
+    QtSvgText.outline.cache_clear()
+    doc = QtSvgDoc(TEXT_SVG)
+    assert not doc.isEmpty()
+    # H e l o space, W o r l d in bold, ! and A B
+    assert QtSvgText.outline.cache_info().currsize == 13
+    assert_paths_equal(doc, QtSvgDoc(TEXT_SVG, flatten=True))
+
+    # The middle anchor centers the text
+    svg = etree.fromstring(TEXT_SVG.encode())
+    g = svg[0]
+    g.remove(g[0])
+    bbox = QtSvgDoc(svg, parent=True).boundingRect()
+    g[0].attrib.pop('text-anchor')
+    assert QtSvgDoc(svg, parent=True).boundingRect().center().x() == \
+        pytest.approx(bbox.center().x() + bbox.width() / 2, abs=1)
+
+    path = str(tmpdir.join('text.svg'))
+    with open(path, 'w') as f:
+        f.write(TEXT_SVG)
+    assert_paths_equal(doc, QtSvgDoc(path, streaming=True))